@@ -2,24 +2,55 @@ import logging
 import os
 import re
 import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
 import traceback
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import cycle
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, List, NamedTuple, Tuple, Union
 from zipfile import ZipFile, ZipInfo
 
+import rarfile
 from rarfile import Error as RarError
-from rarfile import RarFile, RarInfo
+from rarfile import NeedFirstVolume, RarFile, RarInfo
 
 from atom_dl.config_helper import Config
-from atom_dl.feed_extractor.common import TopCategory
+from atom_dl.dedup_index import DedupIndex
+from atom_dl.jobs_queue import JobsQueue
+from atom_dl.metrics import EXTRACT_ARCHIVES, EXTRACT_BYTES, EXTRACT_DURATION, EXTRACT_THROUGHPUT
+from atom_dl.types import TopCategory
 from atom_dl.utils import PathTools as PT
+from atom_dl.utils import (
+    format_bytes,
+    load_dict_from_json,
+    set_default_file_mode,
+    write_to_json,
+)
+
+
+class ArchiveMember(NamedTuple):
+    """A file inside an archive, with all name parts computed once."""
+
+    filename: str
+    stem: str
+    ext: str
+    ext_lower: str
+    dir_path_parts: Tuple[str, ...]
 
 
 class ArchiveExtractor:
     part_pattern = re.compile(r'^part(\d+)$')
     without_part_num_pattern = re.compile(r'^(.+\.part)\d+(\.\w+)$')
     dir_name_part_pattern = re.compile(r'^(.+)(\d+)$')
+    # Prefix of the temporary files and directories of an extraction inside a package
+    tmp_prefix = '.atom-dl-extract-'
+    # unrar reads every entry of a list file as a mask, there is no way to escape these characters
+    unrar_wildcard_chars = frozenset('*?[')
 
     def __init__(self):
         config = Config()
@@ -27,8 +58,44 @@ class ArchiveExtractor:
         self.blocked_file_types = ['txt', 'png', 'jpg', 'jpeg', 'gif', 'opf', 'xlsx', 'inf']
         self.extract_passwords = [b'ibooks.to', b'comicmafia.to', b'languagelearning.site']
         self.spinner = cycle('/|\\-')
-
-        logging.info('Run rmlint before and after running archive extractor!')
+        # RAR members are extracted with one call of the unrar tool if it is available
+        self.unrar_tool_path = shutil.which(rarfile.UNRAR_TOOL)
+        self.copy_buffer_size = max(config.get_extract_copy_buffer_size(), 64 * 1024)
+        # Packages are only extracted if none of their files changed for this time (JDownloader may still write them)
+        self.stable_seconds = max(config.get_extract_stable_minutes(), 0) * 60
+        self.fsync = config.get_fsync_state_files()
+
+        # Packages are extracted in parallel (unrar runs as subprocess), but only a few per disk at the same time
+        self.max_parallel_extractions = max(config.get_max_parallel_extractions(), 1)
+        self.max_parallel_extractions_per_disk = max(config.get_max_parallel_extractions_per_disk(), 1)
+        self.disk_semaphores = {}
+        self.disk_semaphores_lock = threading.Lock()
+
+        # The extraction index remembers the mtime of every processed package directory,
+        # so that unchanged packages are not scanned again
+        self.path_of_extraction_index = PT.get_path_of_extraction_index_json()
+        self.extraction_index = load_dict_from_json(self.path_of_extraction_index)
+
+        # Passwords are chosen based on the post a package was created from
+        self.package_sources = {}
+        self.path_of_known_passwords = PT.get_path_of_archive_passwords_json()
+        self.known_passwords = load_dict_from_json(self.path_of_known_passwords)
+        self.known_passwords_lock = threading.Lock()
+
+        # Extracted files are deduplicated against the storage right after they are written
+        dedup_mode = config.get_dedup_mode()
+        if dedup_mode not in DedupIndex.dedup_modes:
+            logging.warning('Unknown dedup mode %r, deduplication is disabled', dedup_mode)
+            dedup_mode = 'off'
+        self.dedup_index = DedupIndex(
+            PT.get_path_of_dedup_index_json(),
+            PT.get_path_of_dedup_journal_json(),
+            dedup_mode,
+            self.tmp_prefix,
+            self.fsync,
+        )
+        if dedup_mode == 'off':
+            logging.info('Run rmlint before and after running archive extractor!')
 
     def process(self):
         # Currently not all top categories are supported
@@ -38,8 +105,36 @@ class ArchiveExtractor:
             TopCategory.magazines: ['pdf'],
         }
 
+        packages_to_extract = []
         for category, extract_file_types in extract_file_types_per_category.items():
-            self.extract_all_archives(category, extract_file_types)
+            for package_path in self.get_package_paths(category):
+                packages_to_extract.append((package_path, extract_file_types))
+
+        # Forget packages that do not exist anymore
+        existing_package_paths = {package_path for package_path, _ in packages_to_extract}
+        for package_path in list(self.extraction_index.keys()):
+            if package_path not in existing_package_paths:
+                del self.extraction_index[package_path]
+
+        if self.dedup_index.dedup_mode != 'off' and self.dedup_index.is_new:
+            # On the first run all files that are already in the storage are indexed
+            self.index_existing_files(extract_file_types_per_category.keys())
+            self.dedup_index.is_new = False
+
+        self.extract_packages(packages_to_extract)
+
+    def index_existing_files(self, categories: List[TopCategory]):
+        existing_files = []
+        for category in categories:
+            for package_path in self.get_package_paths(category):
+                for dir_path, _, filenames in os.walk(package_path):
+                    for filename in filenames:
+                        # Archives are removed after extraction, so they are not worth indexing
+                        if filename.startswith('.') or PT.get_file_ext(filename) in ['zip', 'rar']:
+                            continue
+                        existing_files.append(PT.make_path(dir_path, filename))
+        logging.info('Adding %d existing files to the dedup index', len(existing_files))
+        self.dedup_index.add_existing_files(existing_files)
 
     def get_part_num(self, pre_ext: str) -> int:
         part_num = 0
@@ -64,21 +159,95 @@ class ArchiveExtractor:
             multipart_arc_filenames.append(first_part_filename)
         return multipart_arc_filenames
 
-    def get_base_path_pattern(self, container_infolist: List[Union[ZipInfo, RarInfo]]) -> str:
-        # First get the parts of all unique dir paths in the archive
-        all_dir_paths_parts = []
+    def get_volume_numbers(self, multipart_arc_filenames: List[str]) -> List[int]:
+        volume_numbers = []
+        for multipart_arc_filename in multipart_arc_filenames:
+            pre_ext, _ = PT.get_file_exts(multipart_arc_filename)
+            volume_numbers.append(self.get_part_num(pre_ext))
+        return sorted(volume_numbers)
+
+    def check_archive_set(self, package_path: str, first_part_filename: str, package_files: List[str]) -> str:
+        """
+        Checks that all volumes of a multipart archive are present.
+        For RAR the volume chain is followed based on the volume headers, so that a missing last volume is found too.
+        @return: None if the archive set is complete, otherwise the reason why not
+        """
+        multipart_arc_filenames = self.get_all_multipart_arc_filenames(first_part_filename, package_files)
+        volume_numbers = self.get_volume_numbers(multipart_arc_filenames)
+        expected_volume_numbers = list(range(1, volume_numbers[-1] + 1))
+        if volume_numbers != expected_volume_numbers:
+            missing_volumes = sorted(set(expected_volume_numbers) - set(volume_numbers))
+            return f'{first_part_filename} is missing the volumes {missing_volumes}'
+
+        if PT.get_file_ext(first_part_filename) != 'rar':
+            return None
+        try:
+            with RarFile(PT.make_path(package_path, first_part_filename), errors='strict') as container:
+                volume_list = container.volumelist()
+        except NeedFirstVolume:
+            return f'{first_part_filename} is not the first volume'
+        except RarError as rar_err:
+            return f'{first_part_filename} has a broken volume chain: {rar_err}'
+        # With encrypted headers the chain can not be followed without the password, then only one volume is listed
+        if len(volume_list) > 1 and len(volume_list) != len(volume_numbers):
+            return (
+                f'{first_part_filename} has {len(volume_list)} volumes in its headers,'
+                f' but {len(volume_numbers)} volume files exist'
+            )
+        return None
+
+    def check_package_ready(self, package_path: str) -> str:
+        """
+        Checks that JDownloader finished writing all files of a package, before it is queued for extraction
+        @return: None if the package can be extracted, otherwise the reason why not
+        """
+        try:
+            package_files = os.listdir(package_path)
+        except OSError as list_err:
+            return str(list_err)
+
+        now = time.time()
+        for package_file in package_files:
+            if package_file.lower().endswith('.part'):
+                return f'{package_file} is still downloading'
+            try:
+                file_mtime = os.stat(PT.make_path(package_path, package_file)).st_mtime
+            except OSError:
+                return f'{package_file} disappeared'
+            if now - file_mtime < self.stable_seconds:
+                return f'{package_file} was modified in the last {self.stable_seconds // 60} minutes'
+
+        for package_file in package_files:
+            pre_ext, ext = PT.get_file_exts(package_file)
+            if ext not in ['zip', 'rar'] or self.get_part_num(pre_ext) != 1:
+                continue
+            reason = self.check_archive_set(package_path, package_file, package_files)
+            if reason is not None:
+                return reason
+        return None
+
+    def get_archive_members(self, container_infolist: List[Union[ZipInfo, RarInfo]]) -> List[ArchiveMember]:
+        """
+        Scans the archive headers once and returns all files that are not blocked
+        """
+        archive_members = []
         for file_info in container_infolist:
             if file_info.is_dir():
                 # We build the base dir based on the files we want to extract
                 continue
-            ext = PT.get_file_ext(file_info.filename)
-            if ext in self.blocked_file_types:
+            stem, ext = PT.get_file_stem_and_ext(file_info.filename)
+            ext_lower = ext.lower() if ext is not None else None
+            if ext_lower in self.blocked_file_types:
                 # We ignore all file that we do not want, because they may be in a top folder
                 continue
+            archive_members.append(
+                ArchiveMember(file_info.filename, stem, ext, ext_lower, Path(file_info.filename).parent.parts)
+            )
+        return archive_members
 
-            dir_path_parts = Path(file_info.filename).parent.parts
-            if dir_path_parts not in all_dir_paths_parts:
-                all_dir_paths_parts.append(dir_path_parts)
+    def get_base_path_pattern(self, archive_members: List[ArchiveMember]) -> str:
+        # First get the parts of all unique dir paths in the archive
+        all_dir_paths_parts = list(dict.fromkeys(member.dir_path_parts for member in archive_members))
 
         base_path_pattern = r'^'
         if len(all_dir_paths_parts) == 0:
@@ -123,77 +292,117 @@ class ArchiveExtractor:
 
     def get_files_to_extract(
         self,
-        container_infolist: List[Union[ZipInfo, RarInfo]],
+        archive_members: List[ArchiveMember],
         extract_file_types: List[str],
     ) -> List[str]:
-        # Collect all file stems with file types that are not blocked
-        file_stems_to_extract = {}
-        for file_info in container_infolist:
-            if file_info.is_dir():
-                continue
-            stem, ext = PT.get_file_stem_and_ext(file_info.filename)
-            ext_lower = ext.lower()
-            if ext_lower in self.blocked_file_types:
-                continue
-
-            if stem not in file_stems_to_extract:
-                file_stems_to_extract[stem] = []
-            if ext_lower in extract_file_types:
-                # Add file extensions of wanted file types
-                file_stems_to_extract[stem].append(ext)
-
-        for stem_to_extract, exts_to_extract in file_stems_to_extract.items():
-            # Check if there is a file inside the archive that missis a wanted file type
-            if len(exts_to_extract) > 0:
-                continue
-            logging.warning('WARNING: Missing wanted file type for %r', stem_to_extract)
-            for file_info in container_infolist:
-                if file_info.is_dir():
-                    continue
-                stem, ext = PT.get_file_stem_and_ext(file_info.filename)
-                if ext.lower() in self.blocked_file_types:
-                    continue
-
-                if stem == stem_to_extract:
-                    logging.info('Extracting instead %r for %r', ext, stem)
-                    file_stems_to_extract[stem].append(ext)
-
-        return [
-            f'{stem_to_extract}.{ext}'
-            for stem_to_extract, exts_to_extract in file_stems_to_extract.items()
-            for ext in exts_to_extract
-        ]
-
-    def can_open_first_file(self, container: Union[ZipFile, RarFile]) -> bool:
-        container_infolist = container.infolist()
-        if len(container_infolist) == 0:
-            return False
-        file_to_open = None
-        for file_info in container_infolist:
-            if file_info.is_dir():
-                continue
-            file_to_open = file_info.filename
-            break
-        if file_to_open is None:
+        # Group all files with file types that are not blocked by their stem
+        # Members without a file extension are only extracted if there is no wanted file with the same stem
+        members_per_stem = {}
+        for member in archive_members:
+            members_per_stem.setdefault(member.stem, []).append(member)
+
+        files_to_extract = []
+        for stem_to_extract, stem_members in members_per_stem.items():
+            # Add file extensions of wanted file types
+            wanted_members = [member for member in stem_members if member.ext_lower in extract_file_types]
+            if len(wanted_members) == 0:
+                # There is a file inside the archive that missis a wanted file type
+                logging.warning('WARNING: Missing wanted file type for %r', stem_to_extract)
+                for member in stem_members:
+                    logging.info('Extracting instead %r for %r', member.ext, stem_to_extract)
+                wanted_members = stem_members
+            files_to_extract.extend(member.filename for member in wanted_members)
+        return files_to_extract
+
+    def can_read_smallest_member(self, container: Union[ZipFile, RarFile]) -> bool:
+        """
+        Reads the smallest member completely, so that its CRC is checked at the end.
+        Opening a member is not enough, RAR3 archives without encrypted headers accept any password on open.
+        """
+        file_infos = [file_info for file_info in container.infolist() if not file_info.is_dir()]
+        if len(file_infos) == 0:
             return False
+        file_to_read = min(file_infos, key=lambda file_info: file_info.file_size).filename
         try:
-            with container.open(file_to_open):
-                pass
-        except Exception as open_err:
-            logging.info('%s: %s', type(open_err), open_err)
-
-    def set_password_if_needed(self, container: Union[ZipFile, RarFile]):
-        if self.can_open_first_file(container):
+            with container.open(file_to_read) as member_file:
+                while member_file.read(self.copy_buffer_size):
+                    pass
+        except Exception as read_err:
+            logging.info('%s: %s', type(read_err), read_err)
+            return False
+        return True
+
+    @staticmethod
+    def needs_password(container: Union[ZipFile, RarFile]) -> bool:
+        if isinstance(container, RarFile):
+            return container.needs_password()
+        # Bit 0 of the general purpose flags marks encrypted zip members
+        return any(file_info.flag_bits & 0x1 for file_info in container.infolist())
+
+    def load_package_sources(self, package_paths: List[str]) -> Dict[str, Dict]:
+        """
+        Maps the given package paths to the extractor key and password of the post their checked job came from
+        """
+        package_sources = {}
+        jobs_queue = JobsQueue()
+        for package_path in package_paths:
+            job = jobs_queue.get_checked_job(package_path)
+            if job is None:
+                continue
+            package_sources[os.path.normpath(package_path)] = {
+                'extractor_key': job.get('extractor_key', None),
+                'password': job.get('password', None),
+            }
+        jobs_queue.close()
+        return package_sources
+
+    def get_password_candidates(self, extractor_key: str) -> List[bytes]:
+        """
+        Returns all known passwords, the password that worked last time for the source first
+        """
+        with self.known_passwords_lock:
+            known_passwords = dict(self.known_passwords)
+        candidates = []
+        known_password = known_passwords.get(extractor_key, None)
+        if known_password is not None:
+            candidates.append(known_password.encode('utf-8'))
+        for password in list(known_passwords.values()) + self.extract_passwords:
+            if isinstance(password, str):
+                password = password.encode('utf-8')
+            if password not in candidates:
+                candidates.append(password)
+        return candidates
+
+    def remember_password(self, extractor_key: str, password: bytes):
+        if extractor_key is None or password is None:
             return
-
-        for password in self.extract_passwords:
+        with self.known_passwords_lock:
+            self.known_passwords[extractor_key] = password.decode('utf-8')
+
+    def set_password_if_needed(self, container: Union[ZipFile, RarFile], package_source: Dict) -> bytes:
+        """
+        Sets the password of the container and returns it, if the container needs a password.
+        The password of the post a package was created from is used without trial decryption,
+        only for unknown packages all known passwords are tried.
+        """
+        if not self.needs_password(container):
+            return None
+
+        post_password = package_source.get('password', None)
+        if post_password:
+            password = post_password.encode('utf-8')
+            container.setpassword(password)
+            return password
+
+        for password in self.get_password_candidates(package_source.get('extractor_key', None)):
             try:
                 container.setpassword(password)
             except RarError:
                 # Error on wrong password
                 continue
-            if self.can_open_first_file(container):
-                return
+            if self.can_read_smallest_member(container):
+                return password
+        return None
 
     def get_target_path(self, package_path: str, file_to_extract: str, base_path_pattern: str) -> str:
         save_to_path = package_path
@@ -210,91 +419,416 @@ class ArchiveExtractor:
         target_path = PT.get_unused_filename(save_to_path, file_to_extract_name, file_to_extract_ext, True)
         return target_path
 
-    def extract_all_archives(
+    @staticmethod
+    def get_zip_member_data_offset(archive_file, file_info: ZipInfo) -> int:
+        """
+        Returns the offset of the member data, that follows the local file header
+        """
+        local_header = os.pread(archive_file, zipfile.sizeFileHeader, file_info.header_offset)
+        if len(local_header) != zipfile.sizeFileHeader or local_header[0:4] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f'Bad local file header for {file_info.filename!r}')
+        filename_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        return file_info.header_offset + zipfile.sizeFileHeader + filename_length + extra_length
+
+    def copy_file_range(self, source_fd: int, target_fd: int, offset: int, count: int):
+        """
+        Copies count bytes starting at offset of the source to the current position of the target.
+        The data is copied in the kernel (copy_file_range or sendfile) and only read into Python as fallback.
+        """
+        copied = 0
+        use_copy_file_range = hasattr(os, 'copy_file_range')
+        use_sendfile = hasattr(os, 'sendfile')
+        while copied < count:
+            num_bytes = min(count - copied, self.copy_buffer_size)
+            if use_copy_file_range:
+                try:
+                    written = os.copy_file_range(source_fd, target_fd, num_bytes, offset_src=offset + copied)
+                except OSError:
+                    use_copy_file_range = False
+                    continue
+            elif use_sendfile:
+                try:
+                    written = os.sendfile(target_fd, source_fd, offset + copied, num_bytes)
+                except OSError:
+                    use_sendfile = False
+                    continue
+            else:
+                written = os.write(target_fd, os.pread(source_fd, num_bytes, offset + copied))
+            if written == 0:
+                raise EOFError(f'Unexpected end of archive after {copied} of {count} bytes')
+            copied += written
+
+    def extract_member_to(self, container: Union[ZipFile, RarFile], file_to_extract: str, target_fd: int):
+        file_info = container.getinfo(file_to_extract)
+        if (
+            isinstance(container, ZipFile)
+            and file_info.compress_type == zipfile.ZIP_STORED
+            and not file_info.flag_bits & 0x1
+        ):
+            # Stored members are not compressed nor encrypted, so they are copied without passing through Python.
+            # The zip CRC is not verified for them.
+            source_fd = os.open(container.filename, os.O_RDONLY)
+            try:
+                data_offset = self.get_zip_member_data_offset(source_fd, file_info)
+                self.copy_file_range(source_fd, target_fd, data_offset, file_info.file_size)
+            finally:
+                os.close(source_fd)
+            return
+
+        with container.open(file_to_extract) as source, open(target_fd, 'wb', closefd=False) as target:
+            shutil.copyfileobj(source, target, self.copy_buffer_size)
+
+    def extract_members(
         self,
-        category: TopCategory,
-        extract_file_types: List[str],
-    ):
+        container: Union[ZipFile, RarFile],
+        files_to_extract: List[str],
+        package_path: str,
+        base_path_pattern: str,
+    ) -> int:
+        """
+        Extracts every member into a temporary file next to its target and renames it afterwards,
+        so that an interrupted extraction never leaves a half-written file behind.
+        Returns the number of extracted bytes.
+        """
+        extracted_bytes = 0
+        num_files_to_extract = len(files_to_extract)
+        for idx_file, file_to_extract in enumerate(files_to_extract):
+            target_path = self.get_target_path(package_path, file_to_extract, base_path_pattern)
+
+            target_fd, tmp_target_path = tempfile.mkstemp(
+                prefix=self.tmp_prefix, suffix='.tmp', dir=os.path.dirname(target_path)
+            )
+            try:
+                try:
+                    set_default_file_mode(target_fd)
+                    self.extract_member_to(container, file_to_extract, target_fd)
+                finally:
+                    os.close(target_fd)
+                os.replace(tmp_target_path, target_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_target_path)
+                except OSError:
+                    pass
+                raise
+            extracted_bytes += os.path.getsize(target_path)
+            self.dedup_index.add_file(target_path)
+
+            logging.info("Done: %04d / %04d files %s", idx_file + 1, num_files_to_extract, next(self.spinner))
+        return extracted_bytes
+
+    def extract_rar_members(
+        self,
+        archive_path: str,
+        password: bytes,
+        files_to_extract: List[str],
+        package_path: str,
+        base_path_pattern: str,
+    ) -> int:
+        """
+        Extracts all wanted members with a single unrar call, so the volume chain is read only once
+        (opening every member on its own runs unrar once per member and decompresses solid archives again).
+        The members are extracted into a temporary directory inside the package and then moved to their target.
+        The member names are passed in a UTF-8 list file and the password on stdin, so neither ends up in the
+        command line (which is visible to every user and limited in length).
+        Members whose names contain wildcard characters are not passed to unrar, see has_unrar_wildcard.
+        Returns the number of extracted bytes.
+        """
+        extracted_bytes = 0
+        if len(files_to_extract) == 0:
+            # An empty list file would not restrict the extraction at all
+            return extracted_bytes
+        tmp_dir = tempfile.mkdtemp(prefix=self.tmp_prefix, dir=package_path)
+        list_fd, list_file_path = tempfile.mkstemp(prefix=self.tmp_prefix, suffix='.lst', dir=package_path)
+        try:
+            with open(list_fd, 'w', encoding='utf-8') as list_file:
+                list_file.write(''.join(file_to_extract + '\n' for file_to_extract in files_to_extract))
+
+            unrar_cmd = [self.unrar_tool_path, 'x', '-y', '-idq', '-o+', '-scfl', '-n@' + list_file_path]
+            if password is not None:
+                # Without a value unrar asks for the password, it reads it from stdin if there is no terminal
+                unrar_cmd.append('-p')
+                unrar_input = password + b'\n'
+            else:
+                unrar_cmd.append('-p-')
+                unrar_input = None
+            unrar_cmd += ['--', archive_path, tmp_dir + os.sep]
+            unrar_result = subprocess.run(
+                unrar_cmd,
+                input=unrar_input,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=False,
+                # A new session has no controlling terminal, so unrar can not prompt the user
+                start_new_session=True,
+            )
+            if unrar_result.returncode != 0:
+                raise RarError(
+                    f'unrar exited with {unrar_result.returncode}: {unrar_result.stderr.decode("utf-8", "replace")}'
+                )
+
+            num_files_to_extract = len(files_to_extract)
+            for idx_file, file_to_extract in enumerate(files_to_extract):
+                target_path = self.get_target_path(package_path, file_to_extract, base_path_pattern)
+                os.replace(PT.make_path(tmp_dir, file_to_extract), target_path)
+                extracted_bytes += os.path.getsize(target_path)
+                self.dedup_index.add_file(target_path)
+                logging.info("Done: %04d / %04d files %s", idx_file + 1, num_files_to_extract, next(self.spinner))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            try:
+                os.remove(list_file_path)
+            except OSError:
+                pass
+        return extracted_bytes
+
+    def has_unrar_wildcard(self, member_name: str) -> bool:
+        return not self.unrar_wildcard_chars.isdisjoint(member_name)
+
+    def remove_stale_tmp_files(self, package_path: str):
+        """
+        Removes the temporary files and directories that an interrupted extraction left behind in the package
+        """
+        for dir_path, dir_names, file_names in os.walk(package_path):
+            for dir_name in [dir_name for dir_name in dir_names if dir_name.startswith(self.tmp_prefix)]:
+                logging.info('Removing the leftover %r', PT.make_path(dir_path, dir_name))
+                shutil.rmtree(PT.make_path(dir_path, dir_name), ignore_errors=True)
+                dir_names.remove(dir_name)
+            for file_name in file_names:
+                if file_name.startswith(self.tmp_prefix):
+                    logging.info('Removing the leftover %r', PT.make_path(dir_path, file_name))
+                    try:
+                        os.remove(PT.make_path(dir_path, file_name))
+                    except OSError:
+                        pass
+
+    def get_category_name(self, package_path: str) -> str:
+        """
+        Returns the name of the top category directory a package is stored in
+        """
+        relative_path = os.path.relpath(package_path, self.storage_path)
+        return Path(relative_path).parts[0] if relative_path != '.' else ''
+
+    def get_package_paths(self, category: TopCategory) -> List[str]:
         category_path = PT.make_path(self.storage_path, category.value)
 
         if not os.path.isdir(category_path):
             # Nothing to do, category folder does not exist
-            return
+            return []
 
-        package_names = os.listdir(category_path)
-        for package_name in package_names:
+        package_paths = []
+        for package_name in os.listdir(category_path):
             package_path = PT.make_path(category_path, package_name)
+            if os.path.isdir(package_path):
+                package_paths.append(package_path)
+        return package_paths
 
-            # We collect a list of all files that we have extracted, so we can delete them later
-            extracted_files_in_package = []
+    def get_disk_semaphore(self, path: str) -> threading.BoundedSemaphore:
+        try:
+            disk_id = os.stat(path).st_dev
+        except OSError:
+            disk_id = None
+        with self.disk_semaphores_lock:
+            if disk_id not in self.disk_semaphores:
+                self.disk_semaphores[disk_id] = threading.BoundedSemaphore(self.max_parallel_extractions_per_disk)
+            return self.disk_semaphores[disk_id]
+
+    def extract_package_throttled(self, package_path: str, extract_file_types: List[str]) -> str:
+        with self.get_disk_semaphore(package_path):
+            return self.extract_package(package_path, extract_file_types)
+
+    @staticmethod
+    def get_package_mtime(package_path: str) -> int:
+        try:
+            return os.stat(package_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def is_package_unchanged(self, package_path: str) -> bool:
+        """
+        Adding, removing or renaming files in a package directory changes its mtime.
+        JDownloader renames finished downloads, so the mtime changes whenever a download of the package finishes.
+        Failed packages are always retried, a password may have been added in the meantime.
+        """
+        index_entry = self.extraction_index.get(package_path, None)
+        if index_entry is None or index_entry.get('result', None) == 'failed':
+            return False
+        return index_entry.get('mtime_ns', None) == self.get_package_mtime(package_path)
 
-            package_files = os.listdir(package_path)
-            for package_file in package_files:
-                package_file_path = PT.make_path(package_path, package_file)
+    def update_extraction_index(self, package_path: str, result: str):
+        self.extraction_index[package_path] = {
+            'mtime_ns': self.get_package_mtime(package_path),
+            'result': result,
+        }
+
+    def extract_packages(self, packages_to_extract: List[Tuple[str, List[str]]]):
+        """
+        Extracts all given packages, independent packages are extracted concurrently
+        @param packages_to_extract: List of (package_path, extract_file_types)
+        """
+        changed_packages = []
+        num_unchanged_packages = 0
+        for package_path, extract_file_types in packages_to_extract:
+            if self.is_package_unchanged(package_path):
+                num_unchanged_packages += 1
+                continue
+            # Incomplete packages are not added to the extraction index, so they are checked again on the next run
+            reason = self.check_package_ready(package_path)
+            if reason is not None:
+                logging.info('Not extracting %r yet: %s', package_path, reason)
+                continue
+            changed_packages.append((package_path, extract_file_types))
+        logging.info('Skipping %d unchanged packages (see %r)', num_unchanged_packages, self.path_of_extraction_index)
+        if len(changed_packages) == 0:
+            write_to_json(self.path_of_extraction_index, self.extraction_index, self.fsync)
+            self.dedup_index.save()
+            return
+
+        # Sources are only looked up for the packages that are extracted, new jobs could have been checked meanwhile
+        self.package_sources = self.load_package_sources([package_path for package_path, _ in changed_packages])
+
+        num_workers = min(self.max_parallel_extractions, len(changed_packages))
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='extractor') as executor:
+            futures = {
+                executor.submit(self.extract_package_throttled, package_path, extract_file_types): package_path
+                for package_path, extract_file_types in changed_packages
+            }
+            for future in as_completed(futures):
+                package_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as package_err:
+                    logging.error('Failed to extract package %r', package_path)
+                    logging.error('%s: %s', type(package_err), package_err)
+                    result = 'failed'
+                self.update_extraction_index(package_path, result)
+
+        write_to_json(self.path_of_extraction_index, self.extraction_index, self.fsync)
+        write_to_json(self.path_of_known_passwords, self.known_passwords, self.fsync)
+        self.dedup_index.save()
+
+    def extract_all_archives(
+        self,
+        category: TopCategory,
+        extract_file_types: List[str],
+    ):
+        self.extract_packages(
+            [(package_path, extract_file_types) for package_path in self.get_package_paths(category)]
+        )
+
+    def extract_package(
+        self,
+        package_path: str,
+        extract_file_types: List[str],
+    ) -> str:
+        """
+        Extracts all archives of a package and returns the result for the extraction index:
+        'extracted', 'failed' or 'no_archives'
+        """
+        # We collect a list of all files that we have extracted, so we can delete them later
+        extracted_files_in_package = []
+        has_failed = False
+        package_source = self.package_sources.get(os.path.normpath(package_path), {})
+        category_name = self.get_category_name(package_path)
+
+        self.remove_stale_tmp_files(package_path)
+        package_files = os.listdir(package_path)
+        for package_file in package_files:
+            package_file_path = PT.make_path(package_path, package_file)
+
+            # Skip all files that are not archives
+            pre_ext, ext = PT.get_file_exts(package_file)
+            if ext not in ['zip', 'rar']:
+                continue
 
-                # Skip all files that are not archives
-                pre_ext, ext = PT.get_file_exts(package_file)
-                if ext not in ['zip', 'rar']:
+            # Check if it is a multipart archive, we start extracting only with the first part
+            part_num = self.get_part_num(pre_ext)
+            if part_num > 1:
+                continue
+
+            logging.info('Start extracting %r', package_file_path)
+            # Start extraction
+            try:
+                container = None
+                if ext == 'zip':
+                    container = ZipFile(package_file_path)
+                elif ext == 'rar':
+                    container = RarFile(package_file_path)
+                if container is None:
+                    logging.warning('Could not open: %r', package_file_path)
+                    has_failed = True
+                    EXTRACT_ARCHIVES.inc(category=category_name, result='failed')
                     continue
 
-                # Check if it is a multipart archive, we start extracting only with the first part
-                part_num = self.get_part_num(pre_ext)
-                if part_num > 1:
+                password = self.set_password_if_needed(container, package_source)
+                archive_members = self.get_archive_members(container.infolist())
+
+                base_path_pattern = self.get_base_path_pattern(archive_members)
+                files_to_extract = self.get_files_to_extract(archive_members, extract_file_types)
+
+                if len(files_to_extract) == 0:
+                    logging.warning('No files found in %r, maybe wrong password!', package_file_path)
+                    has_failed = True
+                    EXTRACT_ARCHIVES.inc(category=category_name, result='failed')
                     continue
 
-                logging.info('Start extracting %r', package_file_path)
-                # Start extraction
-                try:
-                    container = None
-                    if ext == 'zip':
-                        container = ZipFile(package_file_path)
-                    elif ext == 'rar':
-                        container = RarFile(package_file_path)
-                    if container is None:
-                        logging.warning('Could not open: %r', package_file_path)
-                        continue
-
-                    self.set_password_if_needed(container)
-                    container_infolist = container.infolist()
-
-                    base_path_pattern = self.get_base_path_pattern(container_infolist)
-                    files_to_extract = self.get_files_to_extract(container_infolist, extract_file_types)
-
-                    if len(files_to_extract) == 0:
-                        logging.warning('No files found in %r, maybe wrong password!', package_file_path)
-                        continue
-
-                    num_files_to_extract = len(files_to_extract)
-                    for idx_file, file_to_extract in enumerate(files_to_extract):
-                        target_path = self.get_target_path(package_path, file_to_extract, base_path_pattern)
-
-                        source = container.open(file_to_extract)
-                        target = open(target_path, "wb")
-
-                        with source, target:
-                            shutil.copyfileobj(source, target)
-
-                        logging.info(
-                            "Done: %04d / %04d files %s", idx_file + 1, num_files_to_extract, next(self.spinner)
-                        )
-
-                    if part_num == 0:
-                        # For single part archives we just want to delete this file
-                        extracted_files_in_package.append(package_file)
-                    elif part_num == 1:
-                        # For multipart archives we want to remove all files that are part of the multipart archive
-                        multipart_arc_filenames = self.get_all_multipart_arc_filenames(package_file, package_files)
-                        extracted_files_in_package.extend(multipart_arc_filenames)
-                except Exception as extract_err:
-                    logging.error("Error on: %r", package_file_path)
-                    logging.error('%s: %s', type(extract_err), extract_err)
-                    traceback.print_exc()
-
-            # Remove all extracted archives
-            for file_to_delete in extracted_files_in_package:
-                file_to_delete_path = PT.make_path(package_path, file_to_delete)
-                logging.warning('Info: Deleting %s', file_to_delete_path)
-                try:
-                    os.remove(file_to_delete_path)
-                except OSError as delete_err:
-                    logging.error('Failed to remove: %s - Error: %s', file_to_delete_path, delete_err)
+                extract_start = time.perf_counter()
+                if isinstance(container, RarFile) and self.unrar_tool_path is not None:
+                    # A mask could match other members, members with wildcard characters are read by rarfile
+                    wildcard_files = [name for name in files_to_extract if self.has_unrar_wildcard(name)]
+                    extracted_bytes = self.extract_rar_members(
+                        package_file_path,
+                        password,
+                        [name for name in files_to_extract if not self.has_unrar_wildcard(name)],
+                        package_path,
+                        base_path_pattern,
+                    )
+                    extracted_bytes += self.extract_members(container, wildcard_files, package_path, base_path_pattern)
+                else:
+                    extracted_bytes = self.extract_members(
+                        container, files_to_extract, package_path, base_path_pattern
+                    )
+                extract_took = max(time.perf_counter() - extract_start, 1e-6)
+                logging.info(
+                    'Extracted %s from %r in %.3fs (%.2f MB/s)',
+                    format_bytes(extracted_bytes),
+                    package_file,
+                    extract_took,
+                    extracted_bytes / extract_took / 1000000,
+                )
+                EXTRACT_BYTES.inc(extracted_bytes, category=category_name)
+                EXTRACT_DURATION.inc(extract_took, category=category_name)
+                EXTRACT_THROUGHPUT.observe(extracted_bytes / extract_took / 1000000, category=category_name)
+                EXTRACT_ARCHIVES.inc(category=category_name, result='extracted')
+
+                # The extraction checked the CRC of every encrypted member, so the password is known to be right
+                self.remember_password(package_source.get('extractor_key', None), password)
+
+                if part_num == 0:
+                    # For single part archives we just want to delete this file
+                    extracted_files_in_package.append(package_file)
+                elif part_num == 1:
+                    # For multipart archives we want to remove all files that are part of the multipart archive
+                    multipart_arc_filenames = self.get_all_multipart_arc_filenames(package_file, package_files)
+                    extracted_files_in_package.extend(multipart_arc_filenames)
+            except Exception as extract_err:
+                has_failed = True
+                EXTRACT_ARCHIVES.inc(category=category_name, result='failed')
+                logging.error("Error on: %r", package_file_path)
+                logging.error('%s: %s', type(extract_err), extract_err)
+                traceback.print_exc()
+
+        # Remove all extracted archives
+        for file_to_delete in extracted_files_in_package:
+            file_to_delete_path = PT.make_path(package_path, file_to_delete)
+            logging.warning('Info: Deleting %s', file_to_delete_path)
+            try:
+                os.remove(file_to_delete_path)
+            except OSError as delete_err:
+                logging.error('Failed to remove: %s - Error: %s', file_to_delete_path, delete_err)
+
+        if has_failed:
+            return 'failed'
+        if len(extracted_files_in_package) > 0:
+            return 'extracted'
+        return 'no_archives'
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Benchmarks for the hot paths of atom-dl.
+
+Every benchmark is a sub command of `atom-dl-benchmark`, heavy modules are only imported by the selected benchmark.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import orjson
+
+
+def measure(func: Callable, rounds: int) -> float:
+    """
+    Runs func rounds times and returns the best run time in seconds
+    """
+    best_time = None
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        func()
+        took = time.perf_counter() - start_time
+        if best_time is None or took < best_time:
+            best_time = took
+    return best_time
+
+
+def log_throughput(name: str, num_bytes: int, took: float):
+    logging.info('%-28s %10.2f MB/s  (%.3f ms)', name, num_bytes / took / 1000000, took * 1000)
+
+
+def get_query_links_response(num_links: int) -> List[Dict]:
+    """
+    Creates a linkgrabber queryLinks response like JDownloader sends them
+    """
+    return [
+        {
+            "availability": "ONLINE",
+            "bytesTotal": 10485760 + idx,
+            "host": "rapidgator.net",
+            "name": f"Some_Author_-_Some_very_long_book_title_part_{idx:05d}.rar",
+            "packageUUID": 1700000000000 + idx // 4,
+            "url": f"https://rapidgator.net/file/{idx:032x}/Some_Author_-_Some_book_title.part{idx:05d}.rar.html",
+            "uuid": 1710000000000 + idx,
+        }
+        for idx in range(num_links)
+    ]
+
+
+def benchmark_my_jd_crypto(opts: argparse.Namespace):
+    from atom_dl.my_jd_api.my_jd_api import JdCipher  # pylint: disable=import-outside-toplevel
+
+    cipher = JdCipher(os.urandom(32))
+    payload = orjson.dumps({"data": get_query_links_response(opts.num_links), "rid": 1})
+    encrypted_payload = cipher.encrypt(payload)
+    logging.info('queryLinks response with %d links: %d bytes', opts.num_links, len(payload))
+
+    took = measure(lambda: cipher.encrypt(payload), opts.rounds)
+    log_throughput('encrypt', len(payload), took)
+
+    took = measure(lambda: cipher.decrypt(encrypted_payload), opts.rounds)
+    log_throughput('decrypt', len(payload), took)
+
+    took = measure(lambda: orjson.loads(cipher.decrypt(encrypted_payload)), opts.rounds)
+    log_throughput('decrypt + parse', len(payload), took)
+
+
+def log_rate(name: str, num_items: int, took: float):
+    logging.info('%-28s %10.0f items/s  (%.3f ms)', name, num_items / took, took * 1000)
+
+
+def load_feed_titles(feed_json_paths: List[str]) -> List[str]:
+    """
+    Collects the titles of all posts in the given feed JSON files (default: all stored feeds)
+    """
+    from atom_dl.utils import PathTools as PT  # pylint: disable=import-outside-toplevel
+    from atom_dl.utils import load_list_from_json  # pylint: disable=import-outside-toplevel
+
+    if not feed_json_paths:
+        feeds_dir = PT.get_feeds_directory()
+        feed_json_paths = [
+            PT.make_path(feeds_dir, filename)
+            for filename in sorted(os.listdir(feeds_dir))
+            if filename.endswith('.json')
+        ]
+
+    titles = []
+    for feed_json_path in feed_json_paths:
+        titles.extend(post['title'] for post in load_list_from_json(feed_json_path) if post.get('title') is not None)
+    return titles
+
+
+def benchmark_sanitize(opts: argparse.Namespace):
+    from atom_dl.utils import PathTools as PT  # pylint: disable=import-outside-toplevel
+
+    titles = load_feed_titles(opts.feed_json_paths)
+    if len(titles) == 0:
+        logging.warning('No feed found, using generated titles')
+        titles = [
+            f'Autor {idx} – Ein &amp; Titel: Band {idx % 7} (Reihe, 2020-…) [Englisch] / "Sammelpack" ?'
+            for idx in range(50000)
+        ]
+    logging.info('Corpus: %d titles (%d unique)', len(titles), len(set(titles)))
+
+    def sanitize_uncached():
+        for title in titles:
+            PT.to_valid_name_cached.__wrapped__(title, False)
+
+    def sanitize_cached():
+        for title in titles:
+            PT.to_valid_name(title)
+
+    took = measure(sanitize_uncached, opts.rounds)
+    log_rate('to_valid_name (uncached)', len(titles), took)
+
+    PT.to_valid_name_cached.cache_clear()
+    took = measure(sanitize_cached, 1)
+    log_rate('to_valid_name (cold cache)', len(titles), took)
+
+    took = measure(sanitize_cached, opts.rounds)
+    log_rate('to_valid_name (warm cache)', len(titles), took)
+
+
+def get_opts(max_parallel_downloads: int = 5):
+    from atom_dl.types import AtomDlOpts  # pylint: disable=import-outside-toplevel
+
+    return AtomDlOpts(
+        process_latest_feed=True,
+        path_to_job_defs=None,
+        feed_jdownloader=False,
+        extract_archives=False,
+        daemon=False,
+        do_not_auto_start_downloading=True,
+        max_parallel_downloads=max_parallel_downloads,
+        allow_insecure_ssl=False,
+        use_all_ciphers=False,
+        skip_cert_verify=False,
+        verbose=False,
+        quiet=False,
+        log_to_file=False,
+        log_file_path=None,
+    )
+
+
+def get_feed_extractor_instance(extractor_name: str, max_parallel_downloads: int):
+    from atom_dl.feed_extractor import get_feed_extractor  # pylint: disable=import-outside-toplevel
+
+    return get_feed_extractor(extractor_name)(get_opts(max_parallel_downloads))
+
+
+def get_peak_rss() -> int:
+    """
+    Returns the peak resident set size of this process in bytes
+    """
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        import psutil  # pylint: disable=import-outside-toplevel
+
+        return psutil.Process().memory_info().peak_wset
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def benchmark_record(opts: argparse.Namespace):
+    from datetime import datetime, timedelta, timezone  # pylint: disable=import-outside-toplevel
+
+    from atom_dl.http_fixtures import FixtureArchive  # pylint: disable=import-outside-toplevel
+    from atom_dl.network import FetchHooks  # pylint: disable=import-outside-toplevel
+
+    extractor = get_feed_extractor_instance(opts.extractor, opts.max_parallel_downloads)
+    until_date = datetime.now(timezone.utc) - timedelta(days=opts.days)
+    extractor.init(until_date)
+
+    archive = FixtureArchive(opts.fixture_path)
+    FetchHooks.response_recorder = archive.add
+    try:
+        result_list = extractor.download_latest_feed()
+    finally:
+        FetchHooks.response_recorder = None
+
+    archive.metadata = {
+        'extractor': opts.extractor,
+        'until_date': until_date.isoformat(),
+        'posts': len(result_list),
+    }
+    archive.save()
+    logging.info('Recorded %d responses (%d posts) to %r', len(archive.responses), len(result_list), opts.fixture_path)
+
+
+def benchmark_crawl(opts: argparse.Namespace):
+    import urllib.request  # pylint: disable=import-outside-toplevel
+    from datetime import datetime  # pylint: disable=import-outside-toplevel
+
+    from atom_dl.http_fixtures import FixtureArchive, ReplayServer  # pylint: disable=import-outside-toplevel
+    from atom_dl.network import FetchHooks  # pylint: disable=import-outside-toplevel
+    from atom_dl.utils import format_bytes  # pylint: disable=import-outside-toplevel
+
+    metadata = FixtureArchive(opts.fixture_path).load().metadata
+    extractor = get_feed_extractor_instance(metadata['extractor'], opts.max_parallel_downloads)
+
+    replay_server = ReplayServer(
+        opts.fixture_path, opts.latency_ms / 1000, opts.jitter_ms / 1000, opts.error_rate
+    )
+    with replay_server:
+        FetchHooks.url_rewriter = replay_server.rewrite_url
+        try:
+            extractor.init(datetime.fromisoformat(metadata['until_date']))
+            start_time = time.perf_counter()
+            start_cpu_time = time.process_time()
+            result_list = extractor.download_latest_feed()
+            took = time.perf_counter() - start_time
+            cpu_time = time.process_time() - start_cpu_time
+        finally:
+            FetchHooks.url_rewriter = None
+        with urllib.request.urlopen(replay_server.base_url + '/stats') as stats_response:
+            stats = orjson.loads(stats_response.read())  # pylint: disable=maybe-no-member
+
+    logging.info(
+        'Served %d pages (%d injected errors, %d not recorded, %s)',
+        stats['requests'],
+        stats['errors'],
+        stats['not_found'],
+        format_bytes(stats['bytes']),
+    )
+    logging.info('Extracted %d posts (%d when recorded)', len(result_list), metadata.get('posts', 0))
+    logging.info('%-28s %10.3f s', 'wall time', took)
+    logging.info('%-28s %10.3f s', 'cpu time', cpu_time)
+    logging.info('%-28s %10.1f pages/s', 'pages', stats['requests'] / took)
+    logging.info('%-28s %10.1f posts/s', 'posts', len(result_list) / took)
+    logging.info('%-28s %10s', 'peak rss', format_bytes(get_peak_rss()))
+
+
+def get_benchmark_jobs(num_jobs: int, links_per_job: int) -> List[Dict]:
+    """
+    Creates jobs like JobCreator.create_job does
+    """
+    jobs = []
+    for idx in range(num_jobs):
+        package_name = f'Some Author - Some book title {idx:05d}'
+        jobs.append(
+            {
+                "title": package_name,
+                "page_link": f"https://ibooks.to/{idx}/",
+                "page_id": f"https://ibooks.to/?p={idx}",
+                "download_links": [
+                    f"https://rapidgator.net/file/{idx:08x}{part:04x}/book_{idx:05d}.part{part + 1}.rar.html"
+                    for part in range(links_per_job)
+                ],
+                "destination_path": f"/storage/Bücher/{package_name}",
+                "package_name": package_name,
+                "password": "ibooks.to",
+                "extractor_key": "Ibooks",
+                "filter_done_file_names": False,
+            }
+        )
+    return jobs
+
+
+def benchmark_jd_feed(opts: argparse.Namespace):
+    import tempfile  # pylint: disable=import-outside-toplevel
+
+    from atom_dl.my_jd_api.mock_server import (  # pylint: disable=import-outside-toplevel
+        MockMyJdDevice,
+        MockMyJdServer,
+    )
+    from atom_dl.utils import PathTools as PT  # pylint: disable=import-outside-toplevel
+    from atom_dl.utils import write_to_json  # pylint: disable=import-outside-toplevel
+
+    device = MockMyJdDevice(
+        'benchmark', opts.crawl_latency_ms / 1000, opts.crawl_jitter_ms / 1000, opts.check_latency_ms / 1000, seed=1
+    )
+    mock_server = MockMyJdServer('benchmark@example.com', 'benchmark', device, opts.request_latency_ms / 1000)
+
+    old_environ = dict(os.environ)
+    with tempfile.TemporaryDirectory(prefix='atom-dl-benchmark-') as tmp_dir, mock_server:
+        # Config, jobs and done lists of the benchmark are kept apart from the real ones
+        os.environ['XDG_CONFIG_HOME'] = PT.make_path(tmp_dir, 'config')
+        os.environ['XDG_DATA_HOME'] = PT.make_path(tmp_dir, 'data')
+        try:
+            from atom_dl.jobs_feeder import JobsFeeder  # pylint: disable=import-outside-toplevel
+            from atom_dl.jobs_queue import JobsQueue  # pylint: disable=import-outside-toplevel
+
+            os.makedirs(PT.get_project_config_directory(), exist_ok=True)
+            write_to_json(
+                PT.get_path_of_config_json(),
+                {
+                    'storage_path': PT.make_path(tmp_dir, 'storage'),
+                    'my_jd_username': 'benchmark@example.com',
+                    'my_jd_password': 'benchmark',
+                    'my_jd_device': 'benchmark',
+                    'my_jd_api_url': mock_server.api_url,
+                },
+                fsync=False,
+            )
+            jobs_queue = JobsQueue()
+            jobs_queue.push(get_benchmark_jobs(opts.num_jobs, opts.links_per_job))
+            jobs_queue.close()
+
+            jobs_feeder = JobsFeeder(get_opts())
+            start_time = time.perf_counter()
+            start_cpu_time = time.process_time()
+            jobs_feeder.process()
+            took = time.perf_counter() - start_time
+            cpu_time = time.process_time() - start_cpu_time
+            checked_jobs = jobs_feeder.checked_jobs
+            del jobs_feeder
+        finally:
+            os.environ.clear()
+            os.environ.update(old_environ)
+
+    status_counts = {}
+    for checked_job in checked_jobs:
+        status_counts[checked_job.get('status')] = status_counts.get(checked_job.get('status'), 0) + 1
+    logging.info('Checked %d of %d jobs: %s', len(checked_jobs), opts.num_jobs, status_counts)
+    logging.info('Api requests: %d %s', mock_server.stats['requests'], mock_server.stats['actions'])
+    logging.info('%-28s %10.3f s', 'wall time', took)
+    logging.info('%-28s %10.3f s', 'cpu time', cpu_time)
+    logging.info('%-28s %10.1f jobs/min', 'jobs', len(checked_jobs) / took * 60)
+
+
+def parse_import_times(importtime_output: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parses the output of python -X importtime into module -> (self us, cumulative us)
+    """
+    import_times = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, module_name = line[len('import time:') :].split('|')
+        import_times[module_name.strip()] = (int(self_us), int(cumulative_us))
+    return import_times
+
+
+def benchmark_startup(opts: argparse.Namespace):
+    import statistics  # pylint: disable=import-outside-toplevel
+    import subprocess  # pylint: disable=import-outside-toplevel
+
+    def run_python(*args: str) -> Tuple[float, str]:
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+        return time.perf_counter() - start_time, result.stderr
+
+    import_code = f'import {opts.module}'
+    # The first run compiles the byte code
+    run_python('-c', import_code)
+
+    baseline_times = [run_python('-c', 'pass')[0] for _ in range(opts.runs)]
+    wall_times = [run_python('-c', import_code)[0] for _ in range(opts.runs)]
+    cumulative_times: Dict[str, List[int]] = {}
+    self_times: Dict[str, List[int]] = {}
+    for _ in range(opts.runs):
+        import_times = parse_import_times(run_python('-X', 'importtime', '-c', import_code)[1])
+        for module_name, (self_us, cumulative_us) in import_times.items():
+            cumulative_times.setdefault(module_name, []).append(cumulative_us)
+            self_times.setdefault(module_name, []).append(self_us)
+
+    module_cumulative_us = statistics.median(cumulative_times.get(opts.module, [0]))
+    logging.info('%-40s %10.1f ms', 'interpreter startup (median)', statistics.median(baseline_times) * 1000)
+    logging.info('%-40s %10.1f ms', f'{opts.module} startup (median)', statistics.median(wall_times) * 1000)
+    logging.info('%-40s %10.1f ms', f'{opts.module} import time (median)', module_cumulative_us / 1000)
+    logging.info('%-40s %10d', 'imported modules', len(cumulative_times))
+
+    logging.info('Slowest imports (median, cumulative / self):')
+    slowest_modules = sorted(
+        cumulative_times, key=lambda module_name: statistics.median(cumulative_times[module_name]), reverse=True
+    )
+    for module_name in [module_name for module_name in slowest_modules if module_name != opts.module][: opts.top]:
+        logging.info(
+            '  %-38s %10.1f ms %10.1f ms',
+            module_name,
+            statistics.median(cumulative_times[module_name]) / 1000,
+            statistics.median(self_times[module_name]) / 1000,
+        )
+
+
+def get_parser():
+    """
+    Creates a new argument parser.
+    """
+    parser = argparse.ArgumentParser(description=('Atom Downloader - Benchmarks'))
+    parser.add_argument(
+        '-r',
+        '--rounds',
+        dest='rounds',
+        default=5,
+        type=int,
+        help=('Number of rounds per measurement, the best round is reported. (default: %(default)s)'),
+    )
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    crypto_parser = subparsers.add_parser(
+        'my-jd-crypto', help='Encrypt/decrypt throughput of My.JDownloader payloads'
+    )
+    crypto_parser.add_argument(
+        '-n',
+        '--num-links',
+        dest='num_links',
+        default=20000,
+        type=int,
+        help=('Number of links in the simulated queryLinks response. (default: %(default)s)'),
+    )
+    crypto_parser.set_defaults(func=benchmark_my_jd_crypto)
+
+    sanitize_parser = subparsers.add_parser('sanitize', help='Throughput of the filename sanitizer on feed titles')
+    sanitize_parser.add_argument(
+        'feed_json_paths',
+        nargs='*',
+        help=('Feed JSON files to take the titles from. (default: all stored feeds)'),
+    )
+    sanitize_parser.set_defaults(func=benchmark_sanitize)
+
+    record_parser = subparsers.add_parser('record', help='Record the responses of a feed crawl into a fixture archive')
+    record_parser.add_argument('extractor', help='Name of the feed extractor, like Ibooks')
+    record_parser.add_argument('fixture_path', help='Path of the fixture archive to write')
+    record_parser.add_argument(
+        '--days',
+        dest='days',
+        default=3,
+        type=float,
+        help=('Record the posts of the last days. (default: %(default)s)'),
+    )
+    record_parser.set_defaults(func=benchmark_record)
+
+    crawl_parser = subparsers.add_parser('crawl', help='Crawl a recorded feed from a local replay server')
+    crawl_parser.add_argument('fixture_path', help='Path of the recorded fixture archive')
+    crawl_parser.add_argument(
+        '--latency-ms',
+        dest='latency_ms',
+        default=0.0,
+        type=float,
+        help=('Latency of every response in milliseconds. (default: %(default)s)'),
+    )
+    crawl_parser.add_argument(
+        '--jitter-ms',
+        dest='jitter_ms',
+        default=0.0,
+        type=float,
+        help=('Random additional latency in milliseconds. (default: %(default)s)'),
+    )
+    crawl_parser.add_argument(
+        '--error-rate',
+        dest='error_rate',
+        default=0.0,
+        type=float,
+        help=('Fraction of responses that fail with 503. (default: %(default)s)'),
+    )
+
+    for feed_parser in [record_parser, crawl_parser]:
+        feed_parser.add_argument(
+            '-p',
+            '--max-parallel-downloads',
+            dest='max_parallel_downloads',
+            default=5,
+            type=int,
+            help=('Sets the number of max parallel downloads. (default: %(default)s)'),
+        )
+    crawl_parser.set_defaults(func=benchmark_crawl)
+
+    jd_feed_parser = subparsers.add_parser(
+        'jd-feed', help='Feed queued jobs to a local mock My.JDownloader server with JobsFeeder'
+    )
+    jd_feed_parser.add_argument(
+        '-n',
+        '--num-jobs',
+        dest='num_jobs',
+        default=1000,
+        type=int,
+        help=('Number of queued jobs. (default: %(default)s)'),
+    )
+    jd_feed_parser.add_argument(
+        '--links-per-job',
+        dest='links_per_job',
+        default=4,
+        type=int,
+        help=('Number of download links per job. (default: %(default)s)'),
+    )
+    jd_feed_parser.add_argument(
+        '--crawl-latency-ms',
+        dest='crawl_latency_ms',
+        default=2000.0,
+        type=float,
+        help=('Time the simulated link crawler needs per job in milliseconds. (default: %(default)s)'),
+    )
+    jd_feed_parser.add_argument(
+        '--crawl-jitter-ms',
+        dest='crawl_jitter_ms',
+        default=1000.0,
+        type=float,
+        help=('Random additional crawl time in milliseconds. (default: %(default)s)'),
+    )
+    jd_feed_parser.add_argument(
+        '--check-latency-ms',
+        dest='check_latency_ms',
+        default=500.0,
+        type=float,
+        help=('Time the simulated link checker needs per job in milliseconds. (default: %(default)s)'),
+    )
+    jd_feed_parser.add_argument(
+        '--request-latency-ms',
+        dest='request_latency_ms',
+        default=20.0,
+        type=float,
+        help=('Latency of every api request in milliseconds. (default: %(default)s)'),
+    )
+    jd_feed_parser.set_defaults(func=benchmark_jd_feed)
+
+    startup_parser = subparsers.add_parser('startup', help='Startup and import time of the CLI (python -X importtime)')
+    startup_parser.add_argument(
+        '-n',
+        '--runs',
+        dest='runs',
+        default=10,
+        type=int,
+        help=('Number of interpreter runs per measurement, the median is reported. (default: %(default)s)'),
+    )
+    startup_parser.add_argument(
+        '-m',
+        '--module',
+        dest='module',
+        default='atom_dl.main',
+        help=('Module to import, e.g. atom_dl.archive_extractor for the modules of a task. (default: %(default)s)'),
+    )
+    startup_parser.add_argument(
+        '--top',
+        dest='top',
+        default=15,
+        type=int,
+        help=('Number of the slowest imports to list. (default: %(default)s)'),
+    )
+    startup_parser.set_defaults(func=benchmark_startup)
+
+    return parser
+
+
+def main(args=None):
+    """The benchmark routine."""
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    opts = get_parser().parse_args(args)
+    opts.func(opts)
+
+
+if __name__ == "__main__":
+    main()
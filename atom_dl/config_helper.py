@@ -73,6 +73,12 @@ class Config:
     def get_my_jd_device(self) -> str:
         return self.get_property('my_jd_device')
 
+    def get_my_jd_api_url(self) -> str:
+        try:
+            return self.get_property('my_jd_api_url')
+        except ValueError:
+            return 'https://api.jdownloader.org'
+
     def get_storage_path(self) -> str:
         return PT.get_abs_path(self.get_property('storage_path'))
 
@@ -81,3 +87,87 @@ class Config:
             return self.get_property('auto_start_downloading')
         except ValueError:
             return False
+
+    def get_max_parallel_decrypt_jobs(self) -> int:
+        try:
+            return self.get_property('max_parallel_decrypt_jobs')
+        except ValueError:
+            return 200
+
+    def get_max_parallel_add_links(self) -> int:
+        try:
+            return self.get_property('max_parallel_add_links')
+        except ValueError:
+            return 10
+
+    def get_max_parallel_extractions(self) -> int:
+        try:
+            return self.get_property('max_parallel_extractions')
+        except ValueError:
+            return os.cpu_count() or 1
+
+    def get_max_parallel_extractions_per_disk(self) -> int:
+        try:
+            return self.get_property('max_parallel_extractions_per_disk')
+        except ValueError:
+            return 4
+
+    def get_extract_copy_buffer_size(self) -> int:
+        try:
+            return self.get_property('extract_copy_buffer_size')
+        except ValueError:
+            return 4 * 1024 * 1024
+
+    def get_fsync_state_files(self) -> bool:
+        try:
+            return self.get_property('fsync_state_files')
+        except ValueError:
+            return True
+
+    def get_jobs_retention_days(self) -> int:
+        try:
+            return self.get_property('jobs_retention_days')
+        except ValueError:
+            return 90
+
+    def get_dedup_mode(self) -> str:
+        try:
+            return self.get_property('dedup_mode')
+        except ValueError:
+            return 'off'
+
+    def get_extract_stable_minutes(self) -> int:
+        try:
+            return self.get_property('extract_stable_minutes')
+        except ValueError:
+            return 10
+
+    def get_metrics_file_path(self) -> str:
+        try:
+            return self.get_property('metrics_file_path')
+        except ValueError:
+            return PT.get_path_of_metrics_file()
+
+    def get_metrics_port(self) -> int:
+        try:
+            return self.get_property('metrics_port')
+        except ValueError:
+            return None
+
+    def get_daemon_feed_update_minutes(self) -> int:
+        try:
+            return self.get_property('daemon_feed_update_minutes')
+        except ValueError:
+            return 60
+
+    def get_daemon_feed_jdownloader_minutes(self) -> int:
+        try:
+            return self.get_property('daemon_feed_jdownloader_minutes')
+        except ValueError:
+            return 15
+
+    def get_daemon_extract_archives_minutes(self) -> int:
+        try:
+            return self.get_property('daemon_extract_archives_minutes')
+        except ValueError:
+            return 30
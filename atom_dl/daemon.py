@@ -0,0 +1,141 @@
+import logging
+import signal
+import threading
+import time
+import traceback
+from typing import Callable, List
+
+from atom_dl.archive_extractor import ArchiveExtractor
+from atom_dl.config_helper import Config
+from atom_dl.jobs_feeder import JobsFeeder
+from atom_dl.latest_feed_processor import LatestFeedProcessor
+from atom_dl.locks import LockError, TaskLocks
+from atom_dl.metrics import REGISTRY, TASK_DURATION
+from atom_dl.types import AtomDlOpts
+from atom_dl.utils import formatSeconds
+
+
+class ScheduledTask:
+    def __init__(self, name: str, interval: float, run: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        # All tasks run once directly after the start
+        self.next_run = time.monotonic()
+
+
+# A task that is skipped because another process holds one of its resources is tried again after this time
+LOCK_RETRY_SECONDS = 60
+
+
+class Daemon:
+    """
+    Runs the feed update, the JDownloader feeding and the archive extraction in one long living process.
+
+    In contrast to one-shot runs the interpreter, the HTTP sessions and SSL contexts, the MyJDownloader
+    connection, the done index and the job creators of the job definitions are kept in memory between runs.
+    Tasks run one after another, each one again after its interval (in minutes, 0 disables a task) has passed.
+    The resources of a task are only locked while it runs, so one-shot runs of other tasks can happen in between.
+    """
+
+    def __init__(self, opts: AtomDlOpts):
+        self.opts = opts
+        self.stop_event = threading.Event()
+
+        self.latest_feed_processor = LatestFeedProcessor(opts)
+        self.jobs_feeder = None
+        self.archive_extractor = None
+
+        config = Config()
+        self.tasks: List[ScheduledTask] = []
+        for name, minutes, run in [
+            ('process_latest_feed', config.get_daemon_feed_update_minutes(), self.process_latest_feed),
+            ('feed_jdownloader', config.get_daemon_feed_jdownloader_minutes(), self.feed_jdownloader),
+            ('extract_archives', config.get_daemon_extract_archives_minutes(), self.extract_archives),
+        ]:
+            if minutes > 0:
+                self.tasks.append(ScheduledTask(name, minutes * 60, run))
+            else:
+                logging.info('Task %s is disabled in daemon mode', name)
+
+    def process_latest_feed(self):
+        self.latest_feed_processor.process()
+
+    def feed_jdownloader(self):
+        if self.jobs_feeder is None:
+            self.jobs_feeder = JobsFeeder(self.opts)
+        else:
+            self.jobs_feeder.refresh_connection()
+        self.jobs_feeder.process()
+
+    def extract_archives(self):
+        if self.archive_extractor is None:
+            self.archive_extractor = ArchiveExtractor()
+        self.archive_extractor.process()
+
+    def handle_stop_signal(self, signum, _):
+        if self.stop_event.is_set():
+            raise KeyboardInterrupt
+        logging.info('Received signal %d, stopping after the current task (repeat to stop now)', signum)
+        self.stop_event.set()
+
+    def run_task(self, task: ScheduledTask):
+        task_locks = TaskLocks(task.name)
+        try:
+            task_locks.acquire()
+        except LockError as lock_err:
+            logging.warning('Skipping task %s: %s', task.name, lock_err)
+            task.next_run = time.monotonic() + min(task.interval, LOCK_RETRY_SECONDS)
+            return
+
+        logging.info('Starting task %s', task.name)
+        task_start = time.monotonic()
+        try:
+            with TASK_DURATION.time(task=task.name):
+                task.run()
+        except (Exception, SystemExit) as task_err:
+            # The tasks exit on fatal errors, in daemon mode we try again on the next run
+            import sentry_sdk  # pylint: disable=import-outside-toplevel
+
+            sentry_sdk.capture_exception(task_err)
+            logging.error('Task %s failed: %s', task.name, task_err)
+            logging.debug(traceback.format_exc())
+            if task.name == 'feed_jdownloader' and self.jobs_feeder is not None:
+                # Connect again on the next run
+                self.jobs_feeder.close()
+                self.jobs_feeder = None
+        finally:
+            task_locks.release()
+            task_end = time.monotonic()
+            task.next_run = task_end + task.interval
+            REGISTRY.write_to_file(Config().get_metrics_file_path())
+        logging.info(
+            'Finished task %s in %s, next run in %s',
+            task.name,
+            formatSeconds(task_end - task_start),
+            formatSeconds(task.interval),
+        )
+
+    def run(self):
+        if len(self.tasks) == 0:
+            logging.warning('All tasks are disabled, nothing to do in daemon mode')
+            return
+
+        old_handlers = {
+            signum: signal.signal(signum, self.handle_stop_signal) for signum in [signal.SIGINT, signal.SIGTERM]
+        }
+        try:
+            while not self.stop_event.is_set():
+                for task in self.tasks:
+                    if self.stop_event.is_set():
+                        break
+                    if task.next_run <= time.monotonic():
+                        self.run_task(task)
+                next_run = min(task.next_run for task in self.tasks)
+                self.stop_event.wait(max(next_run - time.monotonic(), 0))
+        finally:
+            for signum, old_handler in old_handlers.items():
+                signal.signal(signum, old_handler)
+            if self.jobs_feeder is not None:
+                self.jobs_feeder.close()
+        logging.info('Daemon stopped')
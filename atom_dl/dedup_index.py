@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+from atom_dl.utils import append_list_to_json, iter_list_from_json, load_dict_from_json, recover_json_wal, write_to_json
+
+
+class DedupIndex:
+    """
+    Content addressed index of the files in the storage.
+
+    Files are only compared if they have the same size, then their partial hash (first block)
+    and only if that matches too their full hash is computed. Hashes are cached per path
+    as long as size and mtime of the file do not change.
+
+    The index is stored as a snapshot plus a journal of [path, entry] records (entry is null for removed files).
+    A save only appends the changed entries to the journal, the snapshot is rewritten once the journal
+    has as many records as the index has entries.
+    """
+
+    dedup_modes = ['hardlink', 'delete', 'off']
+    partial_hash_size = 64 * 1024
+    read_block_size = 1024 * 1024
+
+    def __init__(self, path_of_index: str, path_of_journal: str, dedup_mode: str, tmp_prefix: str, fsync: bool):
+        self.path_of_index = path_of_index
+        self.path_of_journal = path_of_journal
+        self.dedup_mode = dedup_mode
+        self.fsync = fsync
+        # Temporary hard links get the prefix of the other temporary files, so leftovers are cleaned up alike
+        self.tmp_prefix = tmp_prefix
+        self.is_new = not os.path.exists(path_of_index) and not os.path.exists(path_of_journal)
+        self.lock = threading.Lock()
+
+        # path -> {'size', 'mtime_ns', 'partial_hash', 'full_hash'}
+        self.files: Dict[str, Dict] = {}
+        # Paths whose entry was added, changed or removed since the last save
+        self.changed_paths = set()
+        self.num_journal_records = 0
+        if dedup_mode != 'off':
+            self.files = load_dict_from_json(path_of_index)
+            # The archive extractor holds the storage_tree lock, so no other writer is appending to the journal
+            recover_json_wal(path_of_journal, fsync)
+            for path, entry in iter_list_from_json(path_of_journal):
+                self.num_journal_records += 1
+                if entry is None:
+                    self.files.pop(path, None)
+                else:
+                    self.files[path] = entry
+        # size -> set of paths
+        self.paths_by_size: Dict[int, set] = {}
+        for path, entry in self.files.items():
+            self.paths_by_size.setdefault(entry['size'], set()).add(path)
+
+    def save(self):
+        with self.lock:
+            if len(self.changed_paths) == 0:
+                return
+            records = [[path, self.files.get(path, None)] for path in sorted(self.changed_paths)]
+            append_list_to_json(self.path_of_journal, records, self.fsync)
+            self.num_journal_records += len(records)
+            self.changed_paths = set()
+            if self.num_journal_records < len(self.files):
+                return
+            # The journal ends with the current entries, so replaying it on the new snapshot changes nothing
+            write_to_json(self.path_of_index, self.files, self.fsync)
+            os.remove(self.path_of_journal)
+            self.num_journal_records = 0
+
+    def register(self, path: str, stat_result: os.stat_result):
+        """
+        Adds or updates the entry of a file, the caller has to hold the lock
+        """
+        old_entry = self.files.get(path, None)
+        if old_entry is not None:
+            if old_entry['size'] == stat_result.st_size and old_entry['mtime_ns'] == stat_result.st_mtime_ns:
+                return
+            self.unregister(path)
+        self.files[path] = {'size': stat_result.st_size, 'mtime_ns': stat_result.st_mtime_ns}
+        self.paths_by_size.setdefault(stat_result.st_size, set()).add(path)
+        self.changed_paths.add(path)
+
+    def unregister(self, path: str):
+        """
+        Removes the entry of a file, the caller has to hold the lock
+        """
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return
+        self.changed_paths.add(path)
+        paths_with_size = self.paths_by_size.get(entry['size'], None)
+        if paths_with_size is not None:
+            paths_with_size.discard(path)
+            if len(paths_with_size) == 0:
+                del self.paths_by_size[entry['size']]
+
+    def add_existing_files(self, paths: Iterable[str]):
+        """
+        Registers files that are already in the storage, without hashing or deduplicating them
+        """
+        with self.lock:
+            for path in paths:
+                try:
+                    path = os.path.abspath(path)
+                    self.register(path, os.stat(path))
+                except OSError:
+                    continue
+
+    def compute_hash(self, path: str, partial: bool) -> str:
+        file_hash = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as hash_file:
+            if partial:
+                file_hash.update(hash_file.read(self.partial_hash_size))
+            else:
+                while True:
+                    block = hash_file.read(self.read_block_size)
+                    if not block:
+                        break
+                    file_hash.update(block)
+        return file_hash.hexdigest()
+
+    def get_hash(self, path: str, hash_key: str) -> Optional[str]:
+        """
+        Returns the cached hash of an indexed file or computes it.
+        Returns None and forgets the file if it was removed or changed since it was indexed.
+        """
+        with self.lock:
+            entry = self.files.get(path, None)
+            if entry is None:
+                return None
+            if hash_key in entry:
+                return entry[hash_key]
+            size, mtime_ns = entry['size'], entry['mtime_ns']
+
+        try:
+            stat_result = os.stat(path)
+            if stat_result.st_size != size or stat_result.st_mtime_ns != mtime_ns:
+                raise FileNotFoundError(path)
+            file_hash = self.compute_hash(path, hash_key == 'partial_hash')
+        except OSError:
+            with self.lock:
+                self.unregister(path)
+            return None
+
+        with self.lock:
+            entry = self.files.get(path, None)
+            if entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+                entry[hash_key] = file_hash
+                self.changed_paths.add(path)
+        return file_hash
+
+    def find_duplicate(self, path: str) -> Optional[str]:
+        with self.lock:
+            entry = self.files.get(path, None)
+            if entry is None:
+                return None
+            size = entry['size']
+            candidates = sorted(self.paths_by_size.get(size, set()) - {path})
+        if size == 0 or len(candidates) == 0:
+            return None
+
+        for hash_key in ['partial_hash', 'full_hash']:
+            own_hash = self.get_hash(path, hash_key)
+            if own_hash is None:
+                return None
+            candidates = [candidate for candidate in candidates if self.get_hash(candidate, hash_key) == own_hash]
+            if len(candidates) == 0:
+                return None
+        return candidates[0]
+
+    def add_file(self, path: str) -> Optional[str]:
+        """
+        Adds a newly written file to the index and handles it according to the dedup mode
+        @return: The path of the file it is a duplicate of, or None
+        """
+        if self.dedup_mode == 'off':
+            return None
+
+        path = os.path.abspath(path)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            self.register(path, stat_result)
+
+        duplicate_of = self.find_duplicate(path)
+        if duplicate_of is None:
+            return None
+
+        with self.lock:
+            # The original could have been removed by a concurrent call in the meantime
+            if duplicate_of not in self.files or path not in self.files:
+                return None
+            try:
+                original_stat = os.stat(duplicate_of)
+                if (original_stat.st_dev, original_stat.st_ino) == (stat_result.st_dev, stat_result.st_ino):
+                    # Already hard linked
+                    return duplicate_of
+
+                if self.dedup_mode == 'delete':
+                    os.remove(path)
+                    self.unregister(path)
+                    logging.info('Removed %r, it is a duplicate of %r', path, duplicate_of)
+                else:
+                    tmp_link_path = os.path.join(
+                        os.path.dirname(path), self.tmp_prefix + os.path.basename(path) + '.link'
+                    )
+                    os.link(duplicate_of, tmp_link_path)
+                    try:
+                        os.replace(tmp_link_path, path)
+                    except OSError:
+                        os.remove(tmp_link_path)
+                        raise
+                    self.unregister(path)
+                    self.register(path, os.stat(path))
+                    self.files[path].update(
+                        {key: value for key, value in self.files[duplicate_of].items() if key.endswith('_hash')}
+                    )
+                    logging.info('Hard linked %r to its duplicate %r', path, duplicate_of)
+            except OSError as dedup_err:
+                logging.warning('Could not deduplicate %r (duplicate of %r): %s', path, duplicate_of, dedup_err)
+        return duplicate_of
@@ -5,34 +5,17 @@ import sys
 import time
 import traceback
 from datetime import datetime
-from enum import Enum
 from itertools import cycle
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from aiohttp import ClientResponseError
-from bs4 import BeautifulSoup
 from lxml import etree
-from lxml.html import soupparser
 from requests.exceptions import RequestException
 
-from atom_dl.types import AtomDlOpts
-from atom_dl.utils import FetchWorkerPool, SslHelper, formatSeconds
-
-
-class TopCategory(Enum):
-    books = 'Bücher'
-    textbooks = 'Fachbücher'
-    language_teaching_material = 'Sprachunterricht'
-    magazines = 'Magazine'
-    newspapers = 'Zeitungen'
-    comics = 'Comics'
-    manga = 'Manga'
-    audios = 'Audios'
-    videos = 'Videos'
-    movies = 'Filme'
-    series = 'Serien'
-    anime = 'Anime'
-    software = 'Software'
+from atom_dl.metrics import FETCH_FAILURES, FETCH_RETRIES, PARSE_DURATION
+from atom_dl.network import FetchHooks, FetchWorkerPool, SslHelper
+from atom_dl.types import AtomDlOpts, TopCategory
+from atom_dl.utils import formatSeconds
 
 
 class RetryException(Exception):
@@ -70,12 +53,32 @@ class FeedInfoExtractor:
         'www.comicmafia.to',
     ]
 
+    # Url of the atom feed pages, with {page_id} starting at 1
+    feed_url: str = None
+
     def __init__(self, opts: AtomDlOpts):
         self.until_date = datetime.fromtimestamp(0)
+        self.until_page_ids = None
         self.opts = opts
 
-    def init(self, until_date: datetime):
+    def init(self, until_date: datetime, until_page_ids: Optional[List[str]] = None):
+        """
+        @param until_date: Published date of the newest post that was already downloaded
+        @param until_page_ids: Page ids of the downloaded posts published at exactly the until date,
+                               None if posts published at the until date are all downloaded
+        """
         self.until_date = until_date
+        self.until_page_ids = None if until_page_ids is None else set(until_page_ids)
+
+    def is_already_downloaded(self, published_date: datetime, page_id: Optional[str]) -> bool:
+        """
+        Return True if a post is not newer than the watermark of the last feed update
+        """
+        if published_date < self.until_date:
+            return True
+        if published_date > self.until_date:
+            return False
+        return self.until_page_ids is None or page_id in self.until_page_ids
 
     async def fetch_page_and_extract(
         self,
@@ -96,7 +99,8 @@ class FeedInfoExtractor:
                         status_dict['skipped'] += 1
                         return
                     page_text = await worker.fetch(link)
-                result = extractor_method(page_idx, link, page_text, status_dict)
+                with PARSE_DURATION.time(extractor=self.fie_key(), page_type='post'):
+                    result = extractor_method(page_idx, link, page_text, status_dict)
                 if result is not None:
                     if isinstance(result, list):
                         result_list += result
@@ -113,6 +117,7 @@ class FeedInfoExtractor:
                 if retried < self.opts.max_reties_of_downloads:
                     retried += 1
                     allowed_to_retry = True
+                    FETCH_RETRIES.inc(extractor=self.fie_key())
                     await asyncio.sleep(e.retry_after)
                 else:
                     logging.error('Max retries reached for %s', link)
@@ -155,20 +160,29 @@ class FeedInfoExtractor:
             ],
         )
         status_dict['stop'] = True
+        FETCH_FAILURES.inc(status_dict['failed'], extractor=self.fie_key())
 
-    def get_max_page_for(self, url, pattern):
+    def fetch_page(self, url: str):
+        """
+        Fetches a single page synchronously, used for the requests before the crawl starts
+        """
         try:
             session = SslHelper.custom_requests_session(
                 self.opts.skip_cert_verify, self.opts.allow_insecure_ssl, self.opts.use_all_ciphers
             )
             response = session.get(
-                url,
+                FetchHooks.rewrite_url(url),
                 headers=self.stdHeader,
                 allow_redirects=True,
                 timeout=60,
             )
         except RequestException as error:
             raise ConnectionError(f"Connection error: {str(error)}") from None
+        FetchHooks.record_response(url, response.status_code, response.content)
+        return response
+
+    def get_max_page_for(self, url, pattern):
+        response = self.fetch_page(url)
 
         result = pattern.findall(response.text)
         if len(result) <= 0:
@@ -177,11 +191,51 @@ class FeedInfoExtractor:
 
         return int(result[-1])
 
+    def get_first_page_fingerprint(self) -> Optional[Dict]:
+        """
+        Fetches only the first page of the atom feed and returns the id and the published date of its newest entry.
+        Returns None if the first page could not be read.
+        """
+        if self.feed_url is None:
+            return None
+        first_page_link = self.feed_url.format(page_id=1)
+        try:
+            response = self.fetch_page(first_page_link)
+            if response.status_code != 200:
+                logging.warning('Invalid response (%s) for %s', response.status_code, first_page_link)
+                return None
+            root = self.load_xml_from_string(first_page_link, response.text)
+        except (ConnectionError, RetryException, ValueError) as error:
+            logging.warning('Could not read the first feed page %s: %s', first_page_link, error)
+            return None
+        if root is None:
+            return None
+
+        newest_entry = None
+        for entry in root.xpath('//atom:entry', namespaces=self.xml_ns):
+            published_nodes = entry.xpath('.//atom:published/text()', namespaces=self.xml_ns)
+            page_id_nodes = entry.xpath('.//atom:id/text()', namespaces=self.xml_ns)
+            if len(published_nodes) == 0:
+                continue
+            try:
+                parsed_published_date = datetime.strptime(published_nodes[0], self.default_time_format)
+            except ValueError:
+                continue
+            if newest_entry is None or parsed_published_date > newest_entry[0]:
+                page_id = page_id_nodes[0] if len(page_id_nodes) > 0 else None
+                newest_entry = (parsed_published_date, published_nodes[0], page_id)
+        if newest_entry is None:
+            return None
+        return {'published_date': newest_entry[1], 'page_id': newest_entry[2]}
+
     def load_xml_from_string(self, page_link: str, page_text: str):
         try:
             if not page_text.lstrip().startswith('<?xml'):
                 # Not an xml file, retry
                 try:
+                    # bs4 is only needed on this error path, so it is imported here
+                    from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
                     soup = BeautifulSoup(page_text, 'lxml')
                     error = soup.get_text(separator='\n', strip=True)
                 except Exception:
@@ -199,6 +253,8 @@ class FeedInfoExtractor:
             try:
                 # Try with beautifulsoup
                 logging.error("Error in %s, could not parse XML! %s - Retry with BeautifulSoup", page_link, error)
+                from lxml.html import soupparser  # pylint: disable=import-outside-toplevel
+
                 root = soupparser.fromstring(page_text)
             except etree.XMLSyntaxError as error_inner:
                 logging.error("Error in %s, could not parse XML! %s", page_link, error_inner)
@@ -224,6 +280,7 @@ class FeedInfoExtractor:
                         return
                     xml = await worker.fetch(link)
 
+                parse_start = time.perf_counter()
                 root = self.load_xml_from_string(link, xml)
 
                 entry_nodes = root.xpath('//atom:entry', namespaces=self.xml_ns)
@@ -231,6 +288,7 @@ class FeedInfoExtractor:
                     page_link_nodes = entry.xpath('.//atom:link[@rel="alternate"]/@href', namespaces=self.xml_ns)
                     # updated_nodes = entry.xpath('.//atom:updated/text()', namespaces=self.xml_ns)
                     published_nodes = entry.xpath('.//atom:published/text()', namespaces=self.xml_ns)
+                    page_id_nodes = entry.xpath('.//atom:id/text()', namespaces=self.xml_ns)
 
                     parsed_published_date = None
                     if len(published_nodes) > 0:
@@ -239,7 +297,8 @@ class FeedInfoExtractor:
                         logging.error('Failed to parse date for entry on %s idx %d', link, idx)
                         continue
 
-                    if parsed_published_date <= self.until_date:
+                    page_id = page_id_nodes[0] if len(page_id_nodes) > 0 else None
+                    if self.is_already_downloaded(parsed_published_date, page_id):
                         if status_dict["skip_after"] is None or status_dict["skip_after"] > page_idx:
                             status_dict['skip_after'] = page_idx
                         continue
@@ -250,6 +309,7 @@ class FeedInfoExtractor:
 
                     page_link = page_link_nodes[0]
                     page_links_list.append(page_link)
+                PARSE_DURATION.observe(time.perf_counter() - parse_start, extractor=self.fie_key(), page_type='atom')
                 status_dict['done'] += 1
 
             except (FileNotFoundError, etree.XMLSyntaxError, ValueError) as error:
@@ -262,6 +322,7 @@ class FeedInfoExtractor:
                 if retried < self.opts.max_reties_of_downloads:
                     retried += 1
                     allowed_to_retry = True
+                    FETCH_RETRIES.inc(extractor=self.fie_key())
                     await asyncio.sleep(e.retry_after)
                 else:
                     logging.error('Max retries reached for %s', link)
@@ -314,6 +375,7 @@ class FeedInfoExtractor:
             ],
         )
         status_dict['stop'] = True
+        FETCH_FAILURES.inc(status_dict['failed'], extractor=self.fie_key())
 
     async def display_status(self, status_dict):
         spinner = cycle('/|\\-')
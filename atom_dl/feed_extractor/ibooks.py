@@ -89,9 +89,13 @@ class IbooksFIE(FeedInfoExtractor):
             if len(updated_date_nodes) >= 1:
                 updated_date = updated_date_nodes[0]
 
+            page_id = None
+            if len(page_id_nodes) > 0:
+                page_id = page_id_nodes[0]
+
             # Stop downloading old feed (that we have already downloaded)
             parsed_published_date = datetime.strptime(published_date, self.default_time_format)
-            if parsed_published_date <= self.until_date:
+            if self.is_already_downloaded(parsed_published_date, page_id):
                 if status_dict["skip_after"] is None or status_dict["skip_after"] > page_idx:
                     status_dict["skip_after"] = page_idx
                 continue
@@ -118,10 +122,6 @@ class IbooksFIE(FeedInfoExtractor):
             if len(page_link_nodes) > 0:
                 that_page_link = page_link_nodes[0]
 
-            page_id = None
-            if len(page_id_nodes) > 0:
-                page_id = page_id_nodes[0]
-
             password = 'ibooks.to'
 
             result_list.append(
@@ -0,0 +1,176 @@
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import orjson
+
+from atom_dl.utils import iter_list_from_json, write_bytes_atomic
+
+
+class FeedStore:
+    """
+    Read access to a feed json file (as written by append_list_to_json) through mmap.
+
+    A sidecar index (<feed>.idx) stores the published timestamp, offset and length of every post,
+    so that posts of a published date range can be read without parsing the rest of the feed.
+    The index is extended incrementally with the posts that were appended since it was written.
+    It also stores the length and a hash of the feed prefix that holds the indexed posts, appends never change
+    that prefix. If it changed, the feed was rewritten and the index is rebuilt.
+    An interrupted append has to be recovered by the caller (holding the feed_store lock) before the feed is opened.
+    """
+
+    default_time_format = "%Y-%m-%dT%H:%M:%S%z"  # works for atom and WordPress HTML
+    index_magic = b'ATOMIDX2'
+    # magic, size of the feed when it was indexed, length and hash of the prefix up to the end of the last indexed post
+    index_header = struct.Struct('<8sQQ16s')
+    prefix_digest_size = 16
+    index_entry = struct.Struct('<qQI')  # published timestamp, offset, length
+    unknown_published = -(2**63)
+    element_start = b'\n  {'
+    element_end = b'\n  }'
+
+    def __init__(self, path_of_feed_json: str):
+        self.path_of_feed_json = path_of_feed_json
+        self.path_of_index = path_of_feed_json + '.idx'
+        # (published timestamp, offset, length), sorted by published timestamp
+        self.entries: List[Tuple[int, int, int]] = []
+        self.published_keys: List[int] = []
+
+    @classmethod
+    def parse_published(cls, post: Dict) -> int:
+        published_date = post.get('published_date', None)
+        if published_date is None:
+            return cls.unknown_published
+        try:
+            return int(datetime.strptime(published_date, cls.default_time_format).timestamp())
+        except ValueError:
+            return cls.unknown_published
+
+    def get_prefix_digest(self, feed_map: mmap.mmap, prefix_size: int) -> bytes:
+        with memoryview(feed_map) as feed_view:
+            return hashlib.blake2b(feed_view[:prefix_size], digest_size=self.prefix_digest_size).digest()
+
+    def load_index(self) -> Tuple[int, int, bytes, List[Tuple[int, int, int]]]:
+        """
+        @return: The feed size, the prefix size and digest, and the entries of the index
+        """
+        no_index = 0, 0, b'', []
+        if not os.path.isfile(self.path_of_index):
+            return no_index
+        with open(self.path_of_index, 'rb') as index_file:
+            index_bytes = index_file.read()
+        if len(index_bytes) < self.index_header.size:
+            return no_index
+        magic, indexed_size, prefix_size, prefix_digest = self.index_header.unpack_from(index_bytes)
+        if magic != self.index_magic:
+            return no_index
+        entries = list(self.index_entry.iter_unpack(index_bytes[self.index_header.size :]))
+        return indexed_size, prefix_size, prefix_digest, entries
+
+    def save_index(
+        self, indexed_size: int, prefix_size: int, prefix_digest: bytes, entries: List[Tuple[int, int, int]]
+    ):
+        index_bytes = bytearray(self.index_header.pack(self.index_magic, indexed_size, prefix_size, prefix_digest))
+        for entry in entries:
+            index_bytes += self.index_entry.pack(*entry)
+        write_bytes_atomic(self.path_of_index, bytes(index_bytes), fsync=False)
+
+    def get_prefix_size(self, entries: List[Tuple[int, int, int]]) -> int:
+        if len(entries) == 0:
+            return 0
+        return max(offset + length for _, offset, length in entries)
+
+    def is_index_valid(
+        self, feed_map: mmap.mmap, prefix_size: int, prefix_digest: bytes, entries: List[Tuple[int, int, int]]
+    ) -> bool:
+        # Every indexed post has to be where the index says, otherwise the feed was rewritten
+        if prefix_size > len(feed_map) or prefix_size != self.get_prefix_size(entries):
+            return False
+        if prefix_size == 0:
+            return True
+        return self.get_prefix_digest(feed_map, prefix_size) == prefix_digest
+
+    def scan_posts(self, feed_map: mmap.mmap, start: int) -> Iterator[Tuple[int, int]]:
+        """
+        Yields (offset, length) of every top level post after start
+        """
+        position = start
+        while True:
+            element_start = feed_map.find(self.element_start, position)
+            if element_start < 0:
+                return
+            element_end = feed_map.find(self.element_end, element_start)
+            if element_end < 0:
+                return
+            # Skip the newline and the indentation
+            offset = element_start + 3
+            length = element_end + len(self.element_end) - offset
+            yield offset, length
+            position = element_end + len(self.element_end)
+
+    def open(self) -> Optional[mmap.mmap]:
+        """
+        Maps the feed into memory and brings the index up to date
+        @return: The mapped feed, or None if the feed is empty or can not be indexed
+        """
+        if not os.path.isfile(self.path_of_feed_json) or os.path.getsize(self.path_of_feed_json) == 0:
+            return None
+
+        with open(self.path_of_feed_json, 'rb') as feed_file:
+            feed_map = mmap.mmap(feed_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if feed_map[:2] != b'[\n':
+            feed_map.close()
+            return None
+
+        indexed_size, prefix_size, prefix_digest, entries = self.load_index()
+        if not self.is_index_valid(feed_map, prefix_size, prefix_digest, entries):
+            logging.info('Rebuilding feed index %r', self.path_of_index)
+            indexed_size, prefix_size, entries = 0, 0, []
+
+        if indexed_size != len(feed_map):
+            num_indexed_posts = len(entries)
+            for offset, length in self.scan_posts(feed_map, prefix_size):
+                post = orjson.loads(feed_map[offset : offset + length])  # pylint: disable=maybe-no-member
+                entries.append((self.parse_published(post), offset, length))
+            logging.debug('Indexed %d new posts of %r', len(entries) - num_indexed_posts, self.path_of_feed_json)
+            prefix_size = self.get_prefix_size(entries)
+            self.save_index(len(feed_map), prefix_size, self.get_prefix_digest(feed_map, prefix_size), entries)
+
+        self.entries = sorted(entries)
+        self.published_keys = [published for published, _, _ in self.entries]
+        return feed_map
+
+    def iter_posts(self, published_since: datetime = None, published_until: datetime = None) -> Iterator[Dict]:
+        """
+        Yields the posts that were published in the given range, in the order they are stored in the feed.
+        Posts without a readable published date are always yielded.
+        """
+        feed_map = self.open()
+        if feed_map is None:
+            # Not in the layout of append_list_to_json, so it can not be indexed
+            yield from iter_list_from_json(self.path_of_feed_json)
+            return
+
+        try:
+            first_idx = bisect.bisect_right(self.published_keys, self.unknown_published)
+            selected_entries = self.entries[:first_idx]
+            start_idx = first_idx
+            if published_since is not None:
+                start_idx = bisect.bisect_left(self.published_keys, int(published_since.timestamp()), lo=first_idx)
+            end_idx = len(self.entries)
+            if published_until is not None:
+                end_idx = bisect.bisect_right(self.published_keys, int(published_until.timestamp()), lo=start_idx)
+            selected_entries += self.entries[start_idx:end_idx]
+            logging.debug(
+                'Reading %d of %d posts of %r', len(selected_entries), len(self.entries), self.path_of_feed_json
+            )
+
+            for _, offset, length in sorted(selected_entries, key=lambda entry: entry[1]):
+                yield orjson.loads(feed_map[offset : offset + length])  # pylint: disable=maybe-no-member
+        finally:
+            feed_map.close()
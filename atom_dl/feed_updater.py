@@ -1,8 +1,9 @@
 import logging
-from datetime import datetime, timezone
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 from atom_dl.feed_extractor.common import FeedInfoExtractor
+from atom_dl.metrics import FEED_POSTS, FEED_UNCHANGED, FEED_UPDATE_DURATION
 from atom_dl.utils import PathTools as PT
 from atom_dl.utils import append_list_to_json, load_dict_from_json, write_to_json
 
@@ -13,8 +14,11 @@ class FeedUpdater:
     def __init__(
         self,
         feed_extractor: FeedInfoExtractor,
+        fsync: bool = True,
     ):
         self.feed_extractor = feed_extractor
+        # If False, updates are not flushed to the disk, a power loss can lose them (but never corrupts the files)
+        self.fsync = fsync
 
     def update_feed_json(self, feed_name: str, latest_feed_list: List[Dict]):
         if len(latest_feed_list) == 0:
@@ -23,7 +27,7 @@ class FeedUpdater:
         # Serializing json
         logging.info('Serializing feed json')
         path_of_feed_json = PT.get_path_of_feed_json(feed_name)
-        append_list_to_json(path_of_feed_json, latest_feed_list)
+        append_list_to_json(path_of_feed_json, latest_feed_list, self.fsync)
         logging.info('Appended latest feed json to %s', path_of_feed_json)
 
         # Writing only latest feed to file
@@ -33,36 +37,104 @@ class FeedUpdater:
         # with open(path_of_latest_feed_json, "wb") as output_file:
         #     output_file.write(json_object)
 
+    def load_watermark(self, until_dates: Dict, feed_name: str) -> Tuple[datetime, Optional[List[str]]]:
+        """
+        Returns the published date of the newest downloaded post and the page ids of the posts published at that date.
+        Older versions stored the start time of the last update as a string, for those the page ids are None.
+        """
+        watermark = until_dates.get(feed_name, None)
+        if watermark is None:
+            # download everything
+            return datetime.strptime("1970-01-01T01:00:00+00:00", self.default_time_format), []
+        if isinstance(watermark, str):
+            return datetime.strptime(watermark, self.default_time_format), None
+        return datetime.strptime(watermark['published_date'], self.default_time_format), watermark.get('page_ids', [])
+
+    def get_next_watermark(self, latest_feed_list: List[Dict]) -> Optional[Dict]:
+        """
+        Returns the watermark after the given posts were added, None if no post has a published date
+        """
+        newest_date = None
+        newest_date_str = None
+        page_ids = set()
+        for post in latest_feed_list:
+            published_date_str = post.get('published_date', None)
+            if published_date_str is None:
+                continue
+            try:
+                published_date = datetime.strptime(published_date_str, self.default_time_format)
+            except ValueError:
+                continue
+            if newest_date is None or published_date > newest_date:
+                newest_date = published_date
+                newest_date_str = published_date_str
+                page_ids = set()
+            if published_date == newest_date and post.get('page_id', None) is not None:
+                page_ids.add(post['page_id'])
+        if newest_date is None:
+            return None
+
+        until_page_ids = self.feed_extractor.until_page_ids
+        if newest_date == self.feed_extractor.until_date and until_page_ids is not None:
+            # More posts were published at the same instant as the newest post of the last update
+            page_ids |= until_page_ids
+        return {'published_date': newest_date_str, 'page_ids': sorted(page_ids)}
+
+    def is_feed_unchanged(self, fingerprint: Optional[Dict], last_fingerprint: Optional[Dict]) -> bool:
+        """
+        Return True if the newest entry on the first feed page is the same as on the last update
+        or already downloaded, so there is nothing new to download
+        """
+        if fingerprint is None:
+            return False
+        if fingerprint == last_fingerprint:
+            return True
+        published_date = datetime.strptime(fingerprint['published_date'], self.default_time_format)
+        return self.feed_extractor.is_already_downloaded(published_date, fingerprint['page_id'])
+
     def update(self) -> List[Dict]:
         """
         RSS Feeds are normally sorted after published date. If we would like to update our feed based on the updated
         date we would need to download the whole feed all the time. Thats why we only download the updated feed based
         on the published date.
+
+        The watermark is the published date of the newest downloaded post together with the page ids of the posts
+        published at that date, so posts published during the update or at the same instant are not missed.
         """
         path_of_last_feed_update_json = PT.get_path_of_last_feed_update_json()
         until_dates = load_dict_from_json(path_of_last_feed_update_json)
         feed_name = self.feed_extractor.fie_key()
         logging.debug("Downloading %r latest feed", feed_name)
-        started_time = datetime.now(timezone.utc)
-        started_time_str = datetime.strftime(started_time, self.default_time_format)
 
-        # get last feed update date
-        if feed_name in until_dates:
-            until_date = datetime.strptime(until_dates[feed_name], self.default_time_format)
-        else:
-            # download everything
-            until_date = datetime.strptime("1970-01-01T01:00:00+00:00", self.default_time_format)
+        # get last feed update watermark
+        until_date, until_page_ids = self.load_watermark(until_dates, feed_name)
+        self.feed_extractor.init(until_date, until_page_ids)
+
+        # Only the first page is fetched to check if there is anything new at all
+        path_of_last_feed_fingerprints_json = PT.get_path_of_last_feed_fingerprints_json()
+        fingerprints = load_dict_from_json(path_of_last_feed_fingerprints_json)
+        fingerprint = self.feed_extractor.get_first_page_fingerprint()
+        if feed_name in until_dates and self.is_feed_unchanged(fingerprint, fingerprints.get(feed_name)):
+            FEED_UNCHANGED.inc(extractor=feed_name)
+            logging.info('No new posts in %r since the last update, skipping it', feed_name)
+            return []
 
-        self.feed_extractor.init(until_date)
-        latest_feed_list = self.feed_extractor.download_latest_feed()
+        with FEED_UPDATE_DURATION.time(extractor=feed_name):
+            latest_feed_list = self.feed_extractor.download_latest_feed()
+        FEED_POSTS.inc(len(latest_feed_list), extractor=feed_name)
 
         logging.info('Latest feed consists of %d entries', len(latest_feed_list))
 
         # update json
         self.update_feed_json(feed_name, latest_feed_list)
 
-        until_dates[feed_name] = started_time_str
-        write_to_json(path_of_last_feed_update_json, until_dates)
+        next_watermark = self.get_next_watermark(latest_feed_list)
+        if next_watermark is not None:
+            until_dates[feed_name] = next_watermark
+            write_to_json(path_of_last_feed_update_json, until_dates, self.fsync)
+        if fingerprint is not None:
+            fingerprints[feed_name] = fingerprint
+            write_to_json(path_of_last_feed_fingerprints_json, fingerprints, self.fsync)
 
         logging.info('Downloaded %r latest feed', feed_name)
         return latest_feed_list
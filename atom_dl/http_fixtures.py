@@ -0,0 +1,160 @@
+"""
+Record and replay of feed HTTP responses, used to benchmark the feed extractors without network access.
+
+Responses are recorded into a fixture archive (a zip file with a manifest) through the FetchHooks.
+The ReplayServer serves a fixture archive on localhost with configurable latency and error injection,
+the requests of the extractors are redirected to it by rewriting their urls.
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import random
+import socket
+import threading
+import zipfile
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+import orjson
+from aiohttp import web
+
+
+class FixtureArchive:
+    manifest_name = 'manifest.json'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # Metadata of the recording, like the extractor and the until date
+        self.metadata: Dict = {}
+        # url -> {'status', 'name'}
+        self.responses: Dict[str, Dict] = {}
+        self.bodies: Dict[str, bytes] = {}
+
+    @staticmethod
+    def get_body_name(url: str) -> str:
+        return 'responses/' + hashlib.sha1(url.encode('utf-8')).hexdigest() + '.bin'
+
+    def add(self, url: str, status: int, body: bytes):
+        with self.lock:
+            name = self.get_body_name(url)
+            self.responses[url] = {'status': status, 'name': name}
+            self.bodies[name] = body
+
+    def get(self, url: str) -> Optional[Tuple[int, bytes]]:
+        response = self.responses.get(url, None)
+        if response is None:
+            return None
+        return response['status'], self.bodies[response['name']]
+
+    def load(self) -> 'FixtureArchive':
+        with zipfile.ZipFile(self.path) as archive:
+            manifest = orjson.loads(archive.read(self.manifest_name))  # pylint: disable=maybe-no-member
+            self.metadata = manifest.get('metadata', {})
+            self.responses = manifest.get('responses', {})
+            self.bodies = {response['name']: archive.read(response['name']) for response in self.responses.values()}
+        return self
+
+    def save(self):
+        with self.lock, zipfile.ZipFile(self.path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            manifest = {'metadata': self.metadata, 'responses': self.responses}
+            # pylint: disable=maybe-no-member
+            archive.writestr(self.manifest_name, orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+            for name, body in self.bodies.items():
+                archive.writestr(name, body)
+
+
+class ReplayServer:
+    """
+    Serves a fixture archive on localhost in a child process, so it does not take CPU time from the crawler.
+    Every request is delayed by latency (+ random jitter) seconds and fails with 503 with the given error rate.
+    """
+
+    def __init__(self, archive_path: str, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.archive_path = archive_path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.base_url = None
+        self.process = None
+
+    def rewrite_url(self, url: str) -> str:
+        return f'{self.base_url}/replay?url={quote(url, safe="")}'
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1024)
+        self.base_url = f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+        ready_event = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=self.serve,
+            args=(sock, self.archive_path, self.latency, self.jitter, self.error_rate, ready_event),
+            daemon=True,
+        )
+        self.process.start()
+        sock.close()
+        ready_event.wait()
+        logging.info('Replay server for %r listens on %s', self.archive_path, self.base_url)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @staticmethod
+    def serve(
+        sock: socket.socket,
+        archive_path: str,
+        latency: float,
+        jitter: float,
+        error_rate: float,
+        ready_event: multiprocessing.Event,
+    ):
+        archive = FixtureArchive(archive_path).load()
+        stats = {'requests': 0, 'errors': 0, 'not_found': 0, 'bytes': 0}
+
+        async def handle_replay(request: web.Request) -> web.Response:
+            stats['requests'] += 1
+            delay = latency + random.uniform(0, jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if error_rate > 0 and random.random() < error_rate:
+                stats['errors'] += 1
+                return web.Response(status=503, text='Service Unavailable')
+
+            response = archive.get(request.query.get('url', ''))
+            if response is None:
+                stats['not_found'] += 1
+                return web.Response(status=404, text='Not recorded')
+            status, body = response
+            stats['bytes'] += len(body)
+            content_type = 'text/xml' if body.lstrip().startswith(b'<?xml') else 'text/html'
+            return web.Response(status=status, body=body, content_type=content_type, charset='utf-8')
+
+        async def handle_stats(_: web.Request) -> web.Response:
+            return web.json_response(stats)
+
+        async def run_server():
+            app = web.Application()
+            app.router.add_get('/replay', handle_replay)
+            app.router.add_get('/stats', handle_stats)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.SockSite(runner, sock).start()
+            ready_event.set()
+            await asyncio.Event().wait()
+
+        asyncio.run(run_server())
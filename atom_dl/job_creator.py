@@ -1,5 +1,5 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List
 
 from atom_dl.feed_extractor.common import FeedInfoExtractor
@@ -21,6 +21,7 @@ class JobCreator:
         self.in_categories = self.as_list_or_none(job_description.get('in_categories', None))
         self.not_in_categories = self.as_list_or_none(job_description.get('not_in_categories', None))
         self.time_delta_updated = self.parse_time_delta(job_description.get('time_delta_updated', None))
+        self.time_delta_published = self.parse_time_delta(job_description.get('time_delta_published', None))
         self.filter_done_file_names = self.as_type_or(job_description.get('filter_done_file_names'), bool, False)
 
     def parse_time_delta(self, delta: Dict):
@@ -81,6 +82,15 @@ class JobCreator:
             if updated_date < datetime.utcnow() - self.time_delta_updated:
                 return None
 
+        if self.time_delta_published is not None:
+            # Check if post was published too long ago for time delta
+            try:
+                published_date = datetime.strptime(post.get('published_date', ''), '%Y-%m-%dT%H:%M:%S%z')
+            except ValueError:
+                published_date = None
+            if published_date is not None and published_date < self.get_published_since():
+                return None
+
         if self.in_title is not None:
             # Check if title matches job definition
             if post.get('title', '').find(self.in_title) < 0:
@@ -120,6 +130,14 @@ class JobCreator:
 
         return self.create_job(post, extractor)
 
+    def get_published_since(self) -> datetime:
+        """
+        Returns the oldest published date a post can have to match this job creator, or None if there is no limit
+        """
+        if self.time_delta_published is None:
+            return None
+        return datetime.now(timezone.utc) - self.time_delta_published
+
     def can_handle_feed(self, feed_name: str):
         if self.in_feeds is None or feed_name in self.in_feeds:
             return True
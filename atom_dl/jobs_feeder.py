@@ -1,42 +1,48 @@
 import asyncio
 import bisect
 import logging
-import os
 import sys
 import traceback
 from itertools import cycle
+from typing import Dict
 
 from atom_dl.config_helper import Config
+from atom_dl.jobs_queue import JobsQueue
 from atom_dl.my_jd_api import MyJdApi, MYJDException
 from atom_dl.types import AtomDlOpts
 from atom_dl.utils import PathTools as PT
-from atom_dl.utils import (
-    append_list_to_json,
-    load_list_from_json,
-    remove_duplicates_from_sorted_list,
-    write_to_json,
-)
+from atom_dl.utils import get_file_signature, load_list_from_json, remove_duplicates_from_sorted_list, write_to_json
 
 
 class JobsFeeder:
     def __init__(self, opts: AtomDlOpts):
         self.do_not_auto_start_downloading = opts.do_not_auto_start_downloading
 
-        self.finished = False
-        self.num_jobs_total = 0
         self.done_links = []
         self.done_file_names = []
-        self.new_jobs = []
-        self.max_parallel_decrypt_jobs = 15
-        self.decrypt_jobs = []
-        self.decrypted_jobs = []
-        self.urls_jobs = []
-        self.filenames_jobs = []
-        self.checked_jobs = []
+        # Signatures of the done files that are loaded, they are only read again if they change
+        self.done_index_signatures = None
+        self.jobs_queue = JobsQueue()
+        self.reset_jobs()
 
         config = Config()
         self.auto_start_downloading = config.get_auto_start_downloading()
+        self.jobs_retention_days = max(config.get_jobs_retention_days(), 0)
+        self.fsync = config.get_fsync_state_files()
+
+        # The number of parallel decrypt jobs adapts to the load of the JDownloader link crawler
+        self.min_parallel_decrypt_jobs = 15
+        self.max_parallel_decrypt_jobs = max(config.get_max_parallel_decrypt_jobs(), self.min_parallel_decrypt_jobs)
+        self.parallel_decrypt_window = self.min_parallel_decrypt_jobs
+        self.max_parallel_add_links = max(config.get_max_parallel_add_links(), 1)
+        self.query_links_page_size = 500
+
+        self.jd = MyJdApi(config.get_my_jd_api_url())
+        self.jd_device = None
+        self.connect()
 
+    def connect(self):
+        config = Config()
         logging.info("Try to connect to MyJDownloader...")
         try:
             my_jd_username = config.get_my_jd_username()
@@ -49,8 +55,6 @@ class JobsFeeder:
                 + "{my_jd_username, my_jd_password, my_jd_device}"
             )
             sys.exit(-1)
-        self.jd = MyJdApi()
-        self.jd_device = None
         try:
             self.jd.set_app_key("Atom-Downloader")
             self.jd.connect(my_jd_username, my_jd_password)
@@ -60,16 +64,51 @@ class JobsFeeder:
             logging.error("Error no connection could be established with MyJDownloader.")
             sys.exit(-2)
 
-    def __del__(self):
+    def refresh_connection(self):
+        """
+        Renews the session of a feeder that is reused, if that fails it logs in again
+        """
+        try:
+            self.jd.reconnect()
+        except (MYJDException, OSError) as jd_error:
+            logging.warning('Could not renew the MyJDownloader session: %s', str(jd_error).strip())
+            self.close()
+            self.connect()
+
+    def close(self):
+        if getattr(self, 'jd_device', None) is not None:
+            self.jd_device.close()
+            self.jd_device = None
+        if getattr(self, 'jd', None) is None or not self.jd.is_connected():
+            return
         try:
             self.jd.disconnect()
         except MYJDException as jd_error:
             logging.error(str(jd_error).strip())
 
-    def process(self):
-        logging.debug('Start working on jobs...')
-        jobs_json_file_path = PT.get_path_of_jobs_json()
-        self.new_jobs = load_list_from_json(jobs_json_file_path)
+    def __del__(self):
+        self.close()
+
+    def reset_jobs(self):
+        self.finished = False
+        self.num_jobs_total = 0
+        self.new_jobs = []
+        self.sending_jobs = []
+        self.decrypt_jobs = []
+        self.decrypted_jobs = []
+        self.urls_jobs = []
+        self.filenames_jobs = []
+        self.checked_jobs = []
+
+    def get_done_index_signatures(self):
+        return (
+            get_file_signature(PT.get_path_of_done_links_json()),
+            get_file_signature(PT.get_path_of_done_file_names_json()),
+        )
+
+    def load_done_index(self):
+        if self.done_index_signatures == self.get_done_index_signatures():
+            return
 
         self.done_links = load_list_from_json(PT.get_path_of_done_links_json())
         # To make the search for elements faster we sort the list
@@ -77,11 +116,26 @@ class JobsFeeder:
 
         self.done_file_names = load_list_from_json(PT.get_path_of_done_file_names_json())
         self.done_file_names.sort()
+        self.done_index_signatures = self.get_done_index_signatures()
 
-        self.num_jobs_total = len(self.new_jobs)
-        if self.num_jobs_total > 0:
+    def process(self):
+        logging.debug('Start working on jobs...')
+        self.reset_jobs()
+        # Jobs of an interrupted run are fed again
+        self.jobs_queue.release_claims()
+        self.jobs_queue.prune(self.jobs_retention_days * 24 * 60 * 60)
+
+        self.load_done_index()
+
+        if self.claim_new_jobs() > 0 or self.jobs_queue.has_active_producers():
             asyncio.run(self.jd_job_chain())
 
+    def claim_new_jobs(self) -> int:
+        new_jobs = self.jobs_queue.claim()
+        self.new_jobs.extend(new_jobs)
+        self.num_jobs_total += len(new_jobs)
+        return len(new_jobs)
+
     async def jd_job_chain(self):
         gather_jobs = asyncio.gather(
             *[
@@ -100,9 +154,10 @@ class JobsFeeder:
             gather_jobs.cancel()
             sys.exit(1)
 
-        append_list_to_json(PT.get_path_of_checked_jobs_json(), self.checked_jobs)
+        self.jobs_queue.complete(self.checked_jobs)
         self.save_all_done_links_and_file_names()
-        self.delete_or_backup_done_jobs()
+        if self.jobs_queue.release_claims() > 0:
+            logging.warning('Warning: Only done %d out of %d jobs', len(self.checked_jobs), self.num_jobs_total)
 
         if self.auto_start_downloading and not self.do_not_auto_start_downloading:
             self.start_downloads()
@@ -155,46 +210,26 @@ class JobsFeeder:
         self.done_file_names = remove_duplicates_from_sorted_list(self.done_file_names)
 
         path_of_done_links_json = PT.get_path_of_done_links_json()
-        write_to_json(path_of_done_links_json, self.done_links)
+        write_to_json(path_of_done_links_json, self.done_links, self.fsync)
         logging.info('Checked jobs links appended to: %r', path_of_done_links_json)
 
         path_of_done_file_names_json = PT.get_path_of_done_file_names_json()
-        write_to_json(path_of_done_file_names_json, self.done_links)
+        write_to_json(path_of_done_file_names_json, self.done_links, self.fsync)
         logging.info('Checked jobs file names appended to: %r', path_of_done_file_names_json)
-
-    def delete_or_backup_done_jobs(self):
-        # Handle old jobs json
-        num_checked_jobs = len(self.checked_jobs)
-        json_old_jobs_file_path = PT.get_path_of_jobs_json()
-        if not os.path.isfile(json_old_jobs_file_path):
-            logging.warning('Warning: Could not find old jobs file %r', json_old_jobs_file_path)
-
-        if num_checked_jobs != self.num_jobs_total:
-            # Move jobs file to backup location
-            logging.warning('Warning: Only done %d out of %d jobs', num_checked_jobs, self.num_jobs_total)
-            json_backup_jobs_file_path = PT.get_path_of_backup_jobs_json()
-            if os.path.isfile(json_old_jobs_file_path):
-                try:
-                    os.rename(json_old_jobs_file_path, json_backup_jobs_file_path)
-                except OSError as err:
-                    logging.warning(
-                        'Warning: Could not backup old jobs file %r Error: %s', json_old_jobs_file_path, err
-                    )
-        else:
-            # Remove old jobs file
-            if os.path.isfile(json_old_jobs_file_path):
-                try:
-                    os.remove(json_old_jobs_file_path)
-                except OSError as err:
-                    logging.warning(
-                        'Warning: Could not delete old jobs file %r Error: %s', json_old_jobs_file_path, err
-                    )
+        self.done_index_signatures = self.get_done_index_signatures()
 
     async def check_finish_condition(self):
         spinner = cycle('/|\\-')
         while True:
+            producers_active = True
+            if len(self.new_jobs) == 0:
+                # Producers are checked before the queue, so no job they add before they end is missed
+                producers_active = self.jobs_queue.has_active_producers()
+                self.claim_new_jobs()
             if (
-                len(self.new_jobs) == 0
+                not producers_active
+                and len(self.new_jobs) == 0
+                and len(self.sending_jobs) == 0
                 and len(self.decrypt_jobs) == 0
                 and len(self.decrypted_jobs) == 0
                 and len(self.urls_jobs) == 0
@@ -203,33 +238,68 @@ class JobsFeeder:
                 self.finished = True
                 logging.info('All Jobs Done')
                 return
-            logging.info("Done: %04d / %04d Jobs %s", len(self.checked_jobs), self.num_jobs_total, next(spinner))
+            logging.info(
+                "Done: %04d / %04d Jobs (decrypting: %d/%d) %s",
+                len(self.checked_jobs),
+                self.num_jobs_total,
+                len(self.decrypt_jobs),
+                self.parallel_decrypt_window,
+                next(spinner),
+            )
 
             await asyncio.sleep(1)
 
+    def get_add_links_query(self, job: Dict) -> Dict:
+        return {
+            "assignJobID": True,
+            # "autoExtract": False,
+            "autostart": False,
+            # "dataURLs": [],
+            # "deepDecrypt": False,
+            "destinationFolder": job.get('destination_path', ''),
+            "downloadPassword": job.get('password', ''),
+            "extractPassword": job.get('password', ''),
+            "links": "\n".join(job.get('download_links', [])),
+            "overwritePackagizerRules": True,
+            "packageName": job.get('package_name', ''),
+            "priority": 'DEFAULT',
+            "sourceUrl": '',
+        }
+
+    def adapt_decrypt_window(self, num_busy_jobs: int, num_queried_jobs: int):
+        """
+        Grows the number of parallel decrypt jobs while the JDownloader link crawler keeps up
+        and shrinks it again if most of the submitted jobs are still crawling or checking.
+        """
+        if num_queried_jobs == 0:
+            return
+        if num_busy_jobs * 4 <= num_queried_jobs:
+            self.parallel_decrypt_window = min(
+                self.parallel_decrypt_window + self.max_parallel_add_links, self.max_parallel_decrypt_jobs
+            )
+        elif num_busy_jobs * 4 >= num_queried_jobs * 3 and num_queried_jobs >= self.parallel_decrypt_window:
+            self.parallel_decrypt_window = max(
+                self.parallel_decrypt_window - self.parallel_decrypt_window // 4, self.min_parallel_decrypt_jobs
+            )
+
     async def send_jobs_to_jd(self):
         while not self.finished:
-            if len(self.new_jobs) > 0 and len(self.decrypt_jobs) < self.max_parallel_decrypt_jobs:
-                next_job = self.new_jobs.pop(0)
-                add_querry = {
-                    "assignJobID": True,
-                    # "autoExtract": False,
-                    "autostart": False,
-                    # "dataURLs": [],
-                    # "deepDecrypt": False,
-                    "destinationFolder": next_job.get('destination_path', ''),
-                    "downloadPassword": next_job.get('password', ''),
-                    "extractPassword": next_job.get('password', ''),
-                    "links": "\n".join(next_job.get('download_links', [])),
-                    "overwritePackagizerRules": True,
-                    "packageName": next_job.get('package_name', ''),
-                    "priority": 'DEFAULT',
-                    "sourceUrl": '',
-                }
-                result = self.jd_device.linkgrabber.add_links(add_querry)
-                next_job['crawl_job_id'] = result.get('id', None)
-                # Add job to queue to check if decryption finished
-                self.decrypt_jobs.append(next_job)
+            free_decrypt_slots = self.parallel_decrypt_window - len(self.decrypt_jobs)
+            if len(self.new_jobs) > 0 and free_decrypt_slots > 0:
+                num_next_jobs = min(free_decrypt_slots, self.max_parallel_add_links)
+                self.sending_jobs = self.new_jobs[:num_next_jobs]
+                del self.new_jobs[:num_next_jobs]
+
+                add_queries = [self.get_add_links_query(next_job) for next_job in self.sending_jobs]
+                # The API calls are blocking, so we send them from a thread to keep the other loops running
+                results = await asyncio.to_thread(
+                    self.jd_device.linkgrabber.add_links_bulk, add_queries, self.max_parallel_add_links
+                )
+                for next_job, result in zip(self.sending_jobs, results):
+                    next_job['crawl_job_id'] = result.get('id', None)
+                    # Add job to queue to check if decryption finished
+                    self.decrypt_jobs.append(next_job)
+                self.sending_jobs = []
                 await asyncio.sleep(0)
             else:
                 await asyncio.sleep(1)
@@ -248,33 +318,33 @@ class JobsFeeder:
                 }
                 result = self.jd_device.linkgrabber.query_link_crawler_jobs(status_querry)
 
-                for jobId in jobIds:
-                    found = False
-                    job_status_crawling = True
-                    job_status_checking = True
-                    for job_status in result:
-                        job_status_id = job_status.get('jobId', None)
-                        if job_status_id is None:
-                            continue  # should not happen
-                        if job_status_id == jobId:
-                            found = True
-                            job_status_crawling = job_status.get('crawling', False)
-                            job_status_checking = job_status.get('checking', False)
-                            break
+                job_statuses = {}
+                for job_status in result:
+                    job_status_id = job_status.get('jobId', None)
+                    if job_status_id is None:
+                        continue  # should not happen
+                    job_statuses[job_status_id] = job_status
+
+                num_busy_jobs = 0
+                still_decrypting_jobs = []
+                for decrypt_job in self.decrypt_jobs:
+                    job_id = decrypt_job.get('crawl_job_id', None)
+                    if job_id is None:
+                        still_decrypting_jobs.append(decrypt_job)
+                        continue  # should not happen
+                    job_status = job_statuses.get(job_id, None)
                     # We assume the job is finished if it was not found
-                    if not found or (not job_status_crawling and not job_status_checking):
-                        job_idx = None
-                        for idx, decrypt_job in enumerate(self.decrypt_jobs):
-                            job_id = decrypt_job.get('crawl_job_id', None)
-                            if job_id is None:
-                                continue  # should not happen
-                            if job_id == jobId:
-                                job_idx = idx
-                                break
-                        if job_idx is not None:
-                            decrypted_job = self.decrypt_jobs.pop(job_idx)
-                            # Add job to queue to check result of decryption
-                            self.decrypted_jobs.append(decrypted_job)
+                    if job_status is not None and (
+                        job_status.get('crawling', False) or job_status.get('checking', False)
+                    ):
+                        num_busy_jobs += 1
+                        still_decrypting_jobs.append(decrypt_job)
+                    else:
+                        # Add job to queue to check result of decryption
+                        self.decrypted_jobs.append(decrypt_job)
+                self.decrypt_jobs = still_decrypting_jobs
+
+                self.adapt_decrypt_window(num_busy_jobs, len(jobIds))
 
             await asyncio.sleep(1)
 
@@ -295,7 +365,6 @@ class JobsFeeder:
                     "enabled": False,
                     "host": True,
                     "jobUUIDs": jobIds,
-                    "maxResults": -1,
                     "packageUUIDs": [],
                     "password": False,
                     "priority": False,
@@ -307,7 +376,15 @@ class JobsFeeder:
                     "variantName": False,
                     "variants": False,
                 }
-                decrypted_links = self.jd_device.linkgrabber.query_links(link_querry)
+                # Links are queried page by page, so huge linkgrabber lists do not end up in one response.
+                # The other coroutines get a turn between the pages.
+                decrypted_links = []
+                for decrypted_link in self.jd_device.linkgrabber.iter_links(
+                    link_querry, page_size=self.query_links_page_size
+                ):
+                    decrypted_links.append(decrypted_link)
+                    if len(decrypted_links) % self.query_links_page_size == 0:
+                        await asyncio.sleep(0)
 
                 next_decrypted_job['decrypted_links'] = decrypted_links
                 self.urls_jobs.append(next_decrypted_job)
@@ -0,0 +1,306 @@
+"""
+Durable jobs queue between the feed processors (producers) and the JobsFeeder (consumer).
+
+The jobs are stored in an SQLite database in WAL mode, so producers can add jobs while the consumer claims and
+completes them. Running producers are registered in the database and renew their heartbeat, so the consumer knows
+that it should wait for more jobs. The old jobs.json and checked_jobs.json are migrated into the queue on first use.
+"""
+
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import orjson
+
+from atom_dl.locks import is_process_alive
+from atom_dl.utils import PathTools as PT
+from atom_dl.utils import load_list_from_json, recover_json_wal
+
+# A job that was claimed this often without being checked is given up
+MAX_ATTEMPTS = 3
+# Running producers renew their heartbeat this often,
+# a producer whose heartbeat is older than the timeout is treated as crashed
+PRODUCER_HEARTBEAT_SECONDS = 30
+PRODUCER_TIMEOUT_SECONDS = 300
+
+
+class JobsQueue:
+    """
+    The state of a job goes from new to claimed (sent to JDownloader) to checked, or to failed
+    """
+
+    def __init__(self, path_of_db: str = None):
+        if path_of_db is None:
+            path_of_db = PT.get_path_of_jobs_queue_db()
+        self.path_of_db = path_of_db
+        # Transactions are handled explicitly, every write starts with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path_of_db, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            + ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            + ' state TEXT NOT NULL,'
+            + ' attempts INTEGER NOT NULL DEFAULT 0,'
+            + ' updated_at REAL NOT NULL,'
+            + ' job BLOB NOT NULL,'
+            + ' destination_path TEXT)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, id)')
+        self.add_destination_path_column()
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS jobs_by_destination_path ON jobs (destination_path, state, id)'
+        )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS producers ('
+            + ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            + ' task TEXT NOT NULL,'
+            + ' host TEXT NOT NULL,'
+            + ' pid INTEGER NOT NULL,'
+            + ' heartbeat_at REAL NOT NULL)'
+        )
+        # Names of the json files whose jobs were imported, recorded in the transaction of the import
+        self.connection.execute('CREATE TABLE IF NOT EXISTS migrated_files (name TEXT PRIMARY KEY)')
+        self.migrate_json_files()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __del__(self):
+        self.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    @staticmethod
+    def dump_job(job: Dict) -> bytes:
+        return orjson.dumps(job)  # pylint: disable=maybe-no-member
+
+    @staticmethod
+    def load_job(job_id: int, job_bytes: bytes) -> Dict:
+        job = orjson.loads(job_bytes)  # pylint: disable=maybe-no-member
+        job['queue_id'] = job_id
+        return job
+
+    @staticmethod
+    def get_destination_path(job: Dict) -> Optional[str]:
+        destination_path = job.get('destination_path', None)
+        if destination_path is None:
+            return None
+        return os.path.normpath(destination_path)
+
+    def add_destination_path_column(self):
+        """
+        Queues created before the destination_path column existed get it, filled from the stored jobs
+        """
+        with self.transaction() as connection:
+            column_names = [row[1] for row in connection.execute('PRAGMA table_info(jobs)')]
+            if 'destination_path' in column_names:
+                return
+            connection.execute('ALTER TABLE jobs ADD COLUMN destination_path TEXT')
+            connection.executemany(
+                'UPDATE jobs SET destination_path = ? WHERE id = ?',
+                [
+                    (self.get_destination_path(self.load_job(job_id, job_bytes)), job_id)
+                    for job_id, job_bytes in connection.execute('SELECT id, job FROM jobs').fetchall()
+                ],
+            )
+
+    def migrate_json_files(self):
+        """
+        Moves the jobs of jobs.json (new) and checked_jobs.json (checked) into the queue.
+        The import is recorded in its own transaction, the json files are renamed to *.migrated afterwards.
+        If the rename does not happen, the file is only renamed on the next start.
+        """
+        for json_path, state in [(PT.get_path_of_checked_jobs_json(), 'checked'), (PT.get_path_of_jobs_json(), 'new')]:
+            if not os.path.isfile(json_path):
+                continue
+            file_name = os.path.basename(json_path)
+            num_jobs = None
+            with self.transaction() as connection:
+                # Another process may have migrated the file while we waited for the transaction
+                is_migrated = connection.execute('SELECT 1 FROM migrated_files WHERE name = ?', (file_name,))
+                if os.path.isfile(json_path) and is_migrated.fetchone() is None:
+                    recover_json_wal(json_path)
+                    jobs = load_list_from_json(json_path)
+                    now = time.time()
+                    connection.executemany(
+                        'INSERT INTO jobs (state, updated_at, job, destination_path) VALUES (?, ?, ?, ?)',
+                        [(state, now, self.dump_job(job), self.get_destination_path(job)) for job in jobs],
+                    )
+                    connection.execute('INSERT INTO migrated_files (name) VALUES (?)', (file_name,))
+                    num_jobs = len(jobs)
+            try:
+                os.replace(json_path, json_path + '.migrated')
+            except FileNotFoundError:
+                pass
+            if num_jobs is not None:
+                logging.info('Migrated %d jobs from %r into the jobs queue', num_jobs, json_path)
+
+    @contextlib.contextmanager
+    def producing(self, task_name: str):
+        """
+        Registers the with block as a running producer, consumers wait for its jobs
+        """
+        with self.transaction() as connection:
+            producer_id = connection.execute(
+                'INSERT INTO producers (task, host, pid, heartbeat_at) VALUES (?, ?, ?, ?)',
+                (task_name, socket.gethostname(), os.getpid(), time.time()),
+            ).lastrowid
+        stop_event = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self.send_heartbeats, args=(producer_id, stop_event), name='producer-heartbeat', daemon=True
+        )
+        heartbeat_thread.start()
+        try:
+            yield self
+        finally:
+            stop_event.set()
+            heartbeat_thread.join()
+            with self.transaction() as connection:
+                connection.execute('DELETE FROM producers WHERE id = ?', (producer_id,))
+
+    def send_heartbeats(self, producer_id: int, stop_event: threading.Event):
+        # SQLite connections can not be shared between threads, the heartbeat uses its own
+        connection = sqlite3.connect(self.path_of_db, timeout=60, isolation_level=None)
+        try:
+            while not stop_event.wait(PRODUCER_HEARTBEAT_SECONDS):
+                try:
+                    connection.execute(
+                        'UPDATE producers SET heartbeat_at = ? WHERE id = ?', (time.time(), producer_id)
+                    )
+                except sqlite3.Error as heartbeat_err:
+                    logging.warning('Could not renew the heartbeat of the jobs producer: %s', heartbeat_err)
+        finally:
+            connection.close()
+
+    def has_active_producers(self) -> bool:
+        """
+        Return if a producer is running, the registrations of crashed producers are removed.
+        A producer on this host has crashed if its process is gone, any producer if its heartbeat timed out.
+        """
+        host = socket.gethostname()
+        now = time.time()
+        producers = self.connection.execute('SELECT id, host, pid, heartbeat_at FROM producers').fetchall()
+        crashed_ids = [
+            (producer_id,)
+            for producer_id, producer_host, pid, heartbeat_at in producers
+            if now - heartbeat_at > PRODUCER_TIMEOUT_SECONDS or (producer_host == host and not is_process_alive(pid))
+        ]
+        if len(crashed_ids) > 0:
+            with self.transaction() as connection:
+                connection.executemany('DELETE FROM producers WHERE id = ?', crashed_ids)
+            logging.warning('Removed %d crashed jobs producers', len(crashed_ids))
+        return len(producers) > len(crashed_ids)
+
+    def push(self, jobs: List[Dict]):
+        """
+        Appends the jobs to the queue, they can be claimed as soon as this returns
+        """
+        if len(jobs) == 0:
+            return
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                'INSERT INTO jobs (state, updated_at, job, destination_path) VALUES (?, ?, ?, ?)',
+                [('new', now, self.dump_job(job), self.get_destination_path(job)) for job in jobs],
+            )
+
+    def claim(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Claims the oldest new jobs, every returned job has its queue_id set
+        """
+        with self.transaction() as connection:
+            rows = connection.execute(
+                'SELECT id, job FROM jobs WHERE state = ? ORDER BY id LIMIT ?',
+                ('new', -1 if limit is None else limit),
+            ).fetchall()
+            connection.executemany(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                [('claimed', time.time(), job_id) for job_id, _ in rows],
+            )
+        return [self.load_job(job_id, job_bytes) for job_id, job_bytes in rows]
+
+    def complete(self, checked_jobs: List[Dict]):
+        """
+        Stores the checked jobs in place of the claimed ones
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                'UPDATE jobs SET state = ?, updated_at = ?, job = ?, destination_path = ? WHERE id = ?',
+                [
+                    (
+                        'checked',
+                        now,
+                        self.dump_job({k: v for k, v in job.items() if k != 'queue_id'}),
+                        self.get_destination_path(job),
+                        job['queue_id'],
+                    )
+                    for job in checked_jobs
+                ],
+            )
+
+    def release_claims(self) -> int:
+        """
+        Returns claimed jobs that were not checked to the queue, or gives them up after MAX_ATTEMPTS claims.
+        Only one consumer runs at a time (it holds the done_index lock), so every claimed job is unfinished.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            num_failed = connection.execute(
+                'UPDATE jobs SET state = ?, updated_at = ? WHERE state = ? AND attempts >= ?',
+                ('failed', now, 'claimed', MAX_ATTEMPTS),
+            ).rowcount
+            num_released = connection.execute(
+                'UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?', ('new', now, 'claimed')
+            ).rowcount
+        if num_failed > 0:
+            logging.warning(
+                'Gave up %d jobs that were claimed %d times without being checked', num_failed, MAX_ATTEMPTS
+            )
+        if num_released > 0:
+            logging.warning('Returned %d unfinished jobs to the jobs queue', num_released)
+        return num_released
+
+    def prune(self, retention_seconds: float) -> int:
+        """
+        Deletes checked and failed jobs that did not change for retention_seconds.
+        Checked jobs are kept for a while, the archive extractor looks up the password of a package in them.
+        """
+        with self.transaction() as connection:
+            num_pruned = connection.execute(
+                'DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?',
+                ('checked', 'failed', time.time() - retention_seconds),
+            ).rowcount
+        if num_pruned > 0:
+            logging.info('Pruned %d old jobs from the jobs queue', num_pruned)
+        return num_pruned
+
+    def count(self, state: str) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM jobs WHERE state = ?', (state,)).fetchone()[0]
+
+    def get_checked_job(self, destination_path: str) -> Optional[Dict]:
+        """
+        Returns the first checked job that downloads into the given directory, or None
+        """
+        row = self.connection.execute(
+            'SELECT id, job FROM jobs WHERE destination_path = ? AND state = ? ORDER BY id LIMIT 1',
+            (os.path.normpath(destination_path), 'checked'),
+        ).fetchone()
+        if row is None:
+            return None
+        return self.load_job(*row)
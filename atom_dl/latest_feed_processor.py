@@ -1,12 +1,16 @@
 import logging
+import time
+from typing import List
 
 from atom_dl.config_helper import Config
 from atom_dl.feed_extractor import gen_extractors
 from atom_dl.feed_updater import FeedUpdater
 from atom_dl.job_creator import JobCreator
+from atom_dl.jobs_queue import JobsQueue
+from atom_dl.metrics import MATCH_DURATION, MATCH_POSTS
 from atom_dl.types import AtomDlOpts
 from atom_dl.utils import PathTools as PT
-from atom_dl.utils import append_list_to_json, load_list_from_json
+from atom_dl.utils import get_file_signature, load_list_from_json
 
 
 class LatestFeedProcessor:
@@ -15,54 +19,75 @@ class LatestFeedProcessor:
         opts: AtomDlOpts,
     ):
         self.opts = opts
+        # Extractors and job creators are kept, so that a long running process (daemon) can reuse them
+        self.all_feed_info_extractors = None
+        self.job_creators: List[JobCreator] = []
+        self.job_creators_key = None
+
+    def get_job_creators(self, storage_path: str) -> List[JobCreator]:
+        """
+        Creates the job creators for the job definitions of the last feed, if they changed since the last call
+        """
+        path_of_last_feed_job_defs_json = PT.get_path_of_last_feed_job_defs_json()
+        job_creators_key = (storage_path, get_file_signature(path_of_last_feed_job_defs_json))
+        if job_creators_key != self.job_creators_key:
+            last_feed_job_definitions = load_list_from_json(path_of_last_feed_job_defs_json)
+            self.job_creators = [
+                JobCreator(job_definition, storage_path) for job_definition in last_feed_job_definitions
+            ]
+            self.job_creators_key = job_creators_key
+        return self.job_creators
 
     def process(self):
-        all_feed_info_extractors = gen_extractors(self.opts)
+        if self.all_feed_info_extractors is None:
+            self.all_feed_info_extractors = gen_extractors(self.opts)
+        all_feed_info_extractors = self.all_feed_info_extractors
 
         config = Config()
         storage_path = config.get_storage_path()
 
-        path_of_last_feed_job_defs_json = PT.get_path_of_last_feed_job_defs_json()
-        last_feed_job_definitions = load_list_from_json(path_of_last_feed_job_defs_json)
-
-        job_creators = []
-        for job_definition in last_feed_job_definitions:
-            job_creators.append(JobCreator(job_definition, storage_path))
-
+        job_creators = self.get_job_creators(storage_path)
         if len(job_creators) == 0:
             logging.warning('No Jobs for last feed are defined')
             return
 
         logging.debug('Start collecting jobs...')
         jobs = []
-        for extractor in all_feed_info_extractors:
-            feed_updater = FeedUpdater(extractor)
-            latest_feed = feed_updater.update()
+        jobs_queue = JobsQueue()
+        with jobs_queue.producing('process_latest_feed'):
+            for extractor in all_feed_info_extractors:
+                feed_updater = FeedUpdater(extractor, config.get_fsync_state_files())
+                latest_feed = feed_updater.update()
 
-            # Filter job creators based on feed name
-            # We filter after the update, so that all feeds get an update
-            feed_name = extractor.fie_key()
-            valid_job_creators = []
-            for job_creator in job_creators:
-                if job_creator.can_handle_feed(feed_name):
-                    valid_job_creators.append(job_creator)
-            if len(valid_job_creators) == 0:
-                continue
+                # Filter job creators based on feed name
+                # We filter after the update, so that all feeds get an update
+                feed_name = extractor.fie_key()
+                valid_job_creators = []
+                for job_creator in job_creators:
+                    if job_creator.can_handle_feed(feed_name):
+                        valid_job_creators.append(job_creator)
+                if len(valid_job_creators) == 0:
+                    continue
 
-            for post in latest_feed:
-                for job_creator in valid_job_creators:
-                    job = job_creator.process(post, extractor)
-                    if job is not None:
-                        jobs.append(job)
-                        # First job creator wins
-                        break
+                num_jobs_before = len(jobs)
+                num_posts = 0
+                match_start = time.perf_counter()
+                for post in latest_feed:
+                    num_posts += 1
+                    for job_creator in valid_job_creators:
+                        job = job_creator.process(post, extractor)
+                        if job is not None:
+                            jobs.append(job)
+                            # First job creator wins
+                            break
+                MATCH_DURATION.observe(time.perf_counter() - match_start, feed=feed_name)
+                num_matched = len(jobs) - num_jobs_before
+                MATCH_POSTS.inc(num_matched, feed=feed_name, result='matched')
+                MATCH_POSTS.inc(num_posts - num_matched, feed=feed_name, result='unmatched')
 
-        logging.info('Collected %d jobs', len(jobs))
+                # Jobs are queued per feed, so a running JobsFeeder can start feeding them right away
+                jobs_queue.push(jobs[num_jobs_before:])
 
-        if len(jobs) == 0:
-            return
+        jobs_queue.close()
 
-        logging.info('Appending jobs to jobs queue...')
-        path_of_jobs_json = PT.get_path_of_jobs_json()
-        append_list_to_json(path_of_jobs_json, jobs)
-        logging.info('Jobs appended to: %r', path_of_jobs_json)
+        logging.info('Added %d jobs to the jobs queue', len(jobs))
@@ -0,0 +1,196 @@
+"""
+Advisory locks on the state that the atom-dl tasks share, so that independent tasks can run at the same time.
+
+Every resource has its own lock file in the data directory that is held with fcntl.flock. The kernel releases
+the lock when the process ends, so a crashed run never leaves a stale lock behind. The holder writes its PID
+and task into the file, which is used to report who holds a lock. Where flock is not available (Windows, some
+network file systems) the lock file itself is the lock, and it is taken over if its holder is no longer alive.
+"""
+
+import errno
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from atom_dl.utils import PathTools as PT
+from atom_dl.utils import check_debug
+
+# The state behind each resource:
+# - feed_store: the feeds, last_feed_update.json, last_feed_fingerprints.json and last_feed_job_defs.json
+# - done_index: done_links.json and done_file_names.json
+# - storage_tree: the storage directory, the extraction index, the dedup index and the known passwords
+# - daemon: only one daemon may run per data directory
+# The jobs queue needs no lock, it is an SQLite database that tracks its producers itself
+resource_names = ['daemon', 'done_index', 'feed_store', 'storage_tree']
+
+task_resources: Dict[str, List[str]] = {
+    'process_latest_feed': ['feed_store'],
+    'process_offline_feed': ['feed_store'],
+    'feed_jdownloader': ['done_index'],
+    'extract_archives': ['storage_tree'],
+    # The daemon locks the resources of its tasks only while a task runs
+    'daemon': ['daemon'],
+}
+
+# Errors of flock on file systems that do not support it
+flock_unsupported_errnos = [errno.ENOLCK, errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL]
+
+
+class LockError(Exception):
+    """An Exception which gets thrown if a resource is locked by another running task."""
+
+    pass
+
+
+def is_process_alive(pid: int) -> bool:
+    """Return if a process with the given PID exists (in this PID namespace)"""
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user
+        return True
+    return True
+
+
+class ResourceLock:
+    def __init__(self, resource: str):
+        if resource not in resource_names:
+            raise ValueError(f'Unknown resource {resource!r}, use one of {resource_names}')
+        self.resource = resource
+        self.path = PT.get_path_of_lock_file(resource)
+        self.fd = None
+        self.has_pid_file = False
+
+    def read_holder(self) -> Tuple[Optional[int], str]:
+        """Returns the PID and the task name written by the holder of the lock"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as lock_file:
+                content = lock_file.read()
+        except OSError:
+            return None, ''
+        pid_str, _, task_name = content.strip().partition(' ')
+        try:
+            return int(pid_str), task_name
+        except ValueError:
+            return None, task_name
+
+    def get_lock_error(self) -> LockError:
+        pid, task_name = self.read_holder()
+        if pid is None:
+            holder = 'another process'
+        elif is_process_alive(pid):
+            holder = f'{task_name or "a task"} (PID {pid})'
+        else:
+            # Another host or container shares the data directory
+            holder = f'{task_name or "a task"} (PID {pid}, not visible from this process)'
+        return LockError(f'The {self.resource} is locked by {holder}, lock file: {self.path}')
+
+    def get_holder_bytes(self, task_name: str) -> bytes:
+        return f'{os.getpid()} {task_name}\n'.encode('utf-8')
+
+    def acquire(self, task_name: str):
+        """Takes the lock without waiting, raises a LockError if it is held by someone else"""
+        if fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                raise self.get_lock_error() from None
+            except OSError as lock_err:
+                os.close(fd)
+                if lock_err.errno not in flock_unsupported_errnos:
+                    raise
+                logging.debug('flock is not supported for %r, using a PID file', self.path)
+            else:
+                os.ftruncate(fd, 0)
+                os.write(fd, self.get_holder_bytes(task_name))
+                self.fd = fd
+                return
+        self.acquire_pid_file(task_name)
+
+    def acquire_pid_file(self, task_name: str):
+        """
+        Creates the lock file exclusively. An empty lock file or one of a dead holder is stale and gets replaced.
+        This is only best effort, two processes that replace the same stale lock at once may both succeed.
+        """
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                pid, task_name_of_holder = self.read_holder()
+                if pid is not None and is_process_alive(pid):
+                    raise self.get_lock_error() from None
+                logging.info('Removing the stale %s lock of %s (PID %s)', self.resource, task_name_of_holder, pid)
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                os.write(fd, self.get_holder_bytes(task_name))
+            finally:
+                os.close(fd)
+            self.has_pid_file = True
+            return
+        raise self.get_lock_error()
+
+    def release(self):
+        if self.fd is not None:
+            # An empty lock file tells the PID file fallback that the lock is free
+            os.ftruncate(self.fd, 0)
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        elif self.has_pid_file:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.has_pid_file = False
+
+
+class TaskLocks:
+    """
+    Locks all resources of a task. The locks are taken in sorted order and released in reverse order.
+    Like the old process lock, nothing is locked while a debugger is attached.
+    """
+
+    def __init__(self, task_name: str):
+        self.task_name = task_name
+        self.locks: List[ResourceLock] = []
+
+    def acquire(self):
+        if check_debug():
+            return
+        try:
+            for resource in sorted(task_resources.get(self.task_name, [])):
+                lock = ResourceLock(resource)
+                lock.acquire(self.task_name)
+                self.locks.append(lock)
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        while len(self.locks) > 0:
+            self.locks.pop().release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
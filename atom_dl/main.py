@@ -2,7 +2,6 @@
 # coding=utf-8
 
 import argparse
-import asyncio  # noqa: F401 pylint: disable=unused-import
 import logging
 import os
 import sys
@@ -10,20 +9,14 @@ import traceback
 from logging.handlers import RotatingFileHandler
 
 import colorlog
-import requests  # noqa: F401 pylint: disable=unused-import
-import sentry_sdk
-import urllib3
 from colorama import just_fix_windows_console
 
-from atom_dl.archive_extractor import ArchiveExtractor
 from atom_dl.config_helper import Config
-from atom_dl.jobs_feeder import JobsFeeder
-from atom_dl.latest_feed_processor import LatestFeedProcessor
-from atom_dl.offline_feed_processor import OfflineFeedProcessor
-from atom_dl.types import AtomDlOpts
-from atom_dl.utils import LockError
+from atom_dl.locks import LockError, TaskLocks
+from atom_dl.metrics import REGISTRY, TASK_DURATION
+from atom_dl.types import AtomDlOpts, profile_modes
 from atom_dl.utils import PathTools as PT
-from atom_dl.utils import check_debug, process_lock, process_unlock
+from atom_dl.utils import check_debug
 from atom_dl.version import __version__
 
 
@@ -114,7 +107,6 @@ def setup_logger(opts: AtomDlOpts):
         logging.getLogger("requests").setLevel(logging.WARNING)
         logging.getLogger("urllib3").setLevel(logging.WARNING)
         logging.getLogger('asyncio').setLevel(logging.WARNING)
-        urllib3.disable_warnings()
 
 
 def get_parser():
@@ -166,6 +158,18 @@ def get_parser():
         help=('Extract all finished archives in the storage path, according to strict rules'),
     )
 
+    group.add_argument(
+        '-d',
+        '--daemon',
+        dest='daemon',
+        default=False,
+        action='store_true',
+        help=(
+            'Keep running and process the latest feeds, feed JDownloader and extract archives in the intervals'
+            + ' set in the configuration'
+        ),
+    )
+
     parser.add_argument(
         '-nas',
         '--do-not-auto-start-downloading',
@@ -249,6 +253,21 @@ def get_parser():
             + ' in which you have read and write access. (default: same as --path)'
         ),
     )
+    parser.add_argument(
+        '-prf',
+        '--profile',
+        dest='profile',
+        nargs='?',
+        const='sampling',
+        default=None,
+        choices=profile_modes,
+        help=(
+            'Profile the run and write the reports to the log file path. The sampling profiler writes collapsed'
+            + ' stacks for flamegraphs, cprofile writes a .prof file. Both report the CPU and wait time of the'
+            + ' asyncio tasks. (default mode: %(const)s)'
+        ),
+    )
+
     group.add_argument(
         '--version',
         action='version',
@@ -264,12 +283,19 @@ def connect_sentry() -> bool:
     try:
         config = Config()
         sentry_dsn = config.get_property('sentry_dsn')
-        if sentry_dsn:
-            sentry_sdk.init(sentry_dsn)
-            return True
-    except (ValueError, sentry_sdk.utils.BadDsn, sentry_sdk.utils.ServerlessTimeoutWarning):
-        pass
-    return False
+    except ValueError:
+        return False
+    if not sentry_dsn:
+        return False
+
+    # sentry_sdk is only imported if it is configured
+    import sentry_sdk  # pylint: disable=import-outside-toplevel
+
+    try:
+        sentry_sdk.init(sentry_dsn)
+        return True
+    except (sentry_sdk.utils.BadDsn, sentry_sdk.utils.ServerlessTimeoutWarning):
+        return False
 
 
 def post_process_opts(opts: AtomDlOpts):
@@ -279,20 +305,64 @@ def post_process_opts(opts: AtomDlOpts):
     return opts
 
 
+def get_task_name(opts: AtomDlOpts) -> str:
+    if opts.process_latest_feed:
+        return 'process_latest_feed'
+    if opts.path_to_job_defs:
+        return 'process_offline_feed'
+    if opts.feed_jdownloader:
+        return 'feed_jdownloader'
+    if opts.extract_archives:
+        return 'extract_archives'
+    if opts.daemon:
+        return 'daemon'
+    return 'unknown'
+
+
+def start_metrics_server():
+    config = Config()
+    metrics_port = config.get_metrics_port()
+    if metrics_port is not None:
+        try:
+            REGISTRY.start_http_server(metrics_port)
+        except OSError as server_err:
+            logging.warning('Could not serve metrics on port %s: %s', metrics_port, server_err)
+
+
+def export_metrics():
+    config = Config()
+    REGISTRY.write_to_file(config.get_metrics_file_path())
+
+
 def choose_task(opts: AtomDlOpts):
+    # The task modules (and their dependencies) are only imported for the selected task
+    # pylint: disable=import-outside-toplevel
     if opts.process_latest_feed:
+        from atom_dl.latest_feed_processor import LatestFeedProcessor
+
         latest_feed_processor = LatestFeedProcessor(opts)
         latest_feed_processor.process()
     elif opts.path_to_job_defs:
+        from atom_dl.offline_feed_processor import OfflineFeedProcessor
+
         offline_feed_processor = OfflineFeedProcessor(opts)
         offline_feed_processor.process()
     elif opts.feed_jdownloader:
         # TODO: Add option to restart JDownloader if it is not connected
+        from atom_dl.jobs_feeder import JobsFeeder
+
         jobs_feeder = JobsFeeder(opts)
         jobs_feeder.process()
     elif opts.extract_archives:
+        from atom_dl.archive_extractor import ArchiveExtractor
+
         archive_extractor = ArchiveExtractor()
         archive_extractor.process()
+    elif opts.daemon:
+        from atom_dl.daemon import Daemon
+
+        daemon = Daemon(opts)
+        daemon.run()
 
 
 # --- called at the program invocation: -------------------------------------
@@ -305,15 +375,25 @@ def main(args=None):
 
     check_mandatory_settings()
     try:
-        process_lock()
-        choose_task(opts)
+        with TaskLocks(get_task_name(opts)):
+            start_metrics_server()
+            with TASK_DURATION.time(task=get_task_name(opts)):
+                if opts.profile is not None:
+                    from atom_dl.profiling import RunProfiler  # pylint: disable=import-outside-toplevel
+
+                    with RunProfiler(opts.profile, opts.log_file_path, get_task_name(opts)):
+                        choose_task(opts)
+                else:
+                    choose_task(opts)
+        export_metrics()
 
         logging.info('All done. Exiting..')
-        process_unlock()
     except BaseException as base_err:
         if not isinstance(base_err, LockError):
-            process_unlock()
+            export_metrics()
         if sentry_connected:
+            import sentry_sdk  # pylint: disable=import-outside-toplevel
+
             sentry_sdk.capture_exception(base_err)
 
         if opts.verbose or check_debug():
@@ -0,0 +1,267 @@
+"""
+Counters and histograms of the fetch, parse, match, JD feed and extract phases.
+
+The registry is rendered in the OpenMetrics text format, either into a file (for the textfile collector of
+the node exporter) or served on a local HTTP endpoint that Prometheus can scrape.
+"""
+
+import abc
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+from atom_dl.utils import write_bytes_atomic
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PHASE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+THROUGHPUT_BUCKETS = (1.0, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(label_names: Sequence[str], label_values: Sequence[str], extra: str = '') -> str:
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    if len(labels) == 0:
+        return ''
+    return '{' + ','.join(labels) + '}'
+
+
+class Metric(abc.ABC):
+    metric_type = 'unknown'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+
+    def get_label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f'{self.name} expects the labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abc.abstractmethod
+    def render_samples(self) -> List[str]:
+        """Returns the sample lines of the metric"""
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# TYPE {self.name} {self.metric_type}',
+            f'# HELP {self.name} {escape_label_value(self.documentation)}',
+        ]
+        return lines + self.render_samples()
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        label_values = self.get_label_values(labels)
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self.get_label_values(labels), 0)
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        return [
+            f'{self.name}_total{format_labels(self.label_names, label_values)} {format_value(value)}'
+            for label_values, value in values
+        ]
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(
+        self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts (not cumulative), sum]
+        self.values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        label_values = self.get_label_values(labels)
+        bucket_idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values, None)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0]
+                self.values[label_values] = entry
+            entry[0][bucket_idx] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the with block in seconds
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            values = sorted(
+                (label_values, list(counts), total) for label_values, (counts, total) in self.values.items()
+            )
+        lines = []
+        for label_values, counts, total in values:
+            cumulative_count = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative_count += count
+                bucket_labels = format_labels(self.label_names, label_values, f'le="{format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative_count}')
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_count{labels} {cumulative_count}')
+            lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self.http_server = None
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def histogram(
+        self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_to_file(self, path: str):
+        """
+        Writes the metrics to the given path, nothing is written if the path is empty
+        """
+        if not path:
+            return
+        try:
+            write_bytes_atomic(path, self.render().encode('utf-8'), fsync=False)
+        except OSError as write_err:
+            logging.warning('Could not write metrics to %r: %s', path, write_err)
+            return
+        logging.debug('Metrics written to %r', path)
+
+    def start_http_server(self, port: int, host: str = '127.0.0.1'):
+        """
+        Serves the metrics on http://host:port/metrics in a daemon thread
+        """
+        # pylint: disable=import-outside-toplevel
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.split('?', 1)[0] not in ['/', '/metrics']:
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.http_server.daemon_threads = True
+        threading.Thread(target=self.http_server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info('Serving metrics on http://%s:%d/metrics', host, self.http_server.server_address[1])
+
+    def stop_http_server(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+
+REGISTRY = MetricsRegistry()
+
+TASK_DURATION = REGISTRY.histogram(
+    'atom_dl_task_duration_seconds', 'Duration of a whole atom-dl task', ['task'], PHASE_BUCKETS
+)
+
+FETCH_DURATION = REGISTRY.histogram(
+    'atom_dl_fetch_duration_seconds', 'Duration of feed requests including the body', ['host']
+)
+FETCH_RESPONSES = REGISTRY.counter('atom_dl_fetch_responses', 'Number of feed responses', ['host', 'status'])
+FETCH_BYTES = REGISTRY.counter('atom_dl_fetch_response_bytes', 'Size of the received feed responses', ['host'])
+FETCH_RETRIES = REGISTRY.counter('atom_dl_fetch_retries', 'Number of retried feed pages', ['extractor'])
+FETCH_FAILURES = REGISTRY.counter('atom_dl_fetch_failures', 'Number of feed pages that failed', ['extractor'])
+
+PARSE_DURATION = REGISTRY.histogram(
+    'atom_dl_parse_duration_seconds', 'Time spent parsing a single feed page', ['extractor', 'page_type']
+)
+FEED_UPDATE_DURATION = REGISTRY.histogram(
+    'atom_dl_feed_update_duration_seconds', 'Duration of a feed update', ['extractor'], PHASE_BUCKETS
+)
+FEED_POSTS = REGISTRY.counter('atom_dl_feed_posts', 'Number of downloaded posts', ['extractor'])
+FEED_UNCHANGED = REGISTRY.counter(
+    'atom_dl_feed_unchanged', 'Number of feed updates skipped because the first page had no new posts', ['extractor']
+)
+
+MATCH_DURATION = REGISTRY.histogram(
+    'atom_dl_match_duration_seconds', 'Time spent matching the posts of a feed', ['feed'], PHASE_BUCKETS
+)
+MATCH_POSTS = REGISTRY.counter(
+    'atom_dl_match_posts', 'Number of posts matched against the job definitions', ['feed', 'result']
+)
+
+JD_API_DURATION = REGISTRY.histogram(
+    'atom_dl_jd_api_duration_seconds', 'Latency of My.JDownloader API calls', ['endpoint']
+)
+JD_API_ERRORS = REGISTRY.counter('atom_dl_jd_api_errors', 'Number of failed My.JDownloader API calls', ['endpoint'])
+
+EXTRACT_BYTES = REGISTRY.counter('atom_dl_extract_bytes', 'Number of extracted bytes', ['category'])
+EXTRACT_DURATION = REGISTRY.counter('atom_dl_extract_duration_seconds', 'Time spent extracting archives', ['category'])
+EXTRACT_THROUGHPUT = REGISTRY.histogram(
+    'atom_dl_extract_throughput_mbps', 'Extraction throughput per archive in MB/s', ['category'], THROUGHPUT_BUCKETS
+)
+EXTRACT_ARCHIVES = REGISTRY.counter('atom_dl_extract_archives', 'Number of handled archives', ['category', 'result'])
@@ -0,0 +1,386 @@
+"""
+In-process stand-in for the My.JDownloader api and one JDownloader device.
+
+It speaks the same AES encrypted protocol as api.jdownloader.org (see MyJdApi.request_api) and simulates
+the link crawler of the device: every addLinks call creates a crawl job that is crawling for some time,
+afterwards its links show up in the linkgrabber with a random availability.
+It is meant for benchmarks of JobsFeeder and MyJdApi, not for a complete emulation of JDownloader.
+"""
+
+import hashlib
+import heapq
+import logging
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+import orjson
+
+from atom_dl.my_jd_api.my_jd_api import JdCipher
+
+
+class MockMyJdDevice:
+    """
+    State of the simulated JDownloader device
+    """
+
+    default_availability_weights = {'ONLINE': 0.85, 'OFFLINE': 0.1, 'TEMP_UNKNOWN': 0.03, 'UNKNOWN': 0.02}
+
+    def __init__(
+        self,
+        name: str,
+        crawl_latency: float,
+        crawl_jitter: float,
+        check_latency: float,
+        availability_weights: Dict[str, float] = None,
+        seed: int = None,
+    ):
+        self.name = name
+        self.device_id = hashlib.md5(name.encode('utf-8')).hexdigest()
+        self.crawl_latency = crawl_latency
+        self.crawl_jitter = crawl_jitter
+        self.check_latency = check_latency
+        if availability_weights is None:
+            availability_weights = self.default_availability_weights
+        self.availability_states = list(availability_weights.keys())
+        self.availability_weights = list(availability_weights.values())
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.next_id = int(time.time() * 1000)
+        # job id -> {'crawled_at', 'checked_at', 'links'}
+        self.crawl_jobs: Dict[int, Dict] = {}
+        # (crawled_at, job id) of the crawl jobs whose links are not in the linkgrabber yet
+        self.pending_crawl_jobs: List[Tuple[float, int]] = []
+        # link uuid -> crawled link, in the order they were crawled
+        self.linkgrabber_links: Dict[int, Dict] = {}
+        self.download_links: Dict[int, Dict] = {}
+        self.is_downloading = False
+
+    def get_next_id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def add_links(self, query: Dict) -> Dict:
+        with self.lock:
+            job_id = self.get_next_id()
+            package_uuid = self.get_next_id()
+            crawled_at = time.time() + self.crawl_latency + self.random.uniform(0, self.crawl_jitter)
+            links = []
+            for url in query.get('links', '').split('\n'):
+                url = url.strip()
+                if not url:
+                    continue
+                links.append(
+                    {
+                        'availability': self.random.choices(self.availability_states, self.availability_weights)[0],
+                        'bytesTotal': self.random.randint(100000, 500000000),
+                        'host': urlparse(url).netloc,
+                        'name': url.rstrip('/').rsplit('/', 1)[-1].replace('.html', '') or 'unknown',
+                        'packageUUID': package_uuid,
+                        'url': url,
+                        'uuid': self.get_next_id(),
+                        'jobUUID': job_id,
+                    }
+                )
+            self.crawl_jobs[job_id] = {
+                'crawled_at': crawled_at,
+                'checked_at': crawled_at + self.check_latency,
+                'links': links,
+                'link_uuids': [link['uuid'] for link in links],
+            }
+            heapq.heappush(self.pending_crawl_jobs, (crawled_at, job_id))
+            return {'id': job_id}
+
+    def update_crawl_jobs(self):
+        """
+        Moves the links of finished crawl jobs into the linkgrabber, the caller has to hold the lock
+        """
+        now = time.time()
+        while self.pending_crawl_jobs and self.pending_crawl_jobs[0][0] <= now:
+            _, job_id = heapq.heappop(self.pending_crawl_jobs)
+            crawl_job = self.crawl_jobs[job_id]
+            for link in crawl_job['links']:
+                self.linkgrabber_links[link['uuid']] = link
+            crawl_job['links'] = []
+
+    def query_link_crawler_jobs(self, query: Dict) -> List[Dict]:
+        with self.lock:
+            self.update_crawl_jobs()
+            now = time.time()
+            result = []
+            for job_id in query.get('jobIds', []):
+                crawl_job = self.crawl_jobs.get(job_id, None)
+                if crawl_job is None:
+                    continue
+                result.append(
+                    {
+                        'jobId': job_id,
+                        'crawlerId': job_id,
+                        'crawling': now < crawl_job['crawled_at'],
+                        'checking': crawl_job['crawled_at'] <= now < crawl_job['checked_at'],
+                        'crawled': 0 if crawl_job['links'] else 1,
+                        'broken': 0,
+                        'filtered': 0,
+                        'unhandled': 0,
+                    }
+                )
+            return result
+
+    def query_links(self, query: Dict) -> List[Dict]:
+        with self.lock:
+            self.update_crawl_jobs()
+            job_uuids = query.get('jobUUIDs') or []
+            package_uuids = set(query.get('packageUUIDs') or [])
+            if job_uuids:
+                candidate_links = (
+                    self.linkgrabber_links[link_uuid]
+                    for job_uuid in job_uuids
+                    for link_uuid in self.crawl_jobs.get(job_uuid, {}).get('link_uuids', [])
+                    if link_uuid in self.linkgrabber_links
+                )
+            else:
+                candidate_links = self.linkgrabber_links.values()
+            links = [link for link in candidate_links if not package_uuids or link['packageUUID'] in package_uuids]
+            start_at = query.get('startAt', 0) or 0
+            max_results = query.get('maxResults', -1)
+            if max_results is not None and max_results >= 0:
+                links = links[start_at : start_at + max_results]
+            else:
+                links = links[start_at:]
+            return [{key: value for key, value in link.items() if key != 'jobUUID'} for link in links]
+
+    def remove_links(self, link_ids: List[int], package_ids: List[int]):
+        with self.lock:
+            package_ids = set(package_ids or [])
+            for link_id in link_ids or []:
+                self.linkgrabber_links.pop(link_id, None)
+            if package_ids:
+                for link_id, link in list(self.linkgrabber_links.items()):
+                    if link['packageUUID'] in package_ids:
+                        del self.linkgrabber_links[link_id]
+
+    def rename_link(self, link_id: int, new_name: str):
+        with self.lock:
+            if link_id in self.linkgrabber_links:
+                self.linkgrabber_links[link_id]['name'] = new_name
+
+    def move_to_downloadlist(self, link_ids: List[int], package_ids: List[int]):
+        with self.lock:
+            link_ids = set(link_ids or [])
+            package_ids = set(package_ids or [])
+            for link_id, link in list(self.linkgrabber_links.items()):
+                if link_id in link_ids or link['packageUUID'] in package_ids:
+                    self.download_links[link_id] = self.linkgrabber_links.pop(link_id)
+
+    def start_downloads(self) -> bool:
+        self.is_downloading = True
+        return True
+
+    def call(self, action_path: str, params: List) -> Tuple[bool, object]:
+        """
+        Calls an action of the device
+        @return: (found, data)
+        """
+        actions = {
+            '/device/getDirectConnectionInfos': lambda: {'infos': []},
+            '/device/ping': lambda: True,
+            '/linkgrabberv2/addLinks': lambda: self.add_links(params[0]),
+            '/linkgrabberv2/queryLinkCrawlerJobs': lambda: self.query_link_crawler_jobs(params[0]),
+            '/linkgrabberv2/queryLinks': lambda: self.query_links(params[0]),
+            '/linkgrabberv2/removeLinks': lambda: self.remove_links(*params),
+            '/linkgrabberv2/renameLink': lambda: self.rename_link(*params),
+            '/linkgrabberv2/moveToDownloadlist': lambda: self.move_to_downloadlist(*params),
+            '/downloadcontroller/start': self.start_downloads,
+        }
+        action = actions.get(action_path, None)
+        if action is None:
+            return False, None
+        return True, action()
+
+
+class MockMyJdServer:
+    """
+    Serves the /my/* api and the /t_<session token>_<device id>/* device actions on localhost.
+    Every request is delayed by request_latency seconds.
+    """
+
+    action_path_pattern = re.compile(r'^/t_([0-9a-f]+)_([0-9a-f]+)(/.*)$')
+
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        device: MockMyJdDevice,
+        request_latency: float = 0.0,
+    ):
+        self.email = email
+        self.device = device
+        self.request_latency = request_latency
+        self.login_secret = self.create_secret(email, password, 'server')
+        self.device_secret = self.create_secret(email, password, 'device')
+        self.login_cipher = JdCipher(self.login_secret)
+        # session token -> {'regain_token', 'server_cipher', 'device_cipher'}
+        self.sessions: Dict[str, Dict] = {}
+        self.sessions_lock = threading.Lock()
+        self.stats = {'requests': 0, 'actions': {}}
+        self.http_server = None
+        self.server_thread = None
+        self.api_url = None
+
+    @staticmethod
+    def create_secret(email: str, password: str, domain: str) -> bytes:
+        secret_hash = hashlib.sha256()
+        secret_hash.update(email.lower().encode('utf-8') + password.encode('utf-8') + domain.lower().encode('utf-8'))
+        return secret_hash.digest()
+
+    def create_session(self, server_token: bytes) -> Tuple[str, Dict]:
+        session_token = os.urandom(32).hex()
+        session_bytes = bytearray.fromhex(session_token)
+        session = {
+            'regain_token': os.urandom(32).hex(),
+            'server_token': hashlib.sha256(server_token + session_bytes).digest(),
+            'device_cipher': JdCipher(hashlib.sha256(self.device_secret + session_bytes).digest()),
+        }
+        session['server_cipher'] = JdCipher(session['server_token'])
+        with self.sessions_lock:
+            self.sessions[session_token] = session
+        return session_token, session
+
+    def get_session(self, session_token: str) -> Dict:
+        with self.sessions_lock:
+            return self.sessions.get(session_token, None)
+
+    def start(self) -> str:
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                logging.debug('Mock My.JDownloader: ' + format, *args)
+
+            def send_body(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_error_json(self, status: int, src: str, error_type: str):
+                error_body = orjson.dumps({'src': src, 'type': error_type})  # pylint: disable=maybe-no-member
+                self.send_body(status, error_body)
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                server.count_request(urlparse(self.path).path)
+                server.handle_my_request(self)
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                server.count_request(self.path)
+                content_length = int(self.headers.get('Content-Length', 0))
+                server.handle_action_request(self, self.rfile.read(content_length))
+
+        self.http_server = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+        self.http_server.daemon_threads = True
+        self.api_url = f'http://127.0.0.1:{self.http_server.server_address[1]}'
+        self.server_thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.server_thread.start()
+        logging.info('Mock My.JDownloader api listens on %s', self.api_url)
+        return self.api_url
+
+    def stop(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def count_request(self, path: str):
+        if self.request_latency > 0:
+            time.sleep(self.request_latency)
+        match = self.action_path_pattern.match(path)
+        action_name = match.group(3) if match is not None else path
+        with self.sessions_lock:
+            self.stats['requests'] += 1
+            self.stats['actions'][action_name] = self.stats['actions'].get(action_name, 0) + 1
+
+    def handle_my_request(self, handler: BaseHTTPRequestHandler):
+        signed_part, _, signature = handler.path.partition('&signature=')
+        parsed_url = urlparse(signed_part)
+        query = dict(parse_qsl(parsed_url.query))
+        request_id = int(query.get('rid', 0))
+
+        if parsed_url.path == '/my/connect':
+            if query.get('email', '').lower() != self.email.lower() or self.login_cipher.sign(signed_part) != signature:
+                handler.send_error_json(403, 'MYJD', 'AUTH_FAILED')
+                return
+            session_token, session = self.create_session(self.login_secret)
+            response = {'sessiontoken': session_token, 'regaintoken': session['regain_token'], 'rid': request_id}
+            handler.send_body(200, self.login_cipher.encrypt(orjson.dumps(response)))  # pylint: disable=maybe-no-member
+            return
+
+        session_token = query.get('sessiontoken', '')
+        session = self.get_session(session_token)
+        if session is None or session['server_cipher'].sign(signed_part) != signature:
+            handler.send_error_json(403, 'MYJD', 'TOKEN_INVALID')
+            return
+
+        if parsed_url.path == '/my/listdevices':
+            response = {'list': [{'name': self.device.name, 'id': self.device.device_id, 'type': 'jd'}]}
+        elif parsed_url.path == '/my/reconnect':
+            if query.get('regaintoken', '') != session['regain_token']:
+                handler.send_error_json(403, 'MYJD', 'TOKEN_INVALID')
+                return
+            new_session_token, new_session = self.create_session(session['server_token'])
+            response = {'sessiontoken': new_session_token, 'regaintoken': new_session['regain_token']}
+            with self.sessions_lock:
+                self.sessions.pop(session_token, None)
+        elif parsed_url.path == '/my/disconnect':
+            response = {}
+            with self.sessions_lock:
+                self.sessions.pop(session_token, None)
+        else:
+            handler.send_error_json(404, 'MYJD', 'COMMAND_NOT_FOUND')
+            return
+        response['rid'] = request_id
+        # pylint: disable=maybe-no-member
+        handler.send_body(200, session['server_cipher'].encrypt(orjson.dumps(response)))
+
+    def handle_action_request(self, handler: BaseHTTPRequestHandler, encrypted_body: bytes):
+        match = self.action_path_pattern.match(handler.path)
+        session = self.get_session(match.group(1)) if match is not None else None
+        if session is None:
+            handler.send_error_json(403, 'MYJD', 'TOKEN_INVALID')
+            return
+        if match.group(2) != self.device.device_id:
+            handler.send_error_json(404, 'MYJD', 'OFFLINE')
+            return
+
+        device_cipher = session['device_cipher']
+        try:
+            request = orjson.loads(device_cipher.decrypt(encrypted_body))  # pylint: disable=maybe-no-member
+        except (ValueError, IndexError):
+            handler.send_error_json(400, 'DEVICE', 'BAD_PARAMETERS')
+            return
+        # Non list params are sent as json strings
+        params = [
+            orjson.loads(param) if isinstance(param, str) else param  # pylint: disable=maybe-no-member
+            for param in request.get('params', [])
+        ]
+
+        found, data = self.device.call(match.group(3), params)
+        if not found:
+            handler.send_error_json(404, 'DEVICE', 'COMMAND_NOT_FOUND')
+            return
+        response = {'data': data, 'rid': request.get('rid', 0)}
+        handler.send_body(200, device_cipher.encrypt(orjson.dumps(response)))  # pylint: disable=maybe-no-member
@@ -5,8 +5,11 @@ import base64
 import hashlib
 import hmac
 import logging
+import socket
+import threading
 import time
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
 # from urllib.request import urlopen
 from urllib.parse import quote
@@ -15,25 +18,82 @@ import orjson
 import requests
 from Cryptodome.Cipher import AES
 
+from atom_dl.metrics import JD_API_DURATION, JD_API_ERRORS
 from atom_dl.my_jd_api.exception import (
     MYJDApiException,
     MYJDConnectionException,
     MYJDDecodeException,
     MYJDDeviceNotFoundException,
+    MYJDException,
 )
-from atom_dl.utils import get_local_networks, is_ip_in_networks
+from atom_dl.network import get_local_networks, is_ip_in_networks
 
 BS = 16
 
 
 def PAD(s):
-    return s + ((BS - len(s) % BS) * chr(BS - len(s) % BS)).encode()
+    pad_len = BS - len(s) % BS
+    return s + bytes((pad_len,)) * pad_len
 
 
 def UNPAD(s):
     return s[0 : -s[-1]]
 
 
+def iter_pages(query, queryParams, page_size):
+    """
+    Calls a query action with increasing startAt until a page is not full and yields the results one by one.
+    maxResults of queryParams is overwritten with page_size.
+    """
+    page_query = dict(queryParams)
+    start_at = page_query.get("startAt", 0)
+    while True:
+        page_query["startAt"] = start_at
+        page_query["maxResults"] = page_size
+        results = query(page_query)
+        if not results:
+            return
+        yield from results
+        if len(results) < page_size:
+            return
+        start_at += len(results)
+
+
+class JdCipher:
+    """
+    Key material of one My.JDownloader secret token.
+    The token is split into IV and key only once per token update and all methods work on bytes.
+    A CBC cipher object can not be reused after it was used, so only the AES object is created per message.
+    """
+
+    def __init__(self, secret_token: bytes):
+        self.init_vector = secret_token[: len(secret_token) // 2]
+        self.key = secret_token[len(secret_token) // 2 :]
+        self.signer = hmac.new(secret_token, digestmod=hashlib.sha256)
+
+    def encrypt(self, data: bytes) -> bytes:
+        """
+        Encrypts the data and returns it base64 encoded
+        """
+        encryptor = AES.new(self.key, AES.MODE_CBC, self.init_vector)
+        return base64.b64encode(encryptor.encrypt(PAD(data)))
+
+    def decrypt(self, data: bytes) -> bytes:
+        """
+        Decrypts base64 encoded data
+        """
+        decryptor = AES.new(self.key, AES.MODE_CBC, self.init_vector)
+        return UNPAD(decryptor.decrypt(base64.b64decode(data)))
+
+    def sign(self, data: str) -> str:
+        """
+        Calculates the HMAC-SHA256 signature of the data
+        """
+        signature = self.signer.copy()
+        signature.update(data.encode('utf-8'))
+        return signature.hexdigest()
+
+
 class System:
     """
     Class that represents the system-functionality of a Device
@@ -344,6 +404,23 @@ class Linkgrabber:
         resp = self.device.action("/linkgrabberv2/addLinks", [query])
         return resp
 
+    def add_links_bulk(self, queries: List[Dict], max_parallel_requests=10) -> List[Dict]:
+        """
+        Add multiple link queries to the linkcollector using concurrent addLinks calls.
+        Each query keeps its own package name, destination folder and passwords.
+
+        :param queries: List of myAddLinksQuery, see add_links
+        :param max_parallel_requests: Maximum number of addLinks calls that are in flight at the same time
+
+        :return: List of myLinkCollectingJob in the same order as the queries
+        """
+        if len(queries) == 0:
+            return []
+        if len(queries) == 1 or max_parallel_requests <= 1:
+            return [self.add_links(query) for query in queries]
+        with ThreadPoolExecutor(max_workers=min(max_parallel_requests, len(queries))) as executor:
+            return list(executor.map(self.add_links, queries))
+
     def cleanup(self, link_ids, package_ids, action, mode, selection_type):
         """
         Clean packages and/or links of the linkgrabber list.
@@ -597,6 +674,19 @@ class Linkgrabber:
         resp = self.device.action(self.url + "/queryLinks", [queryParams])
         return resp
 
+    def iter_links(self, queryParams, page_size=500):
+        """
+        Iterate over the links in the linkcollector/linkgrabber page by page,
+        so that only one page of links is decrypted and parsed at a time.
+
+        :param queryParams: myCrawledLinkQuery, see query_links.
+                            startAt is the first link to return, maxResults is overwritten for every page.
+        :param page_size: Number of links that are requested per page.
+
+        :return Generator of myCrawledLink
+        """
+        return iter_pages(self.query_links, queryParams, page_size)
+
     def query_packages(
         self,
         queryParams,
@@ -991,6 +1081,19 @@ class Downloads:
         resp = self.device.action(self.url + "/queryLinks", [queryParams])
         return resp
 
+    def iter_links(self, queryParams, page_size=500):
+        """
+        Iterate over the links in the download list page by page,
+        so that only one page of links is decrypted and parsed at a time.
+
+        :param queryParams: myLinkQuery, see query_links.
+                            startAt is the first link to return, maxResults is overwritten for every page.
+        :param page_size: Number of links that are requested per page.
+
+        :return Generator of myDownloadLink
+        """
+        return iter_pages(self.query_links, queryParams, page_size)
+
     def query_packages(
         self,
         queryParams,
@@ -1218,6 +1321,13 @@ class Jddevice:
     Class that represents a JDownloader device and it's functions
     """
 
+    # A background prober measures the round-trip time of all direct connections,
+    # so that every action can be routed to the fastest healthy connection.
+    direct_connection_probe_interval = 30
+    direct_connection_probe_timeout = 2
+    direct_connection_refresh_interval = 600
+    direct_connection_failure_cooldown = 60
+
     def __init__(self, jd, device_dict):
         """This functions initializates the device instance.
         It uses the provided dictionary to create the device.
@@ -1237,13 +1347,20 @@ class Jddevice:
         self.update = Update(self)
         self.jd = Jd(self)
         self.system = System(self)
+        # Actions can be called from multiple threads (e.g. bulk addLinks), so guard the connection list
+        self.__direct_connection_lock = threading.Lock()
         self.__direct_connection_info = None
+        self.__direct_connection_last_refresh = 0
         self.__refresh_direct_connections()
         self.__direct_connection_enabled = True
         self.__direct_connection_cooldown = 0
         self.__direct_connection_consecutive_failures = 0
+        self.__health_prober = None
+        self.__health_prober_stop = threading.Event()
+        self.start_health_prober()
 
     def __refresh_direct_connections(self):
+        self.__direct_connection_last_refresh = time.time()
         response = self.myjd.request_api("/device/getDirectConnectionInfos", "POST", None, self.__action_url())
         if (
             response is not None
@@ -1251,53 +1368,164 @@ class Jddevice:
             and 'infos' in response["data"]
             and len(response["data"]["infos"]) != 0
         ):
-            self.__update_direct_connections(response["data"]["infos"])
+            with self.__direct_connection_lock:
+                self.__update_direct_connections(response["data"]["infos"])
 
     def __update_direct_connections(self, direct_info):
         """
-        Updates the direct_connections info keeping the order.
+        Updates the direct_connections info keeping the measured round-trip times of known connections.
         """
-        tmp = []
-        tmp_is_local = []
-        tmp_not_local = []
         networks = get_local_networks()
-        if self.__direct_connection_info is None:
-            # Move local direct addresses to the top
-            for conn in direct_info:
-                ip = conn['ip']
-                if is_ip_in_networks(ip, networks):
-                    tmp_is_local.append({'conn': conn, 'cooldown': 0})
-                else:
-                    tmp_not_local.append({'conn': conn, 'cooldown': 0})
-
-            self.__direct_connection_info = tmp_is_local + tmp_not_local
+        known_connections = []
+        if self.__direct_connection_info is not None:
+            #  We remove old connections not available anymore.
+            for i in self.__direct_connection_info:
+                if i['conn'] in direct_info:
+                    known_connections.append(i)
+        known_conns = [i['conn'] for i in known_connections]
+
+        # We add new connections, they are ranked after the first probe
+        new_connections = []
+        for conn in direct_info:
+            if conn in known_conns:
+                continue
+            new_connections.append(
+                {
+                    'conn': conn,
+                    'cooldown': 0,
+                    'rtt': None,
+                    'is_local': is_ip_in_networks(conn['ip'], networks),
+                    'needs_api_check': False,
+                }
+            )
+        self.__direct_connection_info = known_connections + new_connections
+
+    def __get_ranked_direct_connections(self):
+        """
+        Returns all direct connections that are not cooling down, the fastest first.
+        Connections without measured round-trip time are ranked last, local addresses before remote ones.
+        """
+        now = time.time()
+        with self.__direct_connection_lock:
+            if self.__direct_connection_info is None:
+                return []
+            usable_connections = [conn for conn in self.__direct_connection_info if now > conn['cooldown']]
+            return sorted(
+                usable_connections,
+                key=lambda conn: (conn['rtt'] is None, conn['rtt'] or 0, not conn['is_local']),
+            )
+
+    @staticmethod
+    def __record_rtt(conn, rtt):
+        # Exponential moving average of the TCP connect time, so single slow probes do not reorder the connections
+        if conn['rtt'] is None:
+            conn['rtt'] = rtt
+        else:
+            conn['rtt'] = 0.7 * conn['rtt'] + 0.3 * rtt
+
+    def __mark_direct_connection_failed(self, conn, needs_api_check: bool):
+        """
+        Puts a connection into cooldown, the caller has to hold the direct connection lock
+        """
+        conn['rtt'] = None
+        conn['cooldown'] = time.time() + self.direct_connection_failure_cooldown
+        if needs_api_check:
+            conn['needs_api_check'] = True
+
+    def __check_direct_connection_api(self, connection) -> bool:
+        """
+        Return True if the API of the device answers a ping on the given direct connection
+        """
+        api = "http://" + connection["ip"] + ":" + str(connection["port"])
+        return self.myjd.request_api("/device/ping", "POST", None, self.__action_url(), api) is not None
+
+    def __probe_direct_connections(self):
+        """
+        Measures the TCP connect time of every direct connection and revives connections that work again.
+        A connection on which an action failed is only revived after its API answered a ping.
+        The network is probed without holding the lock, the results are applied under the lock.
+        """
+        with self.__direct_connection_lock:
+            direct_connection_info = list(self.__direct_connection_info or [])
+        found_healthy = False
+        for conn in direct_connection_info:
+            connection = conn['conn']
+            with self.__direct_connection_lock:
+                needs_api_check = conn['needs_api_check']
+            probe_start = time.monotonic()
+            try:
+                with socket.create_connection(
+                    (connection["ip"], connection["port"]), timeout=self.direct_connection_probe_timeout
+                ):
+                    pass
+            except OSError as probe_err:
+                logging.debug(
+                    'Direct connection %s:%s is not healthy: %s', connection["ip"], connection["port"], probe_err
+                )
+                with self.__direct_connection_lock:
+                    self.__mark_direct_connection_failed(conn, needs_api_check=False)
+                continue
+            rtt = time.monotonic() - probe_start
+            if needs_api_check and not self.__check_direct_connection_api(connection):
+                logging.debug('Direct connection %s:%s does not answer pings', connection["ip"], connection["port"])
+                with self.__direct_connection_lock:
+                    self.__mark_direct_connection_failed(conn, needs_api_check=False)
+                continue
+            with self.__direct_connection_lock:
+                if conn['needs_api_check'] and not needs_api_check:
+                    # An action failed on this connection while it was probed
+                    continue
+                self.__record_rtt(conn, rtt)
+                conn['needs_api_check'] = False
+                conn['cooldown'] = 0
+            found_healthy = True
+        if found_healthy:
+            with self.__direct_connection_lock:
+                self.__direct_connection_cooldown = 0
+                self.__direct_connection_consecutive_failures = 0
+
+    def __health_prober_loop(self):
+        while True:
+            try:
+                if time.time() - self.__direct_connection_last_refresh >= self.direct_connection_refresh_interval:
+                    self.__refresh_direct_connections()
+                self.__probe_direct_connections()
+            except (MYJDException, requests.exceptions.RequestException) as prober_err:
+                logging.debug('Direct connection health prober failed: %s', prober_err)
+            if self.__health_prober_stop.wait(self.direct_connection_probe_interval):
+                return
+
+    def start_health_prober(self):
+        if self.__health_prober is not None and self.__health_prober.is_alive():
             return
+        self.__health_prober_stop.clear()
+        self.__health_prober = threading.Thread(
+            target=self.__health_prober_loop, name=f'jd-health-prober-{self.name}', daemon=True
+        )
+        self.__health_prober.start()
 
-        tmp = self.__direct_connection_info.copy()
-        #  We remove old connections not available anymore.
-        for i in self.__direct_connection_info:
-            if i['conn'] not in direct_info:
-                tmp.remove(i)
-            else:
-                direct_info.remove(i['conn'])
-        # We add new connections
-        for conn in direct_info:
-            ip = conn['ip']
-            if is_ip_in_networks(ip, networks):
-                # Only local addresses will be added to the top
-                tmp_is_local.append({'conn': conn, 'cooldown': 0})
-            else:
-                # Add the rest to the end
-                tmp.append({'conn': conn, 'cooldown': 0})
-        self.__direct_connection_info = tmp_is_local + tmp
+    def stop_health_prober(self):
+        self.__health_prober_stop.set()
+        if self.__health_prober is not None and self.__health_prober is not threading.current_thread():
+            self.__health_prober.join(timeout=self.direct_connection_probe_timeout * 2)
+        self.__health_prober = None
+
+    def close(self):
+        """
+        Stops all background work of this device.
+        """
+        self.stop_health_prober()
 
     def enable_direct_connection(self):
         self.__direct_connection_enabled = True
         self.__refresh_direct_connections()
+        self.start_health_prober()
 
     def disable_direct_connection(self):
         self.__direct_connection_enabled = False
-        self.__direct_connection_info = None
+        self.stop_health_prober()
+        with self.__direct_connection_lock:
+            self.__direct_connection_info = None
 
     def action(self, path, params=(), http_action="POST"):
         """Execute any action in the device using the postparams and params.
@@ -1309,53 +1537,36 @@ class Jddevice:
         :param postparams: List of Params that are send in the post.
         """
         action_url = self.__action_url()
-        if (
-            not self.__direct_connection_enabled
-            or self.__direct_connection_info is None
-            or time.time() < self.__direct_connection_cooldown
-        ):
-            # No direct connection available, we use My.JDownloader api.
-            response = self.myjd.request_api(path, http_action, params, action_url)
-            if response is None:
-                # My.JDownloader Api failed too we assume a problem with the connection or the api server
-                # and throw an connection exception.
-                raise (MYJDConnectionException("No connection established\n"))
-            else:
-                # My.JDownloader Api worked, lets refresh the direct connections and return
-                # the response.
-                if self.__direct_connection_enabled and time.time() >= self.__direct_connection_cooldown:
-                    self.__refresh_direct_connections()
-                return response['data']
-        else:
-            # Direct connection info available, we try to use it.
-            for conn in self.__direct_connection_info:
-                if time.time() > conn['cooldown']:
-                    # We can use the connection
-                    connection = conn['conn']
-                    api = "http://" + connection["ip"] + ":" + str(connection["port"])
-                    response = self.myjd.request_api(path, http_action, params, action_url, api)
-                    if response is not None:
-                        # This connection worked so we push it to the top of the list.
-                        self.__direct_connection_info.remove(conn)
-                        self.__direct_connection_info.insert(0, conn)
+        if self.__direct_connection_enabled and time.time() >= self.__direct_connection_cooldown:
+            # Direct connections are refreshed and ranked by the health prober, we try the fastest first.
+            for conn in self.__get_ranked_direct_connections():
+                connection = conn['conn']
+                api = "http://" + connection["ip"] + ":" + str(connection["port"])
+                response = self.myjd.request_api(path, http_action, params, action_url, api)
+                if response is not None:
+                    # Only the prober measures the round-trip time, the duration of an action depends on its payload
+                    with self.__direct_connection_lock:
                         self.__direct_connection_consecutive_failures = 0
-                        return response['data']
-                    else:
-                        # We don't try to use this connection for a minute.
-                        conn['cooldown'] = time.time() + 60
-            # None of the direct connections worked, we set a cooldown for direct connections
-            self.__direct_connection_consecutive_failures += 1
-            self.__direct_connection_cooldown = time.time() + (60 * self.__direct_connection_consecutive_failures)
-            # None of the direct connections worked, we use the My.JDownloader api
-            response = self.myjd.request_api(path, http_action, params, action_url)
-            if response is None:
-                # My.JDownloader Api failed too we assume a problem with the connection or the api server
-                # and throw an connection exception.
-                raise (MYJDConnectionException("No connection established\n"))
-            # My.JDownloader Api worked, lets refresh the direct connections and return
-            # the response.
-            self.__refresh_direct_connections()
-            return response['data']
+                    return response['data']
+                # We don't try to use this connection until the prober revives it.
+                with self.__direct_connection_lock:
+                    self.__mark_direct_connection_failed(conn, needs_api_check=True)
+            with self.__direct_connection_lock:
+                if self.__direct_connection_info:
+                    # None of the direct connections worked, we set a cooldown for direct connections
+                    self.__direct_connection_consecutive_failures += 1
+                    self.__direct_connection_cooldown = time.time() + (
+                        self.direct_connection_failure_cooldown * self.__direct_connection_consecutive_failures
+                    )
+
+        # No direct connection available, we use My.JDownloader api.
+        # The direct connections are refreshed on schedule by the health prober, not on every fallback.
+        response = self.myjd.request_api(path, http_action, params, action_url)
+        if response is None:
+            # My.JDownloader Api failed too we assume a problem with the connection or the api server
+            # and throw an connection exception.
+            raise (MYJDConnectionException("No connection established\n"))
+        return response['data']
 
     def __action_url(self):
         return "/t_" + self.myjd.get_session_token() + "_" + self.device_id
@@ -1367,13 +1578,18 @@ class MyJdApi:
 
     """
 
-    def __init__(self):
+    default_api_url = "https://api.jdownloader.org"
+
+    def __init__(self, api_url=None):
         """
         This functions initializates the myjdapi object.
 
+        :param api_url: Url of the My.JDownloader api, a local mock server can be used for testing
         """
+        # Requests run in parallel threads (e.g. bulk addLinks), every request gets its own increasing id
+        self.__request_id_lock = threading.Lock()
         self.__request_id = int(time.time() * 1000)
-        self.__api_url = "https://api.jdownloader.org"
+        self.__api_url = (api_url or self.default_api_url).rstrip("/")
         self.__app_key = "http://git.io/vmcsk"
         self.__api_version = 1
         self.__devices = None
@@ -1383,6 +1599,9 @@ class MyJdApi:
         self.__regain_token = None
         self.__server_encryption_token = None
         self.__device_encryption_token = None
+        self.__login_cipher = None
+        self.__server_cipher = None
+        self.__device_cipher = None
         self.__connected = False
 
     def get_session_token(self):
@@ -1429,49 +1648,16 @@ class MyJdApi:
         new_token = hashlib.sha256()
         new_token.update(self.__device_secret + bytearray.fromhex(self.__session_token))
         self.__device_encryption_token = new_token.digest()
+        self.__server_cipher = JdCipher(self.__server_encryption_token)
+        self.__device_cipher = JdCipher(self.__device_encryption_token)
 
-    def __signature_create(self, key, data):
-        """
-        Calculates the signature for the data given a key.
-
-        :param key:
-        :param data:
-        """
-        signature = hmac.new(key, data.encode('utf-8'), hashlib.sha256)
-        return signature.hexdigest()
-
-    def __decrypt(self, secret_token, data):
-        """
-        Decrypts the data from the server using the provided token
-
-        :param secret_token:
-        :param data:
+    def update_request_id(self) -> int:
         """
-        init_vector = secret_token[: len(secret_token) // 2]
-        key = secret_token[len(secret_token) // 2 :]
-        decryptor = AES.new(key, AES.MODE_CBC, init_vector)
-        decrypted_data = UNPAD(decryptor.decrypt(base64.b64decode(data)))
-        return decrypted_data
-
-    def __encrypt(self, secret_token, data):
-        """
-        Encrypts the data from the server using the provided token
-
-        :param secret_token:
-        :param data:
+        Allocates the next Request_Id, it is unique and increasing even if requests are made at the same time
         """
-        data = PAD(data.encode('utf-8'))
-        init_vector = secret_token[: len(secret_token) // 2]
-        key = secret_token[len(secret_token) // 2 :]
-        encryptor = AES.new(key, AES.MODE_CBC, init_vector)
-        encrypted_data = base64.b64encode(encryptor.encrypt(data))
-        return encrypted_data.decode('utf-8')
-
-    def update_request_id(self):
-        """
-        Updates Request_Id
-        """
-        self.__request_id = int(time.time())
+        with self.__request_id_lock:
+            self.__request_id = max(int(time.time() * 1000), self.__request_id + 1)
+            return self.__request_id
 
     def connect(self, email, password):
         """Establish connection to api
@@ -1488,10 +1674,14 @@ class MyJdApi:
         self.__regain_token = None
         self.__server_encryption_token = None
         self.__device_encryption_token = None
+        self.__login_cipher = None
+        self.__server_cipher = None
+        self.__device_cipher = None
         self.__devices = None
         self.__connected = False
 
         self.__login_secret = self.__secret_create(email, password, "server")
+        self.__login_cipher = JdCipher(self.__login_secret)
         self.__device_secret = self.__secret_create(email, password, "device")
         response = self.request_api("/my/connect", "GET", [("email", email), ("appkey", self.__app_key)])
         self.__connected = True
@@ -1533,6 +1723,9 @@ class MyJdApi:
         self.__regain_token = None
         self.__server_encryption_token = None
         self.__device_encryption_token = None
+        self.__login_cipher = None
+        self.__server_cipher = None
+        self.__device_cipher = None
         self.__devices = None
         self.__connected = False
         return response
@@ -1593,6 +1786,7 @@ class MyJdApi:
         if not api:
             api = self.__api_url
         data = None
+        request_id = self.update_request_id()
         if not self.is_connected() and path != "/my/connect":
             raise (MYJDConnectionException("No connection established\n"))
         if http_method == "GET":
@@ -1603,18 +1797,20 @@ class MyJdApi:
                         query += ["%s=%s" % (param[0], quote(param[1]))]
                     else:
                         query += ["&%s=%s" % (param[0], param[1])]
-            query += ["rid=" + str(self.__request_id)]
-            if self.__server_encryption_token is None:
-                query += [
-                    "signature=" + str(self.__signature_create(self.__login_secret, query[0] + "&".join(query[1:])))
-                ]
+            query += ["rid=" + str(request_id)]
+            if self.__server_cipher is None:
+                query += ["signature=" + self.__login_cipher.sign(query[0] + "&".join(query[1:]))]
             else:
-                query += [
-                    "signature="
-                    + str(self.__signature_create(self.__server_encryption_token, query[0] + "&".join(query[1:])))
-                ]
+                query += ["signature=" + self.__server_cipher.sign(query[0] + "&".join(query[1:]))]
             query = query[0] + "&".join(query[1:])
-            encrypted_response = requests.get(api + query, timeout=50)
+            request_start = time.perf_counter()
+            try:
+                encrypted_response = requests.get(api + query, timeout=50)
+            except requests.exceptions.RequestException:
+                JD_API_ERRORS.inc(endpoint=path)
+                raise
+            finally:
+                JD_API_DURATION.observe(time.perf_counter() - request_start, endpoint=path)
         else:
             params_request = []
             if params is not None:
@@ -1627,17 +1823,18 @@ class MyJdApi:
                 "apiVer": self.__api_version,
                 "url": path,
                 "params": params_request,
-                "rid": self.__request_id,
+                "rid": request_id,
             }
-            data = orjson.dumps(params_request).decode('utf-8')  # pylint: disable=maybe-no-member
+            data = orjson.dumps(params_request)  # pylint: disable=maybe-no-member
             # Removing quotes around null elements.
-            data = data.replace('"null"', "null")
-            data = data.replace("'null'", "null")
-            encrypted_data = self.__encrypt(self.__device_encryption_token, data)
+            data = data.replace(b'"null"', b"null")
+            data = data.replace(b"'null'", b"null")
+            encrypted_data = self.__device_cipher.encrypt(data)
             if action is not None:
                 request_url = api + action + path
             else:
                 request_url = api + path
+            request_start = time.perf_counter()
             try:
                 encrypted_response = requests.post(
                     request_url,
@@ -1646,16 +1843,20 @@ class MyJdApi:
                     timeout=50,
                 )
             except requests.exceptions.RequestException as error:
+                JD_API_ERRORS.inc(endpoint=path)
                 logging.error(error)
                 return None
+            finally:
+                JD_API_DURATION.observe(time.perf_counter() - request_start, endpoint=path)
         if encrypted_response.status_code != 200:
+            JD_API_ERRORS.inc(endpoint=path)
             try:
                 error_msg = orjson.loads(encrypted_response.text)  # pylint: disable=maybe-no-member
             except orjson.JSONDecodeError:  # pylint: disable=maybe-no-member
                 try:
                     # pylint: disable=maybe-no-member
-                    error_msg = orjson.loads(self.__decrypt(self.__device_encryption_token, encrypted_response.text))
-                except orjson.JSONDecodeError:  # pylint: disable=maybe-no-member
+                    error_msg = orjson.loads(self.__device_cipher.decrypt(encrypted_response.content))
+                except (orjson.JSONDecodeError, AttributeError, ValueError):  # pylint: disable=maybe-no-member
                     raise MYJDDecodeException(f"Failed to decode response: {encrypted_response.text}")
             msg = (
                 "\n\tSOURCE: "
@@ -1670,18 +1871,16 @@ class MyJdApi:
                 msg += query
             msg += "\n"
             if data is not None:
-                msg += "DATA:\n" + data
+                msg += "DATA:\n" + data.decode('utf-8')
             raise (MYJDApiException.get_exception(error_msg["src"], error_msg["type"], msg))
         if action is None:
-            if not self.__server_encryption_token:
-                response = self.__decrypt(self.__login_secret, encrypted_response.text)
+            if self.__server_cipher is None:
+                response = self.__login_cipher.decrypt(encrypted_response.content)
             else:
-                response = self.__decrypt(self.__server_encryption_token, encrypted_response.text)
+                response = self.__server_cipher.decrypt(encrypted_response.content)
         else:
-            response = self.__decrypt(self.__device_encryption_token, encrypted_response.text)
-        jsondata = orjson.loads(response.decode('utf-8'))  # pylint: disable=maybe-no-member
-        if jsondata['rid'] != self.__request_id:
-            self.update_request_id()
+            response = self.__device_cipher.decrypt(encrypted_response.content)
+        jsondata = orjson.loads(response)  # pylint: disable=maybe-no-member
+        if jsondata['rid'] != request_id:
             return None
-        self.update_request_id()
         return jsondata
@@ -0,0 +1,220 @@
+"""
+Network helpers: the feed fetch workers, SSL contexts and requests sessions and the local network detection.
+
+They are kept apart from utils, so that aiohttp, requests and psutil are only imported by the tasks that need them.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import ssl
+import time
+from contextlib import asynccontextmanager
+from functools import cache
+from typing import Callable
+from urllib.parse import urlsplit
+
+import aiohttp
+import psutil
+import requests
+import urllib3
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, extract_zipped_paths
+
+from atom_dl.metrics import FETCH_BYTES, FETCH_DURATION, FETCH_RESPONSES
+from atom_dl.utils import check_verbose
+
+if not check_verbose():
+    # Warnings about insecure requests are only shown in verbose mode
+    urllib3.disable_warnings()
+
+
+class FetchHooks:
+    """
+    Process wide hooks for all feed requests, used to record responses and to replay them from localhost
+    """
+
+    # Maps the requested url to the url that is actually fetched
+    url_rewriter: Callable[[str], str] = None
+    # Is called with the requested url, the status code and the body of every response
+    response_recorder: Callable[[str, int, bytes], None] = None
+
+    @classmethod
+    def rewrite_url(cls, url: str) -> str:
+        if cls.url_rewriter is None:
+            return url
+        return cls.url_rewriter(url)
+
+    @classmethod
+    def record_response(cls, url: str, status: int, body: bytes):
+        if cls.response_recorder is not None:
+            cls.response_recorder(url, status, body)
+
+
+class FetchWorker:
+    def __init__(self, ssl_context: ssl.SSLContext):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context))
+
+    async def close(self):
+        await self.session.close()
+
+    async def fetch(self, url: str) -> str:
+        host = urlsplit(url).hostname or 'unknown'
+        start = time.perf_counter()
+        try:
+            async with self.session.get(FetchHooks.rewrite_url(url)) as response:
+                # The body is cached by aiohttp, text() decodes it without reading it again
+                body = await response.read()
+                FetchHooks.record_response(url, response.status, body)
+                FETCH_RESPONSES.inc(host=host, status=response.status)
+                FETCH_BYTES.inc(len(body), host=host)
+                return await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            FETCH_RESPONSES.inc(host=host, status='error')
+            raise
+        finally:
+            FETCH_DURATION.observe(time.perf_counter() - start, host=host)
+
+
+class FetchWorkerPool:
+    def __init__(self, num_workers: int, skip_cert_verify: bool, allow_insecure_ssl: bool, use_all_ciphers: bool):
+        ssl_context = SslHelper.get_ssl_context(skip_cert_verify, allow_insecure_ssl, use_all_ciphers)
+        self.workers = [FetchWorker(ssl_context) for _ in range(num_workers)]
+        self.queue: asyncio.Queue[FetchWorker] = asyncio.Queue()
+
+    async def __aenter__(self):
+        await self.start_workers()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop_workers()
+
+    async def start_workers(self):
+        for worker in self.workers:
+            await self.queue.put(worker)
+
+    async def stop_workers(self):
+        for worker in self.workers:
+            await worker.close()
+
+    async def get_worker(self) -> FetchWorker:
+        return await self.queue.get()
+
+    async def release_worker(self, worker: FetchWorker):
+        await self.queue.put(worker)
+
+    @asynccontextmanager
+    async def acquire_worker(self):
+        worker = await self.get_worker()
+        try:
+            yield worker
+        finally:
+            await self.release_worker(worker)
+
+    async def fetch(self, url: str) -> str:
+        worker = await self.get_worker()
+        try:
+            result = await worker.fetch(url)
+        finally:
+            await self.release_worker(worker)
+        return result
+
+
+def get_local_networks():
+    """
+    Get local IP addresses and subnet masks, then calculate the associated networks.
+    Returns a list of network objects.
+    """
+    networks = []
+    for _, addresses in psutil.net_if_addrs().items():
+        for addr in addresses:
+            # Check if it's an IPv4 address
+            if addr.family == socket.AF_INET:
+                ip_address = addr.address
+                netmask = addr.netmask
+
+                # Calculate the network based on IP address and netmask
+                if netmask:
+                    network = ipaddress.IPv4Network(f"{ip_address}/{netmask}", strict=False)
+                    networks.append(network)
+                    logging.info("Found local network: %s", network)
+    return networks
+
+
+def is_ip_in_networks(ip, networks: ipaddress.IPv4Network) -> bool:
+    """
+    Check if each IP address in `ip` is within any of the networks.
+    """
+    ip_obj = ipaddress.IPv4Address(ip)
+    return any(ip_obj in network for network in networks)
+
+
+class SslHelper:
+    warned_about_certifi = False
+
+    @classmethod
+    def load_default_certs(cls, ssl_context: ssl.SSLContext):
+        cert_loc = extract_zipped_paths(DEFAULT_CA_BUNDLE_PATH)
+
+        if not cert_loc or not os.path.exists(cert_loc):
+            if not cls.warned_about_certifi:
+                logging.warning(
+                    "Certifi could not find a suitable TLS CA certificate bundle, invalid path: %s", cert_loc
+                )
+                cls.warned_about_certifi = True
+            ssl_context.load_default_certs()
+        else:
+            if not os.path.isdir(cert_loc):
+                ssl_context.load_verify_locations(cafile=cert_loc)
+            else:
+                ssl_context.load_verify_locations(capath=cert_loc)
+
+    @classmethod
+    @cache
+    def get_ssl_context(cls, skip_cert_verify: bool, allow_insecure_ssl: bool, use_all_ciphers: bool) -> ssl.SSLContext:
+        if not skip_cert_verify:
+            ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+            cls.load_default_certs(ssl_context)
+        else:
+            ssl_context = ssl._create_unverified_context()  # pylint: disable=protected-access
+
+        if allow_insecure_ssl:
+            # This allows connections to legacy insecure servers
+            # https://www.openssl.org/docs/manmaster/man3/SSL_CTX_set_options.html#SECURE-RENEGOTIATION
+            # Be warned the insecure renegotiation allows an attack, see:
+            # https://nvd.nist.gov/vuln/detail/CVE-2009-3555
+            ssl_context.options |= 0x4  # set ssl.OP_LEGACY_SERVER_CONNECT bit
+        if use_all_ciphers:
+            ssl_context.set_ciphers('ALL')
+
+        # Activate ALPN extension
+        ssl_context.set_alpn_protocols(['http/1.1'])
+
+        return ssl_context
+
+    class CustomHttpAdapter(requests.adapters.HTTPAdapter):
+        '''
+        Transport adapter that allows us to use custom ssl_context.
+        See https://stackoverflow.com/a/71646353 for more details.
+        '''
+
+        def __init__(self, ssl_context=None, **kwargs):
+            self.ssl_context = ssl_context
+            super().__init__(**kwargs)
+
+        def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+            self.poolmanager = urllib3.poolmanager.PoolManager(
+                num_pools=connections, maxsize=maxsize, block=block, ssl_context=self.ssl_context, **pool_kwargs
+            )
+
+    @classmethod
+    def custom_requests_session(cls, skip_cert_verify: bool, allow_insecure_ssl: bool, use_all_ciphers: bool):
+        """
+        Return a new requests session with custom SSL context
+        """
+        session = requests.Session()
+        ssl_context = cls.get_ssl_context(skip_cert_verify, allow_insecure_ssl, use_all_ciphers)
+        session.mount('https://', cls.CustomHttpAdapter(ssl_context))
+        session.verify = not skip_cert_verify
+        return session
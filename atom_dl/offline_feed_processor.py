@@ -1,11 +1,15 @@
 import logging
+import time
 
 from atom_dl.config_helper import Config
 from atom_dl.feed_extractor import gen_extractors
+from atom_dl.feed_store import FeedStore
 from atom_dl.job_creator import JobCreator
+from atom_dl.jobs_queue import JobsQueue
+from atom_dl.metrics import MATCH_DURATION, MATCH_POSTS
 from atom_dl.types import AtomDlOpts
 from atom_dl.utils import PathTools as PT
-from atom_dl.utils import append_list_to_json, load_list_from_json
+from atom_dl.utils import load_list_from_json, recover_json_wal
 
 
 class OfflineFeedProcessor:
@@ -34,33 +38,47 @@ class OfflineFeedProcessor:
 
         logging.debug('Start collecting jobs...')
         jobs = []
-        for extractor in all_feed_info_extractors:
-            # Filter job creators based on feed name
-            feed_name = extractor.fie_key()
-            valid_job_creators = []
-            for job_creator in job_creators:
-                if job_creator.can_handle_feed(feed_name):
-                    valid_job_creators.append(job_creator)
-            if len(valid_job_creators) == 0:
-                continue
+        jobs_queue = JobsQueue()
+        with jobs_queue.producing('process_offline_feed'):
+            for extractor in all_feed_info_extractors:
+                # Filter job creators based on feed name
+                feed_name = extractor.fie_key()
+                valid_job_creators = []
+                for job_creator in job_creators:
+                    if job_creator.can_handle_feed(feed_name):
+                        valid_job_creators.append(job_creator)
+                if len(valid_job_creators) == 0:
+                    continue
 
-            path_of_feed_json = PT.get_path_of_feed_json(feed_name)
-            offline_feed = load_list_from_json(path_of_feed_json)
+                # Only posts that are new enough for at least one job creator are read from the feed store
+                published_since = None
+                published_since_dates = [job_creator.get_published_since() for job_creator in valid_job_creators]
+                if None not in published_since_dates:
+                    published_since = min(published_since_dates)
 
-            for post in offline_feed:
-                for job_creator in valid_job_creators:
-                    job = job_creator.process(post, extractor)
-                    if job is not None:
-                        jobs.append(job)
-                        # First job creator wins
-                        break
+                # This task holds the feed_store lock, so no feed update is appending to the feed right now
+                path_of_feed_json = PT.get_path_of_feed_json(feed_name)
+                recover_json_wal(path_of_feed_json)
+                feed_store = FeedStore(path_of_feed_json)
+                num_jobs_before = len(jobs)
+                num_posts = 0
+                match_start = time.perf_counter()
+                for post in feed_store.iter_posts(published_since=published_since):
+                    num_posts += 1
+                    for job_creator in valid_job_creators:
+                        job = job_creator.process(post, extractor)
+                        if job is not None:
+                            jobs.append(job)
+                            # First job creator wins
+                            break
+                MATCH_DURATION.observe(time.perf_counter() - match_start, feed=feed_name)
+                num_matched = len(jobs) - num_jobs_before
+                MATCH_POSTS.inc(num_matched, feed=feed_name, result='matched')
+                MATCH_POSTS.inc(num_posts - num_matched, feed=feed_name, result='unmatched')
 
-        logging.info('Collected %d jobs', len(jobs))
+                # Jobs are queued per feed, so a running JobsFeeder can start feeding them right away
+                jobs_queue.push(jobs[num_jobs_before:])
 
-        if len(jobs) == 0:
-            return
+        jobs_queue.close()
 
-        logging.info('Appending jobs to jobs queue...')
-        path_of_jobs_json = PT.get_path_of_jobs_json()
-        append_list_to_json(path_of_jobs_json, jobs)
-        logging.info('Jobs appended to: %r', path_of_jobs_json)
+        logging.info('Added %d jobs to the jobs queue', len(jobs))
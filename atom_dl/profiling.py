@@ -0,0 +1,257 @@
+"""
+Profiling of a whole atom-dl run, enabled with --profile.
+
+Two profilers are available:
+- cprofile: deterministic profile of the main thread, saved as .prof file (snakeviz, gprof2dot, pstats)
+- sampling: samples the stacks of all threads, saved in the collapsed stack format of flamegraph.pl / speedscope
+
+In both modes the asyncio tasks are traced, so it is visible how much of the lifetime of a task
+(e.g. FeedInfoExtractor.fetch_page_and_extract or JobsFeeder.check_decrypt_jobs) was spent on the CPU
+and how much waiting for the network, JDownloader or the executor threads.
+"""
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Coroutine
+from datetime import datetime
+from typing import Dict, List
+
+from atom_dl.types import profile_modes
+from atom_dl.utils import PathTools as PT
+
+
+class TaskStats:
+    def __init__(self):
+        self.num_tasks = 0
+        self.num_steps = 0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+
+    @property
+    def wait_time(self) -> float:
+        return max(self.wall_time - self.cpu_time, 0.0)
+
+
+class TracedCoroutine(Coroutine):
+    """
+    Wraps a coroutine and measures the thread CPU time of every step the event loop runs it
+    """
+
+    def __init__(self, coro, tracer: 'AsyncTaskTracer'):
+        self.coro = coro
+        self.tracer = tracer
+        self.name = getattr(coro, '__qualname__', type(coro).__qualname__)
+        self.started = time.perf_counter()
+        self.cpu_time = 0.0
+        self.num_steps = 0
+
+    def step(self, method, *args):
+        start = time.thread_time()
+        has_finished = False
+        try:
+            return method(*args)
+        except BaseException:
+            # StopIteration included, the coroutine is done
+            has_finished = True
+            raise
+        finally:
+            self.cpu_time += time.thread_time() - start
+            self.num_steps += 1
+            if has_finished:
+                self.finish()
+
+    def finish(self):
+        self.tracer.add(self.name, self.num_steps, self.cpu_time, time.perf_counter() - self.started)
+
+    def send(self, value):
+        return self.step(self.coro.send, value)
+
+    def throw(self, typ, val=None, tb=None):  # pylint: disable=arguments-differ
+        return self.step(self.coro.throw, typ, val, tb)
+
+    def close(self):
+        return self.coro.close()
+
+    def __await__(self):
+        return self.coro.__await__()
+
+
+class AsyncTaskTracer:
+    """
+    Installs a task factory on every event loop created by asyncio.run while it is active
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats: Dict[str, TaskStats] = {}
+        self.old_policy = None
+
+    def add(self, name: str, num_steps: int, cpu_time: float, wall_time: float):
+        with self.lock:
+            stats = self.stats.setdefault(name, TaskStats())
+            stats.num_tasks += 1
+            stats.num_steps += num_steps
+            stats.cpu_time += cpu_time
+            stats.wall_time += wall_time
+
+    def task_factory(self, loop: asyncio.AbstractEventLoop, coro, **kwargs):
+        return asyncio.Task(TracedCoroutine(coro, self), loop=loop, **kwargs)
+
+    def start(self):
+        tracer = self
+
+        class TracingEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+            def new_event_loop(self):
+                loop = super().new_event_loop()
+                loop.set_task_factory(tracer.task_factory)
+                return loop
+
+        self.old_policy = asyncio.get_event_loop_policy()
+        asyncio.set_event_loop_policy(TracingEventLoopPolicy())
+
+    def stop(self):
+        asyncio.set_event_loop_policy(self.old_policy)
+
+    def format_report(self) -> str:
+        lines = [
+            f'{"task":<70} {"tasks":>7} {"steps":>8} {"cpu [s]":>10} {"wait [s]":>10} {"wall [s]":>10} {"cpu %":>6}'
+        ]
+        with self.lock:
+            all_stats = sorted(self.stats.items(), key=lambda item: item[1].wall_time, reverse=True)
+        for name, stats in all_stats:
+            cpu_percent = 100 * stats.cpu_time / stats.wall_time if stats.wall_time > 0 else 0
+            lines.append(
+                f'{name[-70:]:<70} {stats.num_tasks:>7} {stats.num_steps:>8} {stats.cpu_time:>10.3f}'
+                + f' {stats.wait_time:>10.3f} {stats.wall_time:>10.3f} {cpu_percent:>6.1f}'
+            )
+        return '\n'.join(lines)
+
+
+class StackSampler:
+    """
+    Samples the stacks of all threads in a background thread and counts the collapsed stacks
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.num_samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def format_frame(frame) -> str:
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def sample(self):
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+        for thread_ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+            if thread_ident == own_ident:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self.format_frame(frame))
+                frame = frame.f_back
+            frames.append(thread_names.get(thread_ident, str(thread_ident)))
+            self.stacks[';'.join(reversed(frames))] += 1
+        self.num_samples += 1
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def format_collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RunProfiler:
+    """
+    Context manager that profiles everything that runs inside it and writes the reports to the output directory
+    """
+
+    def __init__(self, mode: str, output_directory: str, task_name: str):
+        if mode not in profile_modes:
+            raise ValueError(f'Unknown profile mode {mode!r}, use one of {profile_modes}')
+        self.mode = mode
+        # Runs that start in the same second (e.g. tasks started by cron) must not overwrite each other's reports
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        self.path_prefix = PT.make_path(output_directory, f'AtomDL-profile-{task_name}-{timestamp}-{os.getpid()}')
+        self.task_tracer = AsyncTaskTracer()
+        self.profiler = None
+        self.sampler = None
+        self.started = None
+
+    def __enter__(self):
+        self.task_tracer.start()
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+        else:
+            self.sampler = StackSampler()
+            self.sampler.start()
+        self.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+        took = time.perf_counter() - self.started
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.task_tracer.stop()
+        try:
+            self.write_reports(took)
+        except OSError as write_err:
+            logging.error('Could not write the profile reports: %s', write_err)
+
+    def write_reports(self, took: float):
+        written_files: List[str] = []
+        report = io.StringIO()
+        report.write(f'Profile mode: {self.mode}\nWall time: {took:.3f}s\n\n')
+
+        if self.profiler is not None:
+            path_of_prof = self.path_prefix + '.prof'
+            self.profiler.dump_stats(path_of_prof)
+            written_files.append(path_of_prof)
+            report.write('Top functions by cumulative time (main thread):\n')
+            pstats.Stats(self.profiler, stream=report).sort_stats('cumulative').print_stats(40)
+
+        if self.sampler is not None:
+            path_of_collapsed = self.path_prefix + '.collapsed'
+            with open(path_of_collapsed, 'w', encoding='utf-8') as collapsed_file:
+                collapsed_file.write(self.sampler.format_collapsed())
+            written_files.append(path_of_collapsed)
+            report.write(
+                f'Stack samples: {self.sampler.num_samples} every {self.sampler.interval * 1000:.0f}ms,'
+                + ' render them with flamegraph.pl or speedscope\n\n'
+            )
+
+        report.write('Asyncio tasks (cpu = time running on the event loop, wait = rest of the task lifetime):\n')
+        report.write(self.task_tracer.format_report() + '\n')
+
+        path_of_report = self.path_prefix + '.txt'
+        with open(path_of_report, 'w', encoding='utf-8') as report_file:
+            report_file.write(report.getvalue())
+        written_files.append(path_of_report)
+
+        for path in written_files:
+            logging.info('Profile report written to %r', path)
@@ -1,4 +1,8 @@
 from dataclasses import dataclass
+from enum import Enum
+
+# Profilers of --profile, see atom_dl.profiling
+profile_modes = ['sampling', 'cprofile']
 
 
 @dataclass
@@ -7,6 +11,7 @@ class AtomDlOpts:
     path_to_job_defs: str
     feed_jdownloader: bool
     extract_archives: bool
+    daemon: bool
 
     do_not_auto_start_downloading: bool
 
@@ -21,4 +26,22 @@ class AtomDlOpts:
     log_to_file: bool
     log_file_path: str
 
+    profile: str = None
+
     max_reties_of_downloads: int = 3
+
+
+class TopCategory(Enum):
+    books = 'Bücher'
+    textbooks = 'Fachbücher'
+    language_teaching_material = 'Sprachunterricht'
+    magazines = 'Magazine'
+    newspapers = 'Zeitungen'
+    comics = 'Comics'
+    manga = 'Manga'
+    audios = 'Audios'
+    videos = 'Videos'
+    movies = 'Filme'
+    series = 'Serien'
+    anime = 'Anime'
+    software = 'Software'
@@ -1,183 +1,18 @@
-import asyncio
 import collections
 import html
-import ipaddress
 import itertools
 import logging
 import math
 import os
 import re
-import socket
-import ssl
 import sys
 import tempfile
 import unicodedata
-from contextlib import asynccontextmanager
-from functools import cache
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 
-import aiohttp
 import orjson
-import psutil
-import requests
-import urllib3
-from requests.utils import DEFAULT_CA_BUNDLE_PATH, extract_zipped_paths
-
-
-class FetchWorker:
-    def __init__(self, ssl_context: ssl.SSLContext):
-        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context))
-
-    async def close(self):
-        await self.session.close()
-
-    async def fetch(self, url: str) -> str:
-        async with self.session.get(url) as response:
-            return await response.text()
-
-
-class FetchWorkerPool:
-    def __init__(self, num_workers: int, skip_cert_verify: bool, allow_insecure_ssl: bool, use_all_ciphers: bool):
-        ssl_context = SslHelper.get_ssl_context(skip_cert_verify, allow_insecure_ssl, use_all_ciphers)
-        self.workers = [FetchWorker(ssl_context) for _ in range(num_workers)]
-        self.queue: asyncio.Queue[FetchWorker] = asyncio.Queue()
-
-    async def __aenter__(self):
-        await self.start_workers()
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.stop_workers()
-
-    async def start_workers(self):
-        for worker in self.workers:
-            await self.queue.put(worker)
-
-    async def stop_workers(self):
-        for worker in self.workers:
-            await worker.close()
-
-    async def get_worker(self) -> FetchWorker:
-        return await self.queue.get()
-
-    async def release_worker(self, worker: FetchWorker):
-        await self.queue.put(worker)
-
-    @asynccontextmanager
-    async def acquire_worker(self):
-        worker = await self.get_worker()
-        try:
-            yield worker
-        finally:
-            await self.release_worker(worker)
-
-    async def fetch(self, url: str) -> str:
-        worker = await self.get_worker()
-        try:
-            result = await worker.fetch(url)
-        finally:
-            await self.release_worker(worker)
-        return result
-
-
-def get_local_networks():
-    """
-    Get local IP addresses and subnet masks, then calculate the associated networks.
-    Returns a list of network objects.
-    """
-    networks = []
-    for _, addresses in psutil.net_if_addrs().items():
-        for addr in addresses:
-            # Check if it's an IPv4 address
-            if addr.family == socket.AF_INET:
-                ip_address = addr.address
-                netmask = addr.netmask
-
-                # Calculate the network based on IP address and netmask
-                if netmask:
-                    network = ipaddress.IPv4Network(f"{ip_address}/{netmask}", strict=False)
-                    networks.append(network)
-                    logging.info("Found local network: %s", network)
-    return networks
-
-
-def is_ip_in_networks(ip, networks: ipaddress.IPv4Network) -> bool:
-    """
-    Check if each IP address in `ip` is within any of the networks.
-    """
-    ip_obj = ipaddress.IPv4Address(ip)
-    return any(ip_obj in network for network in networks)
-
-
-class SslHelper:
-    warned_about_certifi = False
-
-    @classmethod
-    def load_default_certs(cls, ssl_context: ssl.SSLContext):
-        cert_loc = extract_zipped_paths(DEFAULT_CA_BUNDLE_PATH)
-
-        if not cert_loc or not os.path.exists(cert_loc):
-            if not cls.warned_about_certifi:
-                logging.warning(
-                    "Certifi could not find a suitable TLS CA certificate bundle, invalid path: %s", cert_loc
-                )
-                cls.warned_about_certifi = True
-            ssl_context.load_default_certs()
-        else:
-            if not os.path.isdir(cert_loc):
-                ssl_context.load_verify_locations(cafile=cert_loc)
-            else:
-                ssl_context.load_verify_locations(capath=cert_loc)
-
-    @classmethod
-    @cache
-    def get_ssl_context(cls, skip_cert_verify: bool, allow_insecure_ssl: bool, use_all_ciphers: bool) -> ssl.SSLContext:
-        if not skip_cert_verify:
-            ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-            cls.load_default_certs(ssl_context)
-        else:
-            ssl_context = ssl._create_unverified_context()  # pylint: disable=protected-access
-
-        if allow_insecure_ssl:
-            # This allows connections to legacy insecure servers
-            # https://www.openssl.org/docs/manmaster/man3/SSL_CTX_set_options.html#SECURE-RENEGOTIATION
-            # Be warned the insecure renegotiation allows an attack, see:
-            # https://nvd.nist.gov/vuln/detail/CVE-2009-3555
-            ssl_context.options |= 0x4  # set ssl.OP_LEGACY_SERVER_CONNECT bit
-        if use_all_ciphers:
-            ssl_context.set_ciphers('ALL')
-
-        # Activate ALPN extension
-        ssl_context.set_alpn_protocols(['http/1.1'])
-
-        return ssl_context
-
-    class CustomHttpAdapter(requests.adapters.HTTPAdapter):
-        '''
-        Transport adapter that allows us to use custom ssl_context.
-        See https://stackoverflow.com/a/71646353 for more details.
-        '''
-
-        def __init__(self, ssl_context=None, **kwargs):
-            self.ssl_context = ssl_context
-            super().__init__(**kwargs)
-
-        def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
-            self.poolmanager = urllib3.poolmanager.PoolManager(
-                num_pools=connections, maxsize=maxsize, block=block, ssl_context=self.ssl_context, **pool_kwargs
-            )
-
-    @classmethod
-    def custom_requests_session(cls, skip_cert_verify: bool, allow_insecure_ssl: bool, use_all_ciphers: bool):
-        """
-        Return a new requests session with custom SSL context
-        """
-        session = requests.Session()
-        ssl_context = cls.get_ssl_context(skip_cert_verify, allow_insecure_ssl, use_all_ciphers)
-        session.mount('https://', cls.CustomHttpAdapter(ssl_context))
-        session.verify = not skip_cert_verify
-        return session
 
 
 def check_verbose() -> bool:
@@ -190,37 +25,6 @@ def check_debug() -> bool:
     return 'pydevd' in sys.modules or (hasattr(sys, 'gettrace') and sys.gettrace() is not None)
 
 
-class LockError(Exception):
-    """An Exception which gets thrown if a Downloader is already running."""
-
-    pass
-
-
-def process_lock():
-    """
-    A very simple lock mechanism to prevent multiple downloaders being started.
-
-    The functions are not resistant to high frequency calls.
-    Raise conditions will occur!
-
-    Test if a lock is already set in a directory, if not it creates the lock.
-    """
-    if not check_debug():
-        path = PathTools.get_path_of_lock_file()
-        if Path(path).exists():
-            raise LockError(f'A downloader is already running. Delete {str(path)} if you think this is wrong.')
-        Path(path).touch()
-
-
-def process_unlock():
-    """Remove a lock in a directory."""
-    path = PathTools.get_path_of_lock_file()
-    try:
-        Path(path).unlink()
-    except OSError:
-        pass
-
-
 _timetuple = collections.namedtuple('Time', ('hours', 'minutes', 'seconds', 'milliseconds'))
 
 
@@ -274,19 +78,20 @@ def timetuple_from_msec(msec):
 
 
 def formatSeconds(secs, msec=False):
-    time = timetuple_from_msec(secs * 1000)
-    if time.hours:
-        ret = '%dh %02dm %02ds' % (time.hours, time.minutes, time.seconds)
-    elif time.minutes:
-        ret = '%dm %02ds' % (time.minutes, time.seconds)
+    time_tuple = timetuple_from_msec(secs * 1000)
+    if time_tuple.hours:
+        ret = '%dh %02dm %02ds' % (time_tuple.hours, time_tuple.minutes, time_tuple.seconds)
+    elif time_tuple.minutes:
+        ret = '%dm %02ds' % (time_tuple.minutes, time_tuple.seconds)
     else:
-        ret = '%ds' % time.seconds
-    return '%s.%03ds' % (ret, time.milliseconds) if msec else ret
+        ret = '%ds' % time_tuple.seconds
+    return '%s.%03ds' % (ret, time_tuple.milliseconds) if msec else ret
 
 
 def load_list_from_json(json_file_path: str) -> List[Dict]:
     """
-    Return the list stored in a json file or an empty list
+    Return the list stored in a json file or an empty list.
+    An interrupted append is not recovered here, the writer may still be applying it (see recover_json_wal).
     """
     if os.path.exists(json_file_path):
         with open(json_file_path, 'rb') as config_file:
@@ -296,6 +101,43 @@ def load_list_from_json(json_file_path: str) -> List[Dict]:
         return []
 
 
+def iter_list_from_json(json_file_path: str) -> Iterator:
+    """
+    Yields the elements of the list stored in a json file one by one, without loading the whole file.
+    Like append_list_to_json this makes strict assumptions about the file format (orjson.OPT_INDENT_2),
+    every top level element starts at a line with an indentation of two spaces.
+    For files in any other format it falls back to loading the whole list.
+    """
+    if not os.path.exists(json_file_path):
+        return
+
+    with open(json_file_path, 'rb') as json_file:
+        first_line = json_file.readline()
+        if first_line.rstrip() != b'[':
+            json_file.seek(0)
+            yield from orjson.loads(json_file.read())  # pylint: disable=maybe-no-member
+            return
+
+        element_lines = []
+        for line in json_file:
+            if element_lines:
+                element_lines.append(line)
+                # Only the end of a top level element is indented with exactly two spaces
+                if line.startswith(b'  ') and line[2:3] in (b'}', b']'):
+                    yield orjson.loads(b''.join(element_lines).rstrip().rstrip(b','))  # pylint: disable=maybe-no-member
+                    element_lines = []
+                continue
+
+            if not line.startswith(b'  '):
+                # The closing bracket of the list
+                continue
+            stripped_line = line.rstrip().rstrip(b',')
+            if stripped_line in (b'  {', b'  ['):
+                element_lines.append(line)
+            else:
+                yield orjson.loads(stripped_line)  # pylint: disable=maybe-no-member
+
+
 def load_dict_from_json(json_file_path: str) -> Dict:
     """
     Return the dict stored in a json file or an empty dict
@@ -308,7 +150,116 @@ def load_dict_from_json(json_file_path: str) -> Dict:
         return {}
 
 
-def append_list_to_json(json_file_path: str, list_to_append: List[Dict]):
+def get_file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns (mtime_ns, size) of a file, or None if it does not exist. Used to detect changes of state files.
+    """
+    try:
+        stat_result = os.stat(file_path)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def fsync_directory(dir_path: str):
+    """
+    Makes a rename or a newly created file in a directory durable
+    """
+    if os.name == 'nt':
+        return
+    dir_fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def read_umask() -> int:
+    # The umask can only be read by setting it, so it is read once at startup before any threads run
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+UMASK = read_umask()
+
+
+def set_default_file_mode(fd: int):
+    """
+    mkstemp creates files with mode 0600, this gives them the mode open() would have given them
+    """
+    if hasattr(os, 'fchmod'):
+        os.fchmod(fd, 0o666 & ~UMASK)
+
+
+def write_bytes_atomic(file_path: str, data: bytes, fsync: bool = True):
+    """
+    Writes data to a temporary file in the same directory and renames it to file_path,
+    so file_path contains either the old or the new data, even if the process crashes while writing.
+    """
+    dir_path = os.path.dirname(os.path.abspath(file_path))
+    tmp_fd, tmp_file_path = tempfile.mkstemp(
+        prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp', dir=dir_path
+    )
+    try:
+        set_default_file_mode(tmp_fd)
+        with open(tmp_fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+            if fsync:
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+        os.replace(tmp_file_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_file_path)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        fsync_directory(dir_path)
+
+
+def get_path_of_json_wal(json_file_path: str) -> str:
+    return json_file_path + '.wal'
+
+
+def apply_json_append(json_file_path: str, base_size: int, json_bytes: bytes, fsync: bool):
+    """
+    Appends the list json_bytes to the json list file that had base_size bytes before the append.
+    Applying it more than once has the same effect as applying it once.
+    """
+    if base_size == 0:
+        write_bytes_atomic(json_file_path, json_bytes, fsync)
+        return
+    with open(json_file_path, 'r+b') as o_file:
+        o_file.seek(base_size - 3)  # Remove \n]\n
+        o_file.write(b',\n')
+        o_file.write(json_bytes[2:])  # Remove [\n
+        o_file.truncate()
+        if fsync:
+            o_file.flush()
+            os.fsync(o_file.fileno())
+
+
+def recover_json_wal(json_file_path: str, fsync: bool = True):
+    """
+    Finishes an append to a json list file that was interrupted, if there is one.
+    Only writers of the file may call this, so the caller has to hold the lock of the resource the file belongs to.
+    """
+    wal_path = get_path_of_json_wal(json_file_path)
+    if not os.path.isfile(wal_path):
+        return
+    with open(wal_path, 'rb') as wal_file:
+        base_size = int(wal_file.readline())
+        json_bytes = wal_file.read()
+    logging.warning('Recovering interrupted append to %r', json_file_path)
+    apply_json_append(json_file_path, base_size, json_bytes, fsync)
+    os.remove(wal_path)
+    if fsync:
+        fsync_directory(os.path.dirname(os.path.abspath(json_file_path)))
+
+
+def append_list_to_json(json_file_path: str, list_to_append: List[Dict], fsync: bool = True):
     """
     This appends a list of dictionaries to the end of a json file.
     If the json file does not exist a new json file is created.
@@ -327,36 +278,36 @@ def append_list_to_json(json_file_path: str, list_to_append: List[Dict]):
     ]
 
     ```
+    The appended list is written to a write-ahead log (<json_file_path>.wal) first.
+    If the process crashes while appending, the append is finished on the next access of the file.
     """
     # pylint: disable=maybe-no-member
     json_bytes = orjson.dumps(list_to_append, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    wal_path = get_path_of_json_wal(json_file_path)
     try:
-        if os.path.isfile(json_file_path):
-            o_file = open(json_file_path, 'r+b')
-            o_file.seek(-3, os.SEEK_END)  # Remove \n]\n
-            o_file.write(b',\n')
-            o_file.write(json_bytes[2:])  # Remove [\n
-        else:
-            o_file = open(json_file_path, 'wb')
-            o_file.write(json_bytes)
-
+        recover_json_wal(json_file_path, fsync)
+        base_size = os.path.getsize(json_file_path) if os.path.isfile(json_file_path) else 0
+        write_bytes_atomic(wal_path, str(base_size).encode('ascii') + b'\n' + json_bytes, fsync)
+        apply_json_append(json_file_path, base_size, json_bytes, fsync)
+        os.remove(wal_path)
     except (OSError, IOError) as err:
         logging.error('Error: Could not append List to json: %r Reason: %s', json_file_path, err)
         sys.exit(-1)
-    finally:
-        if o_file is not None:
-            o_file.close()
 
 
-def write_to_json(json_file_path: str, item_to_store):
+def write_to_json(json_file_path: str, item_to_store, fsync: bool = True):
     """
     This writes a object to a json file, if the file exists it will be overwritten.
+    The file is replaced atomically, so it is never left half written.
     """
     # pylint: disable=maybe-no-member
     json_bytes = orjson.dumps(item_to_store, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
     try:
-        with open(json_file_path, 'wb') as o_file:
-            o_file.write(json_bytes)
+        write_bytes_atomic(json_file_path, json_bytes, fsync)
+        # A pending append is superseded by the new content
+        wal_path = get_path_of_json_wal(json_file_path)
+        if os.path.isfile(wal_path):
+            os.remove(wal_path)
 
     except (OSError, IOError) as err:
         logging.error('Error: Could not write item to json: %r Reason: %s', json_file_path, err)
@@ -388,11 +339,60 @@ ACCENT_CHARS = dict(
 )
 
 
+class SanitizeTable(dict):
+    """
+    Translation table for str.translate, the replacement of every character is computed once on first use
+    """
+
+    def __init__(self, restricted: bool, keep_id: bool):
+        super().__init__()
+        self.restricted = restricted
+        self.keep_id = keep_id
+
+    def __missing__(self, codepoint: int) -> str:
+        replacement = self.replace_insane(chr(codepoint))
+        self[codepoint] = replacement
+        return replacement
+
+    def replace_insane(self, char: str) -> str:
+        restricted = self.restricted
+        if restricted and char in ACCENT_CHARS:
+            return ACCENT_CHARS[char]
+        elif not restricted and char == '\n':
+            return '\0 '
+        elif not self.keep_id and not restricted and char in '"*:<>?|/\\':
+            # Replace with their full-width unicode counterparts
+            return {'/': '\u29F8', '\\': '\u29f9'}.get(char, chr(ord(char) + 0xFEE0))
+        elif char == '?' or ord(char) < 32 or ord(char) == 127:
+            return ''
+        elif char == '"':
+            return '' if restricted else '\''
+        elif char == ':':
+            return '\0_\0-' if restricted else '\0 \0-'
+        elif char in '\\/|*<>':
+            return '\0_'
+        if restricted and (char in '!&\'()[]{}$;`^,#' or char.isspace() or ord(char) > 127):
+            return '\0_'
+        return char
+
+
 class PathTools:
     """A set of methods to create correct paths."""
 
     restricted_filenames = False
 
+    # One translation table per combination of (restricted, keep_id)
+    sanitize_tables = {
+        (restricted, keep_id): SanitizeTable(restricted, keep_id)
+        for restricted in [False, True]
+        for keep_id in [False, True]
+    }
+    repeated_spaces_pattern = re.compile(r' {2,}')
+    repeated_underscores_pattern = re.compile(r'_{2,}')
+    timestamp_pattern = re.compile(r'[0-9]+(?::[0-9]+)+')
+    repeated_substitute_pattern = re.compile(r'(\0.)(?:(?=\1)..)+')
+    substitute_strip_pattern = re.compile('^\0.(?:\0.|[ _-])*|(?:\0.|[ _-])*\0.$')
+
     @staticmethod
     def to_valid_name(name: str) -> str:
         """Filtering invalid characters in filenames and paths.
@@ -407,15 +407,16 @@ class PathTools:
         if name is None:
             return None
 
+        return PathTools.to_valid_name_cached(name, PathTools.restricted_filenames)
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def to_valid_name_cached(name: str, restricted: bool) -> str:
         name = html.unescape(name)
 
-        name = name.replace('\n', ' ')
-        name = name.replace('\r', ' ')
-        name = name.replace('\t', ' ')
-        name = name.replace('\xad', '')
-        while '  ' in name:
-            name = name.replace('  ', ' ')
-        name = PathTools.sanitize_filename(name, PathTools.restricted_filenames)
+        name = name.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ').replace('\xad', '')
+        name = PathTools.repeated_spaces_pattern.sub(' ', name)
+        name = PathTools.sanitize_filename(name, restricted)
         name = name.strip('. ')
         name = name.strip()
 
@@ -431,39 +432,22 @@ class PathTools:
         if s == '':
             return ''
 
-        def replace_insane(char):
-            if restricted and char in ACCENT_CHARS:
-                return ACCENT_CHARS[char]
-            elif not restricted and char == '\n':
-                return '\0 '
-            elif is_id is NO_DEFAULT and not restricted and char in '"*:<>?|/\\':
-                # Replace with their full-width unicode counterparts
-                return {'/': '\u29F8', '\\': '\u29f9'}.get(char, chr(ord(char) + 0xFEE0))
-            elif char == '?' or ord(char) < 32 or ord(char) == 127:
-                return ''
-            elif char == '"':
-                return '' if restricted else '\''
-            elif char == ':':
-                return '\0_\0-' if restricted else '\0 \0-'
-            elif char in '\\/|*<>':
-                return '\0_'
-            if restricted and (char in '!&\'()[]{}$;`^,#' or char.isspace() or ord(char) > 127):
-                return '\0_'
-            return char
-
         if restricted and is_id is NO_DEFAULT:
             s = unicodedata.normalize('NFKC', s)
-        s = re.sub(r'[0-9]+(?::[0-9]+)+', lambda m: m.group(0).replace(':', '_'), s)  # Handle timestamps
-        result = ''.join(map(replace_insane, s))
-        if is_id is NO_DEFAULT:
-            result = re.sub(r'(\0.)(?:(?=\1)..)+', r'\1', result)  # Remove repeated substitute chars
-            STRIP_RE = r'(?:\0.|[ _-])*'
-            result = re.sub(f'^\0.{STRIP_RE}|{STRIP_RE}\0.$', '', result)  # Remove substitute chars from start/end
-        result = result.replace('\0', '') or '_'
+        if ':' in s:
+            # Handle timestamps
+            s = PathTools.timestamp_pattern.sub(lambda m: m.group(0).replace(':', '_'), s)
+        result = s.translate(PathTools.sanitize_tables[(bool(restricted), is_id is not NO_DEFAULT)])
+        if '\0' in result:
+            if is_id is NO_DEFAULT:
+                # Remove repeated substitute chars and substitute chars from start/end
+                result = PathTools.repeated_substitute_pattern.sub(r'\1', result)
+                result = PathTools.substitute_strip_pattern.sub('', result)
+            result = result.replace('\0', '')
+        result = result or '_'
 
         if not is_id:
-            while '__' in result:
-                result = result.replace('__', '_')
+            result = PathTools.repeated_underscores_pattern.sub('_', result)
             result = result.strip('_')
             # Common case of "Foreign band name - English song title"
             if restricted and result.startswith('-_'):
@@ -582,23 +566,18 @@ class PathTools:
             feeds_dir.mkdir(parents=True, exist_ok=True)
         return str(feeds_dir)
 
-    @staticmethod
-    def get_jobs_backup_directory():
-        backup_dir = Path(PathTools.get_project_data_directory()) / "jobs_backup"
-        if not backup_dir.is_dir():
-            backup_dir.mkdir(parents=True, exist_ok=True)
-        return str(backup_dir)
-
     @staticmethod
     def get_unused_filename(destination: str, filename: str, file_extension: str, start_clear=False):
         count = 0
+        # Files without an extension keep having none
+        suffix = f'.{file_extension}' if file_extension is not None else ''
         if start_clear:
-            new_file_path = str(Path(destination) / f'{filename}.{file_extension}')
+            new_file_path = str(Path(destination) / f'{filename}{suffix}')
         else:
-            new_file_path = str(Path(destination) / f'{filename}_{count:04d}.{file_extension}')
+            new_file_path = str(Path(destination) / f'{filename}_{count:04d}{suffix}')
         while os.path.exists(new_file_path):
             count += 1
-            new_file_path = str(Path(destination) / f'{filename}_{count:04d}.{file_extension}')
+            new_file_path = str(Path(destination) / f'{filename}_{count:04d}{suffix}')
 
         return new_file_path
 
@@ -635,8 +614,11 @@ class PathTools:
         return str(Path(PathTools.get_project_config_directory()) / 'last_feed_job_defs.json')
 
     @staticmethod
-    def get_path_of_lock_file():
-        return str(Path(tempfile.gettempdir()) / 'AtomDownloader.running.lock')
+    def get_path_of_lock_file(resource: str):
+        locks_dir = Path(PathTools.get_project_data_directory()) / 'locks'
+        if not locks_dir.is_dir():
+            locks_dir.mkdir(parents=True, exist_ok=True)
+        return str(locks_dir / f'{resource}.lock')
 
     @staticmethod
     def get_path_of_new_feed_json(downloader_name: str):
@@ -665,14 +647,37 @@ class PathTools:
         return str(Path(PathTools.get_project_data_directory()) / 'last_feed_update.json')
 
     @staticmethod
-    def get_path_of_backup_jobs_json():
-        backup_dir = PathTools.get_jobs_backup_directory()
-        return PathTools.get_unused_filename(backup_dir, 'jobs', 'json')
+    def get_path_of_last_feed_fingerprints_json():
+        return str(Path(PathTools.get_project_data_directory()) / 'last_feed_fingerprints.json')
+
+    @staticmethod
+    def get_path_of_jobs_queue_db():
+        return str(Path(PathTools.get_project_data_directory()) / 'jobs_queue.sqlite')
 
     @staticmethod
     def get_path_of_checked_jobs_json():
         return str(Path(PathTools.get_project_data_directory()) / 'checked_jobs.json')
 
+    @staticmethod
+    def get_path_of_extraction_index_json():
+        return str(Path(PathTools.get_project_data_directory()) / 'extraction_index.json')
+
+    @staticmethod
+    def get_path_of_archive_passwords_json():
+        return str(Path(PathTools.get_project_data_directory()) / 'archive_passwords.json')
+
+    @staticmethod
+    def get_path_of_dedup_index_json():
+        return str(Path(PathTools.get_project_data_directory()) / 'dedup_index.json')
+
+    @staticmethod
+    def get_path_of_dedup_journal_json():
+        return str(Path(PathTools.get_project_data_directory()) / 'dedup_journal.json')
+
+    @staticmethod
+    def get_path_of_metrics_file():
+        return str(Path(PathTools.get_project_data_directory()) / 'metrics.prom')
+
 
 def remove_duplicates_from_sorted_list(sorted_list):
     if not sorted_list:
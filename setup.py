@@ -27,6 +27,7 @@ setup(
     entry_points={
         'console_scripts': [
             'atom-dl = atom_dl.main:main',
+            'atom-dl-benchmark = atom_dl.benchmark:main',
         ],
     },
     python_requires='>=3.7',
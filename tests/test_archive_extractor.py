@@ -0,0 +1,124 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+from typing import List, Tuple
+from unittest import mock
+
+import orjson
+import rarfile
+
+
+def encode_vint(value: int) -> bytes:
+    """Variable length integer of the RAR5 format, 7 bits per byte, lowest bits first"""
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def encode_header(header_type: int, header_flags: int, fields: bytes, data_size: int = None) -> bytes:
+    body = encode_vint(header_type) + encode_vint(header_flags)
+    if data_size is not None:
+        body += encode_vint(data_size)
+    body += fields
+    header = encode_vint(len(body)) + body
+    return struct.pack('<I', zlib.crc32(header)) + header
+
+
+def write_stored_rar5(archive_path: str, members: List[Tuple[str, bytes]]):
+    """
+    Writes a RAR5 archive with uncompressed members, so tests do not need the (non-free) rar tool
+    """
+    with open(archive_path, 'wb') as archive_file:
+        archive_file.write(b'Rar!\x1a\x07\x01\x00')
+        # Main archive header without archive flags
+        archive_file.write(encode_header(1, 0, encode_vint(0)))
+        for name, data in members:
+            name_bytes = name.encode('utf-8')
+            fields = (
+                encode_vint(0x0004)  # file flags: the data CRC32 is present
+                + encode_vint(len(data))
+                + encode_vint(0o644)  # attributes
+                + struct.pack('<I', zlib.crc32(data))
+                + encode_vint(0)  # compression: version 0, method 0 (stored)
+                + encode_vint(1)  # host OS: Unix
+                + encode_vint(len(name_bytes))
+                + name_bytes
+            )
+            # Header flag 0x0002: a data area follows the header
+            archive_file.write(encode_header(2, 0x0002, fields, data_size=len(data)))
+            archive_file.write(data)
+        # End of archive header
+        archive_file.write(encode_header(5, 0, encode_vint(0)))
+
+
+class ExtractRarMembersTest(unittest.TestCase):
+    members = [
+        ('Book/a*.epub', b'wildcard member'),
+        ('Book/ab.epub', b'first matched by the wildcard'),
+        ('Book/a[b].epub', b'bracket member'),
+        ('Book/README', b'member without extension'),
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.storage_path = os.path.join(self.tmp_dir, 'storage')
+        self.package_path = os.path.join(self.storage_path, 'Bücher', 'Book')
+        os.makedirs(self.package_path)
+        os.makedirs(os.path.join(self.tmp_dir, 'config', 'atom-dl'))
+        with open(os.path.join(self.tmp_dir, 'config', 'atom-dl', 'config.json'), 'wb') as config_file:
+            config_file.write(orjson.dumps({'storage_path': self.storage_path}))  # pylint: disable=maybe-no-member
+        environ_patcher = mock.patch.dict(
+            os.environ,
+            {
+                'XDG_CONFIG_HOME': os.path.join(self.tmp_dir, 'config'),
+                'XDG_DATA_HOME': os.path.join(self.tmp_dir, 'data'),
+            },
+        )
+        environ_patcher.start()
+        self.addCleanup(environ_patcher.stop)
+        self.archive_path = os.path.join(self.package_path, 'Book.rar')
+        write_stored_rar5(self.archive_path, self.members)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_fixture_is_readable(self):
+        with rarfile.RarFile(self.archive_path) as container:
+            self.assertEqual([(name, container.read(name)) for name, _ in self.members], self.members)
+
+    @unittest.skipIf(shutil.which(rarfile.UNRAR_TOOL) is None, 'unrar is not installed')
+    def test_members_with_wildcards_are_extracted_exactly(self):
+        # pylint: disable=import-outside-toplevel
+        from atom_dl.archive_extractor import ArchiveExtractor
+
+        archive_extractor = ArchiveExtractor()
+        self.assertIsNotNone(archive_extractor.unrar_tool_path)
+        self.assertEqual(archive_extractor.extract_package(self.package_path, ['epub']), 'extracted')
+
+        extracted_files = {}
+        for dir_path, _, file_names in os.walk(self.package_path):
+            for file_name in file_names:
+                with open(os.path.join(dir_path, file_name), 'rb') as extracted_file:
+                    extracted_files[file_name] = extracted_file.read()
+        self.assertEqual(
+            extracted_files,
+            {
+                'a*.epub': b'wildcard member',
+                'ab.epub': b'first matched by the wildcard',
+                'a[b].epub': b'bracket member',
+                'README': b'member without extension',
+            },
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()